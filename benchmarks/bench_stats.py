@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+""" bench_stats.py
+    Measures the overhead of per call site stats (printdebug.stats_enable)
+    on debug() calls, both enabled and suppressed.
+    Output goes to a StringIO, so only printdebug itself is measured.
+"""
+import io
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from printdebug import debug, debug_enable, stats_enable  # noqa
+
+CALLS = 100000
+
+
+def bench(name):
+    """ Time `CALLS` debug calls from a single call site. """
+    f = io.StringIO()
+
+    def run():
+        for i in range(CALLS):
+            debug('Benchmarking message', i, file=f)
+    best = min(timeit.repeat(run, number=1, repeat=5))
+    print('{:>22}: {:>10,.0f} calls/sec ({:.3f} us/call)'.format(
+        name,
+        CALLS / best,
+        best / CALLS * 1000000,
+    ))
+    return best
+
+
+def main():
+    base = bench('enabled, no stats')
+    stats_enable()
+    withstats = bench('enabled, stats')
+    stats_enable(False)
+    debug_enable(False)
+    basedisabled = bench('suppressed, no stats')
+    stats_enable()
+    disabledstats = bench('suppressed, stats')
+    print('\nStats overhead: {:.3f} us/call, {:.3f} us/suppressed call'.format(
+        (withstats - base) / CALLS * 1000000,
+        (disabledstats - basedisabled) / CALLS * 1000000,
+    ))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+""" bench_structured.py
+    Compares the throughput of JSON Lines output with the text output of
+    DebugPrinter. Output goes to a StringIO, so only formatting is measured.
+"""
+import io
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from printdebug import DebugPrinter, JSONLinesWriter  # noqa
+
+CALLS = 100000
+
+
+def bench(name, dp):
+    """ Time `CALLS` debug calls from a single call site. """
+    def run():
+        for i in range(CALLS):
+            dp.debug('Benchmarking message', i)
+    best = min(timeit.repeat(run, number=1, repeat=5))
+    print('{:>12}: {:>10,.0f} calls/sec ({:.2f} us/call)'.format(
+        name,
+        CALLS / best,
+        best / CALLS * 1000000,
+    ))
+
+
+def main():
+    bench('text', DebugPrinter(file=io.StringIO()))
+    bench('json lines', DebugPrinter(file=JSONLinesWriter(io.StringIO())))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
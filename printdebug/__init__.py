@@ -8,15 +8,19 @@ from .tools import (
     DebugColrPrinter,
     DebugNotEnabled,
     DebugPrinter,
+    DebugRecord,
     debug,
     debug_enable,
     debug_exc,
+    debug_expr,
     debug_json,
+    debug_locals,
     debug_object,
     default_colr_format,
     default_format,
     get_frame,
     get_lineinfo,
+    get_printer,
     json_str,
     object_str,
     pop_or,
@@ -24,29 +28,130 @@ from .tools import (
     printobject,
     print_object,
     LineInfo,
+    short_repr,
     suppress,
+    truncate,
+)
+
+from .binlog import (
+    BinaryLogReader,
+    BinaryLogWriter,
+)
+
+from .changes import debug_changes
+
+from .config import (
+    clear_config,
+    load_config,
+    unwatch_config,
+    watch_config,
+    watch_environ as _watch_environ,
+)
+
+from .context import (
+    context,
+    current_context,
 )
 
 from .catchers import (
+    CaptureBuffer,
     StdErrCatcher,
     StdOutCatcher,
 )
 
+from .diff import debug_diff
+
+from .filesink import RotatingFileSink
+
+from .hooks import (
+    install_hooks,
+    uninstall_hooks,
+)
+
+from .tracebacks import (
+    library_paths,
+    TracebackStyle,
+)
+
+from .logbridge import (
+    LoggerSink,
+    PrintDebugFormatter,
+    PrintDebugHandler,
+)
+
+from .memory import (
+    debug_mem,
+    debug_mem_span,
+)
+
+from .ringbuffer import (
+    MmapRingBuffer,
+    read_ring_buffer,
+)
+
+from .sitestats import (
+    print_stats,
+    SiteStats,
+    stats,
+    stats_enable,
+    stats_reset,
+)
+
+from .signals import (
+    install_signal_handlers,
+    set_verbosity,
+    uninstall_signal_handlers,
+    verbosity,
+    verbosity_filter,
+)
+
+from .sinks import (
+    ColrFormatter,
+    Sink,
+    TextFormatter,
+)
+
+from .structured import JSONLinesWriter
+
+from .timeline import (
+    debug_span,
+    timeline_start,
+    timeline_stop,
+    timeline_writer,
+    TraceWriter,
+)
+
+from .tracing import (
+    debug_calls,
+    trace_module,
+)
+
+from .timing import (
+    debug_timer,
+    LatencyHistogram,
+    print_timer_summaries,
+    timer_histograms,
+)
+
 __all__ = [
     '__version__',
     # Exported tools
     'DebugColrPrinter',
     'DebugNotEnabled',
     'DebugPrinter',
+    'DebugRecord',
     'debug',
     'debug_enable',
     'debug_exc',
+    'debug_expr',
     'debug_json',
+    'debug_locals',
     'debug_object',
     'default_colr_format',
     'default_format',
     'get_frame',
     'get_lineinfo',
+    'get_printer',
     'print_json',
     'print_object',
     'printobject',
@@ -55,7 +160,60 @@ __all__ = [
     'json_str',
     'object_str',
     'pop_or',
+    'short_repr',
     'suppress',
+    'truncate',
+    'CaptureBuffer',
     'StdErrCatcher',
     'StdOutCatcher',
+    'context',
+    'current_context',
+    'ColrFormatter',
+    'Sink',
+    'TextFormatter',
+    'BinaryLogReader',
+    'BinaryLogWriter',
+    'JSONLinesWriter',
+    'LoggerSink',
+    'MmapRingBuffer',
+    'print_stats',
+    'SiteStats',
+    'stats',
+    'stats_enable',
+    'stats_reset',
+    'PrintDebugFormatter',
+    'PrintDebugHandler',
+    'RotatingFileSink',
+    'read_ring_buffer',
+    'debug_timer',
+    'LatencyHistogram',
+    'print_timer_summaries',
+    'timer_histograms',
+    'debug_calls',
+    'trace_module',
+    'debug_span',
+    'timeline_start',
+    'timeline_stop',
+    'timeline_writer',
+    'TraceWriter',
+    'debug_mem',
+    'debug_mem_span',
+    'debug_diff',
+    'debug_changes',
+    'install_hooks',
+    'uninstall_hooks',
+    'library_paths',
+    'TracebackStyle',
+    'install_signal_handlers',
+    'set_verbosity',
+    'uninstall_signal_handlers',
+    'verbosity',
+    'verbosity_filter',
+    'clear_config',
+    'load_config',
+    'unwatch_config',
+    'watch_config',
 ]
+
+# Watch the config file named in $PRINTDEBUG_CONFIG, if it's set.
+_watch_environ()
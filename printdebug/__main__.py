@@ -6,8 +6,11 @@
 from __future__ import print_function
 import sys
 
+from .binlog import BinaryLogReader
+from .sinks import TextFormatter
 from .tools import (
     __version__,
+    default_format,
     get_lineinfo,
     debug,
     debug_enable,
@@ -18,12 +21,67 @@ from .tools import (
     DebugPrinter,
     printobject,
 )
+from .ringbuffer import read_ring_buffer
 
 if sys.version_info.major < 3:
     print('Color printing is not available in Python 2.\n\n', file=sys.stderr)
     DebugColrPrinter = DebugPrinter  # noqa
 
 
+def decode_main(args):
+    """ Render records from binary log files as text, using
+        `default_format` or a `--fmt` template.
+    """
+    fmt = default_format
+    if ('-f' in args) or ('--fmt' in args):
+        flagindex = args.index('-f' if '-f' in args else '--fmt')
+        try:
+            fmt = args[flagindex + 1]
+        except IndexError:
+            print('\nNo format given for --fmt.', file=sys.stderr)
+            return 1
+        args = args[:flagindex] + args[flagindex + 2:]
+    if not args:
+        print('\nNo binary log file given.', file=sys.stderr)
+        return 1
+    for filename in args:
+        try:
+            with open(filename, 'rb') as f:
+                formatter = TextFormatter(fmt=fmt)
+                for record in BinaryLogReader(f):
+                    sys.stdout.write(formatter.format(record))
+        except (EnvironmentError, ValueError) as ex:
+            print(
+                '\nUnable to decode {}: {}'.format(filename, ex),
+                file=sys.stderr,
+            )
+            return 1
+    return 0
+
+
+def dump_main(args):
+    """ Print all records from a ring buffer file, oldest first. """
+    if not args:
+        print('\nNo ring buffer file given.', file=sys.stderr)
+        return 1
+    out = getattr(sys.stdout, 'buffer', None)
+    for filename in args:
+        try:
+            for _, data in read_ring_buffer(filename):
+                if out is None:
+                    sys.stdout.write(data.decode('utf-8', 'replace'))
+                else:
+                    out.write(data)
+        except (EnvironmentError, ValueError) as ex:
+            print(
+                '\nUnable to dump {}: {}'.format(filename, ex),
+                file=sys.stderr,
+            )
+            return 1
+    sys.stdout.flush()
+    return 0
+
+
 def main(nameargs):
     if not nameargs:
         debug('Hello from main().')
@@ -278,10 +336,15 @@ if __name__ == '__main__':
     if ('-h' in sys.argv) or ('--help' in sys.argv):
         print("""
     Usage: printdebug [TEST_NAME]
+           printdebug decode [-f FMT] BINLOG...
+           printdebug dump FILE...
            printdebug [-l]
 
     Options:
+        BINLOG     : A binary log file to render as text.
+        FILE       : A ring buffer file to print records from.
         TEST_NAME  : Text/Regex pattern for test functions to run.
+        -f,--fmt   : Line info format for decoded records.
         -h,--help  : Show this message and exit.
         -l,--list  : Show test function names and exit.
         -v,--version  : Show printdebug version and exit.
@@ -296,5 +359,9 @@ if __name__ == '__main__':
             '\n    '.join(test_names)
         ))
         sys.exit(0)
+    if sys.argv[1:2] == ['decode']:
+        sys.exit(decode_main(sys.argv[2:]))
+    if sys.argv[1:2] == ['dump']:
+        sys.exit(dump_main(sys.argv[2:]))
 
     sys.exit(main(sys.argv[1:]))
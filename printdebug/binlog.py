@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" PrintDebug - Binary Log
+    ...a compact binary format for debug output.
+    Each call site is written once to a string table, and records only
+    carry a site id, timestamp, thread id, and the message bytes.
+"""
+import struct
+import threading
+
+from .tools import (
+    DebugRecord,
+    LineInfo,
+)
+
+MAGIC = b'PDBL\x02'
+# Site: tag, site id, lineno, filename length, name length.
+SITE = struct.Struct('<cIIHH')
+# Record: tag, site id, timestamp, thread id, flags, message length,
+# `end` length.
+RECORD = struct.Struct('<cIdQBIH')
+SITE_TAG = b'S'
+RECORD_TAG = b'R'
+# Record flags.
+FLAG_ALIGN = 0x01
+
+
+class BinaryLogWriter(object):
+    """ A structured sink that writes debug records in a compact binary
+        format. Pass it as the `file` for `debug()` or `DebugPrinter`.
+
+        Usage:
+            dp = DebugPrinter(file=BinaryLogWriter('debug.pdbl'))
+            dp.debug('This is stored in binary.')
+
+        The log can be rendered as text with `BinaryLogReader`, or with:
+            python -m printdebug decode debug.pdbl
+    """
+
+    def __init__(self, file):
+        """ Initialize a writer for an open binary file object, or a
+            file name.
+            The header is only written at the start of a file, so logs can
+            be appended to. Site entries are written again after it.
+        """
+        if isinstance(file, str):
+            self.file = open(file, 'wb')
+            self.owned = True
+        else:
+            self.file = file
+            self.owned = False
+        # Interned call sites, (filename, lineno, name): site id.
+        self.sites = {}
+        # Held while allocating site ids and writing, so a record is never
+        # written before its site entry.
+        self.lock = threading.Lock()
+        try:
+            position = self.file.tell()
+        except OSError:
+            # Not seekable, like a pipe.
+            position = 0
+        if position == 0:
+            self.file.write(MAGIC)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exctype, value, traceback):
+        self.close()
+        # Allow exceptions to propogate by not returning True.
+        return None
+
+    def close(self):
+        """ Flush the file, and close it if it was opened by this writer. """
+        self.flush()
+        if self.owned:
+            self.file.close()
+
+    def flush(self):
+        self.file.flush()
+
+    def site_id(self, filename, lineno, name):
+        """ Return the site id for a call site, and the site entry bytes if
+            it has not been written yet (otherwise b'').
+            `self.lock` must be held until the entry is written.
+        """
+        key = (filename, lineno, name)
+        siteid = self.sites.get(key, None)
+        if siteid is not None:
+            return siteid, b''
+        siteid = len(self.sites)
+        self.sites[key] = siteid
+        fnamebytes = filename.encode('utf-8', 'replace')
+        namebytes = name.encode('utf-8', 'replace')
+        entry = b''.join((
+            SITE.pack(
+                SITE_TAG,
+                siteid,
+                lineno,
+                len(fnamebytes),
+                len(namebytes),
+            ),
+            fnamebytes,
+            namebytes,
+        ))
+        return siteid, entry
+
+    def write_record(self, record):
+        """ Write a single DebugRecord. """
+        msg = record.text.encode('utf-8', 'replace')
+        end = record.end.encode('utf-8', 'replace')
+        with self.lock:
+            siteid, entry = self.site_id(
+                record.info.filename,
+                record.info.lineno,
+                record.name,
+            )
+            self.file.write(b''.join((
+                entry,
+                RECORD.pack(
+                    RECORD_TAG,
+                    siteid,
+                    record.time,
+                    record.thread,
+                    FLAG_ALIGN if record.align else 0,
+                    len(msg),
+                    len(end),
+                ),
+                msg,
+                end,
+            )))
+
+
+class BinaryLogReader(object):
+    """ Streams DebugRecords from a binary log, written by BinaryLogWriter.
+        The site table is rebuilt as the log is read, so this works on logs
+        that are still being written.
+
+        Usage:
+            with open('debug.pdbl', 'rb') as f:
+                for record in BinaryLogReader(f):
+                    print(record.info.lineno, record.text)
+    """
+
+    def __init__(self, file):
+        self.file = file
+        # Site id: (LineInfo, parent name or None)
+        self.sites = {}
+        magic = self.file.read(len(MAGIC))
+        if magic != MAGIC:
+            raise ValueError('Not a printdebug binary log.')
+
+    def __iter__(self):
+        read = self.file.read
+        while True:
+            tag = read(1)
+            if tag == SITE_TAG:
+                header = tag + read(SITE.size - 1)
+                if len(header) < SITE.size:
+                    break
+                _, siteid, lineno, fnamelen, namelen = SITE.unpack(header)
+                filename = read(fnamelen)
+                name = read(namelen)
+                if (len(filename) < fnamelen) or (len(name) < namelen):
+                    # Truncated log, probably still being written.
+                    break
+                filename = filename.decode('utf-8', 'replace')
+                name = name.decode('utf-8', 'replace')
+                parent, _, funcname = name.rpartition('.')
+                self.sites[siteid] = (
+                    LineInfo(filename, funcname, lineno),
+                    parent or None,
+                )
+            elif tag == RECORD_TAG:
+                header = tag + read(RECORD.size - 1)
+                if len(header) < RECORD.size:
+                    break
+                (
+                    _, siteid, timestamp, thread, flags, msglen, endlen,
+                ) = RECORD.unpack(header)
+                msg = read(msglen)
+                end = read(endlen)
+                if (len(msg) < msglen) or (len(end) < endlen):
+                    # Truncated log, probably still being written.
+                    break
+                site = self.sites.get(siteid, None)
+                if site is None:
+                    raise ValueError(
+                        'Corrupt printdebug binary log, unknown site id: '
+                        '{}'.format(siteid)
+                    )
+                info, parent = site
+                yield DebugRecord(
+                    info,
+                    msg.decode('utf-8', 'replace'),
+                    parent=parent,
+                    timestamp=timestamp,
+                    thread=thread,
+                    align=bool(flags & FLAG_ALIGN),
+                    end=end.decode('utf-8', 'replace'),
+                )
+            elif not tag:
+                break
+            else:
+                raise ValueError(
+                    'Corrupt printdebug binary log, bad tag: {!r}'.format(tag)
+                )
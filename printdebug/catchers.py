@@ -1,11 +1,303 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
+import codecs
+import collections
+import io
+import itertools
+import os
 import sys
+import threading
+
+# Default cap for captured text, in characters.
+default_max_bytes = 8 * 1024 * 1024
+
+# Retention modes for CaptureBuffer, when a cap is reached.
+# 'tail' keeps the newest lines (a ring), 'head+tail' keeps the first and
+# the newest lines, and drops the middle.
+retention_modes = ('tail', 'head+tail')
+
+# Seconds to wait for the fd reader thread when a catcher exits. Child
+# processes that inherited the pipe can keep it open longer than this, and
+# their output is still added to the buffer until they close it.
+fd_join_timeout = 2.0
+# Size of reads from the capture pipe.
+fd_read_size = 65536
+
+# C library, for flushing stdio buffers (None until loaded, or False).
+_libc = None
+
+
+def _flush_libc():
+    """ Flush C stdio buffers, so output that C extensions wrote with
+        printf() goes to the right file descriptor before it's swapped.
+    """
+    global _libc
+    if _libc is None:
+        try:
+            import ctypes
+            _libc = ctypes.CDLL(None)
+        except (ImportError, OSError, TypeError):
+            # No ctypes, or no C library to load (Windows).
+            _libc = False
+    if _libc:
+        try:
+            _libc.fflush(None)
+        except (AttributeError, OSError):
+            pass
+
+
+def _write_all(fd, data):
+    """ Write all bytes to a file descriptor. """
+    data = memoryview(data)
+    while data:
+        data = data[os.write(fd, data):]
+
+
+class CaptureBuffer(object):
+    """ A thread-safe, bounded buffer that assembles written text into
+        lines.
+        Complete lines are kept in a ring (or the head and a ring, for
+        'head+tail' retention), so memory is bounded by `max_bytes` and
+        `max_lines`. New lines can be read incrementally with `read_new()`,
+        waited for with `iter_lines()`, or passed to callbacks as they are
+        completed.
+    """
+    def __init__(
+            self, max_bytes=default_max_bytes, max_lines=None,
+            retention='tail'):
+        """ Initialize a buffer.
+            Arguments:
+                max_bytes  : Maximum number of characters to keep,
+                             or None for no limit.
+                max_lines  : Maximum number of lines to keep,
+                             or None for no limit.
+                retention  : What to keep when a limit is reached,
+                             one of `retention_modes`.
+        """
+        if retention not in retention_modes:
+            raise ValueError('Invalid retention: {!r} (expecting {})'.format(
+                retention,
+                ', '.join(retention_modes),
+            ))
+        self.max_bytes = max_bytes
+        self.max_lines = max_lines
+        self.retention = retention
+        # Guards the buffer, and is notified when lines are added.
+        self.lock = threading.Condition()
+        # Functions to call with each complete line.
+        self.callbacks = []
+        self.closed = False
+        self.clear()
+
+    def __len__(self):
+        """ Number of lines that are kept. """
+        return len(self.head) + len(self.tail)
+
+    def __repr__(self):
+        return '{}(max_bytes={!r}, max_lines={!r}, retention={!r})'.format(
+            self.__class__.__name__,
+            self.max_bytes,
+            self.max_lines,
+            self.retention,
+        )
+
+    def _add_line(self, line):
+        """ Add a complete line, dropping old ones if needed.
+            The lock must be held.
+        """
+        self.total += 1
+        size = len(line) + 1
+        head = self.head
+        if (self.retention == 'head+tail') and not self.dropped:
+            # The head fills up to half the limits first.
+            headfull = (
+                ((self.max_lines is not None) and
+                    (len(head) >= self.max_lines // 2)) or
+                ((self.max_bytes is not None) and
+                    (self.headsize + size > self.max_bytes // 2))
+            )
+            if not headfull:
+                head.append(line)
+                self.headsize += size
+                return None
+        maxlines = self.max_lines
+        if maxlines is not None:
+            maxlines -= len(head)
+        maxbytes = self.max_bytes
+        if maxbytes is not None:
+            maxbytes -= self.headsize
+            if size > maxbytes:
+                # Keep the end of a line that wouldn't fit at all, instead
+                # of dropping it with everything else.
+                keep = max(maxbytes - 1, 0)
+                line = line[len(line) - keep:] if keep else ''
+                size = len(line) + 1
+                self.truncated += 1
+        tail = self.tail
+        tail.append(line)
+        self.tailsize += size
+        while tail and (
+                ((maxlines is not None) and (len(tail) > maxlines)) or
+                ((maxbytes is not None) and (self.tailsize > maxbytes))):
+            self.tailsize -= len(tail.popleft()) + 1
+            self.dropped += 1
+
+    def add_callback(self, func):
+        """ Call `func(line)` for each complete line, as it's written.
+            Callbacks run in the writing thread, outside of the lock.
+        """
+        self.callbacks.append(func)
+
+    def _call(self, lines):
+        """ Pass new lines to the callbacks. """
+        for line in lines:
+            for func in self.callbacks:
+                func(line)
+
+    def clear(self):
+        """ Remove all captured text. """
+        # A new lock isn't needed, the attributes are replaced together.
+        self.head = []
+        self.headsize = 0
+        self.tail = collections.deque()
+        self.tailsize = 0
+        # Current, incomplete line.
+        self.pending = io.StringIO()
+        self.pendingsize = 0
+        # Number of complete lines written, dropped, and truncated to fit
+        # in `max_bytes`.
+        self.total = 0
+        self.dropped = 0
+        self.truncated = 0
+        # Line number for the next read_new().
+        self.cursor = 0
+
+    def close(self):
+        """ Finish the current line, and stop any `iter_lines()` loops once
+            they have read everything.
+        """
+        self.flush()
+        with self.lock:
+            self.closed = True
+            self.lock.notify_all()
+
+    def flush(self):
+        """ Finish the current line, if there is one. """
+        with self.lock:
+            if not self.pendingsize:
+                return None
+            line = self._take_pending()
+            self._add_line(line)
+            self.lock.notify_all()
+        if self.callbacks:
+            self._call((line, ))
+
+    def get_lines(self, partial=True):
+        """ Return all kept lines, with a marker where lines were dropped
+            for 'head+tail' retention.
+            Arguments:
+                partial  : Whether to include the current incomplete line.
+        """
+        with self.lock:
+            lines = list(self.head)
+            if self.head and self.dropped:
+                lines.append('...({} lines dropped)'.format(self.dropped))
+            lines.extend(self.tail)
+            if partial and self.pendingsize:
+                lines.append(self.pending.getvalue())
+        return lines
+
+    def iter_lines(self, timeout=None):
+        """ Yield kept lines, and then new lines as they are completed,
+            until the buffer is closed.
+            Arguments:
+                timeout  : Seconds to wait for a new line before stopping,
+                           or None to wait until the buffer is closed.
+        """
+        cursor = 0
+        while True:
+            with self.lock:
+                ready = self.lock.wait_for(
+                    lambda: (self.total != cursor) or self.closed,
+                    timeout,
+                )
+                lines = self._lines_since(cursor)
+                cursor = self.total
+                done = self.closed or not ready
+            yield from lines
+            if done:
+                return None
+
+    def _lines_since(self, cursor):
+        """ Return kept lines after line number `cursor`. The cost depends
+            only on the number of new lines. The lock must be held.
+        """
+        count = self.total - cursor
+        if count <= 0:
+            return []
+        tail = self.tail
+        if count <= len(tail):
+            lines = list(itertools.islice(reversed(tail), count))
+            lines.reverse()
+            return lines
+        # Every tail line is new, and the head holds line numbers
+        # 0 to len(head) - 1, so only the ones after `cursor` are new.
+        lines = self.head[cursor:]
+        lines.extend(tail)
+        return lines
+
+    def read_new(self):
+        """ Return complete lines written since the last `read_new()`.
+            Lines that were dropped before they were read are skipped.
+        """
+        with self.lock:
+            lines = self._lines_since(self.cursor)
+            self.cursor = self.total
+        return lines
+
+    def _take_pending(self):
+        """ Return the current incomplete line, and start a new one.
+            The lock must be held.
+        """
+        line = self.pending.getvalue()
+        self.pending = io.StringIO()
+        self.pendingsize = 0
+        return line
+
+    def write(self, s):
+        """ Add text, assembling it into lines. """
+        if not s:
+            return 0
+        with self.lock:
+            parts = s.split('\n')
+            last = parts.pop()
+            if parts and self.pendingsize:
+                # The first part finishes the current line.
+                self.pending.write(parts[0])
+                parts[0] = self._take_pending()
+            if last:
+                self.pending.write(last)
+                self.pendingsize += len(last)
+                if (self.max_bytes is not None) and (
+                        self.pendingsize > self.max_bytes):
+                    # A huge line without newlines, split it.
+                    parts.append(self._take_pending())
+            if parts:
+                for line in parts:
+                    self._add_line(line)
+                self.lock.notify_all()
+        if parts and self.callbacks:
+            self._call(parts)
+        return len(s)
 
 
 class StdOutCatcher(object):
 
     """ Catches stdout for code inside the 'with' block.
+        Output is kept in a bounded, thread-safe CaptureBuffer.
+        With `fd=True`, file descriptor 1 is redirected too, to catch
+        output from C extensions, os.write(), and child processes.
+        With `tee=True`, output still goes to the original stream as well.
 
         Usage:
             with StdOutCatcher(safe=True, maxlength=160) as fakestdout:
@@ -15,34 +307,203 @@ class StdOutCatcher(object):
             # retrieve the captured output..
             print('output was: {}'.format(fakestdout.output))
     """
+    # Name of the sys attribute to replace.
+    stream_name = 'stdout'
+    # File descriptor to replace, in fd mode.
+    stream_fd = 1
 
-    def __init__(self, safe=False, maxlength=160):
+    def __init__(
+            self, safe=False, maxlength=160, max_bytes=default_max_bytes,
+            max_lines=None, retention='tail', fd=False, encoding='utf-8',
+            tee=False, callback=None):
+        """ Initialize a catcher.
+            Arguments:
+                safe       : Whether to escape lines, and trim them to
+                             `maxlength`, when they are read.
+                maxlength  : Maximum length for lines in safe mode.
+                max_bytes  : Maximum number of characters to keep.
+                max_lines  : Maximum number of lines to keep.
+                retention  : What to keep when a limit is reached,
+                             'tail' or 'head+tail'.
+                fd         : Whether to redirect the file descriptor to
+                             a pipe, instead of only the sys attribute.
+                encoding   : Encoding for text that goes through the
+                             pipe, in fd mode.
+                tee        : Whether to write to the original stream
+                             (or file descriptor) too.
+                callback   : A function to call with each complete line,
+                             as it's written. It runs in the writing
+                             thread (the reader thread in fd mode), and
+                             should not write to the caught stream.
+        """
         # Use safe_output?
         self.safe = safe
         # Maximum length before trimming output
         self.maxlength = maxlength
         # Output
-        self.lines = []
+        self.buffer = CaptureBuffer(
+            max_bytes=max_bytes,
+            max_lines=max_lines,
+            retention=retention,
+        )
+        self.oldstream = None
+        self.fd = fd
+        self.encoding = encoding
+        self.tee = tee
+        if callback is not None:
+            self.buffer.add_callback(self._wrap_callback(callback))
+        # Duplicate of the original file descriptor, while in fd mode.
+        self.savedfd = None
+        self.reader = None
 
     def __enter__(self):
         # Replace stdout with self, stdout.write() will be self.write()
-        self.oldstdout = sys.stdout
-        sys.stdout = self
+        self.oldstream = getattr(sys, self.stream_name)
+        self.buffer.closed = False
+        if self.fd:
+            self._start_fd()
+        setattr(sys, self.stream_name, self)
         return self
 
     def __exit__(self, exctype, value, traceback):
         # Fix stdout.
-        sys.stdout = self.oldstdout
+        try:
+            setattr(sys, self.stream_name, self.oldstream)
+        finally:
+            try:
+                if self.savedfd is not None:
+                    self._stop_fd()
+            finally:
+                self.buffer.close()
         # Allow exceptions to propogate by not returning True.
         return None
 
+    def _read_fd(self, readfd, teefd):
+        """ Drain the capture pipe into the buffer (and `teefd`), until
+            every writer has closed it. This runs in a separate thread, so
+            writers never block on a full pipe.
+        """
+        decoder = codecs.getincrementaldecoder(self.encoding)(
+            errors='replace'
+        )
+        try:
+            while True:
+                data = os.read(readfd, fd_read_size)
+                if not data:
+                    break
+                if teefd is not None:
+                    _write_all(teefd, data)
+                self._write_buffer(decoder.decode(data))
+            self._write_buffer(decoder.decode(b'', final=True))
+        finally:
+            os.close(readfd)
+            if teefd is not None:
+                os.close(teefd)
+
+    def _write_buffer(self, s):
+        """ Write to the buffer from the reader thread. """
+        try:
+            self.buffer.write(s)
+        except Exception:
+            # A broken callback must not stop the pipe from draining,
+            # or writers would block forever.
+            pass
+
+    def _start_fd(self):
+        """ Point the file descriptor at a pipe, and start reading it. """
+        try:
+            self.oldstream.flush()
+        except (AttributeError, OSError, ValueError):
+            # No flush(), or it's closed.
+            pass
+        _flush_libc()
+        savedfd = os.dup(self.stream_fd)
+        try:
+            readfd, writefd = os.pipe()
+        except OSError:
+            os.close(savedfd)
+            raise
+        try:
+            os.dup2(writefd, self.stream_fd)
+        except OSError:
+            for fd in (readfd, savedfd):
+                os.close(fd)
+            raise
+        finally:
+            # Only the redirected descriptor holds the write end now.
+            os.close(writefd)
+        self.savedfd = savedfd
+        # The reader may outlive savedfd, so it gets its own copy.
+        teefd = os.dup(savedfd) if self.tee else None
+        self.reader = threading.Thread(
+            target=self._read_fd,
+            args=(readfd, teefd),
+            name='{}-reader'.format(self.__class__.__name__),
+            daemon=True,
+        )
+        self.reader.start()
+
+    def _stop_fd(self):
+        """ Restore the file descriptor, and wait for the reader to finish
+            the output that is left in the pipe.
+        """
+        _flush_libc()
+        savedfd = self.savedfd
+        self.savedfd = None
+        try:
+            # This closes the pipe's write end, so the reader sees EOF.
+            os.dup2(savedfd, self.stream_fd)
+        finally:
+            os.close(savedfd)
+        self.reader.join(fd_join_timeout)
+
+    @property
+    def lines(self):
+        """ Captured lines, including the current incomplete line. """
+        lines = self.buffer.get_lines()
+        if self.safe:
+            return [self.safe_output(line) for line in lines]
+        return lines
+
     @property
     def output(self):
         return '\n'.join(self.lines)
 
     @output.setter
     def output(self, value):
-        self.lines = value.split('\n')
+        self.buffer.clear()
+        self.buffer.write(value)
+
+    def fileno(self):
+        """ Return the redirected file descriptor in fd mode, so child
+            processes can be given this catcher as stdout/stderr.
+        """
+        if self.savedfd is None:
+            raise io.UnsupportedOperation('fileno() needs fd mode.')
+        return self.stream_fd
+
+    def flush(self):
+        # Lines are only finished by newlines, but a tee'd stream is
+        # flushed.
+        if self.tee and (self.savedfd is None):
+            self.oldstream.flush()
+
+    def iter_lines(self, timeout=None):
+        """ Yield complete lines as they are captured, until the 'with'
+            block exits. This is meant to run in another thread.
+            Arguments:
+                timeout  : Seconds to wait for a new line before stopping,
+                           or None to wait until the block exits.
+        """
+        for line in self.buffer.iter_lines(timeout=timeout):
+            yield self.safe_output(line) if self.safe else line
+
+    def read_new(self):
+        """ Return complete lines captured since the last `read_new()`. """
+        lines = self.buffer.read_new()
+        if self.safe:
+            return [self.safe_output(line) for line in lines]
+        return lines
 
     def safe_output(self, s):
         """ Escape output and check max length, trim if needed. """
@@ -52,25 +513,29 @@ class StdOutCatcher(object):
             s = '{} (..truncated)'.format(s[:self.maxlength])
         return s
 
+    def _wrap_callback(self, func):
+        """ Wrap a line callback, to escape lines in safe mode. """
+        def callback(line):
+            func(self.safe_output(line) if self.safe else line)
+        return callback
+
+    def writable(self):
+        return True
+
     def write(self, s):
-        s = s.strip('\n')
-        if not s:
-            return 0
-        # Save output
-        self.lines.append(self.safe_output(s) if self.safe else s)
+        if self.savedfd is None:
+            if self.tee:
+                self.oldstream.write(s)
+            # Save output
+            return self.buffer.write(s)
+        # Send it through the pipe, to keep it in order with native output.
+        _write_all(self.stream_fd, s.encode(self.encoding, 'replace'))
         return len(s)
 
 
 class StdErrCatcher(StdOutCatcher):
-
-    def __enter__(self):
-        # Replace stderr with self, stdout.write() will be self.write()
-        self.oldstderr = sys.stderr
-        sys.stderr = self
-        return self
-
-    def __exit__(self, exctype, value, traceback):
-        # Fix stdout.
-        sys.stderr = self.oldstderr
-        # Allow exceptions to propogate by not returning True.
-        return None
+    """ Catches stderr for code inside the 'with' block.
+        See StdOutCatcher.
+    """
+    stream_name = 'stderr'
+    stream_fd = 2
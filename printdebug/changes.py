@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" PrintDebug - Changes
+    ...debug-print a value only when it changes, for polling loops.
+
+    Usage:
+        while True:
+            state = poll()
+            debug_changes(state, diff=True)
+        # myfile.py:   12    main(): state = {'status': 'starting'}
+        # myfile.py:   12    main(): state changed:
+        #                                ~ ['status'] = 'starting' -> 'ready'
+
+    Each call site (and optional key) remembers a fingerprint of the last
+    value: the value itself for hashable values, or a bounded structural
+    digest for unhashable ones. Fingerprints are compared with ==, not by
+    hash, because different values can have the same hash. When nothing
+    changed, a call costs about as much as a dict lookup.
+"""
+import copy
+import itertools
+import sys
+import threading
+
+from . import tools
+from .diff import (
+    _kind,
+    diff_lines,
+)
+from .expr import arg_sources
+
+# Maximum number of fingerprints to remember. The oldest ones are
+# forgotten first, and print again on their next call.
+max_entries = 4096
+# Maximum number of items visited when digesting unhashable values.
+digest_budget = 1000
+
+# Fingerprints by site, (code, lasti, key): (fingerprint, snapshot)
+# The snapshot is only kept for diffs.
+_seen = {}
+_seen_lock = threading.Lock()
+
+
+def digest(value, budget=None):
+    """ Return a structural digest for a (possibly unhashable) value,
+        as a tuple that can be compared with ==.
+        Hashable items are kept as (type, item), not by hash.
+        Only the first `budget` items are visited, so changes deep inside
+        very large structures may not be detected.
+    """
+    if budget is None:
+        budget = digest_budget
+    parts = []
+    stack = [value]
+    while stack and (budget > 0):
+        obj = stack.pop()
+        budget -= 1
+        try:
+            hash(obj)
+        except TypeError:
+            pass
+        else:
+            parts.append((type(obj), obj))
+            continue
+        kind = _kind(obj)
+        if kind == 'mapping':
+            parts.append(('m', len(obj)))
+            for key, item in itertools.islice(obj.items(), budget):
+                parts.append((type(key), key))
+                stack.append(item)
+        elif kind is not None:
+            # Unhashable sets, and sequences.
+            parts.append((kind, len(obj)))
+            stack.extend(itertools.islice(obj, budget))
+        else:
+            # An unhashable object, only the identity is known.
+            parts.append((type(obj).__name__, id(obj)))
+    return tuple(parts)
+
+
+def fingerprint(value):
+    """ Return a cheap fingerprint for a value, to compare with ==:
+        (type, value) for hashable values, or a bounded `digest()` for
+        unhashable ones.
+    """
+    try:
+        hash(value)
+    except TypeError:
+        return digest(value)
+    return (type(value), value)
+
+
+def _remember(key, entry):
+    """ Store a fingerprint entry, forgetting the oldest entries when
+        `max_entries` is reached.
+    """
+    with _seen_lock:
+        if (key not in _seen) and (len(_seen) >= max_entries):
+            # Dicts keep insertion order, so this is the oldest.
+            del _seen[next(iter(_seen))]
+        _seen[key] = entry
+
+
+def debug_changes(
+        value, key=None, diff=False, maxlen=80, printer=None, file=None,
+        level=0):
+    """ Debug-print a value, but only when it changed since the last call
+        from the same line (and key).
+        Arguments:
+            value    : The value to watch.
+            key      : An optional key, to watch several values from one
+                       call site (like one per connection).
+            diff     : Whether to print a diff for changed dicts, lists,
+                       and sets, instead of the whole value.
+                       Unhashable values are deep-copied for this.
+            maxlen   : Maximum length for values.
+            printer  : A DebugPrinter to print with.
+                       Default: printdebug.debug
+            file     : File to print to, when no printer is given.
+            level    : Number of frames to go back.
+    """
+    if not tools._should_print(printer):
+        return None
+    if level:
+        level = tools._ensure_level(level)
+    frame = sys._getframe(level + 1)
+    sitekey = (frame.f_code, frame.f_lasti, key)
+    current = fingerprint(value)
+    entry = _seen.get(sitekey, None)
+    if (entry is not None) and (entry[0] == current):
+        return None
+
+    snapshot = None
+    if diff:
+        snapshot = value if _kind(value) is None else copy.deepcopy(value)
+    _remember(sitekey, (current, snapshot))
+
+    sources = arg_sources(frame)
+    label = sources[0] if sources else 'value'
+    if key is not None:
+        label = '{}[{!r}]'.format(label, key)
+    if entry is None:
+        lines = ['{} = {}'.format(label, tools.short_repr(value, maxlen))]
+    elif diff and (entry[1] is not None):
+        lines = diff_lines(entry[1], value, maxlen=maxlen)
+        lines[0] = '{} changed:'.format(label)
+    else:
+        lines = ['{} changed: {}'.format(
+            label,
+            tools.short_repr(value, maxlen),
+        )]
+    tools._debug_lines(lines, printer=printer, file=file, level=level + 1)
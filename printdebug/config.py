@@ -0,0 +1,469 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" PrintDebug - Config
+    ...a hot-reloadable config file for enabling debug output per module,
+    sampling, verbosity, and sinks.
+
+    Usage:
+        watch_config('printdebug.toml', printer=dp)
+        # Or set PRINTDEBUG_CONFIG=printdebug.toml before importing
+        # printdebug. Its sinks go to the root `get_printer()` printer.
+
+    Config (TOML, JSON, or INI with the same keys in sections):
+        enabled = true          # debug_enable()
+        verbosity = 1           # set_verbosity()
+        default = true          # Whether unlisted modules are enabled.
+
+        [modules]               # Longest matching module prefix wins.
+        "myapp" = true
+        "myapp.db" = false
+
+        [sample]                # Fraction of calls to print, per module.
+        "myapp.hot" = 0.1
+
+        [[sinks]]               # Sinks for the `printer` given, replacing
+        path = "debug.jsonl"    # the ones from the last config.
+        format = "jsonl"        # 'text' or 'jsonl'. The path '-' is stderr.
+
+    A new config is applied all at once, by swapping in new rules and
+    bumping a generation counter. Each call site caches its decision, and
+    only looks at the rules again when the generation changes.
+"""
+import configparser
+import json
+import os
+import sys
+import threading
+from warnings import warn
+
+from . import (
+    signals,
+    tools,
+)
+from .sinks import Sink
+from .structured import JSONLinesWriter
+
+try:
+    import tomllib
+except ImportError:
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+# Environment variable with a config file to watch, on import.
+environ_var = 'PRINTDEBUG_CONFIG'
+# Seconds between checks for config file changes.
+default_interval = 1.0
+# Sink formats for config files.
+sink_formats = ('text', 'jsonl')
+
+# (generation, rules) for the current config, swapped in all at once.
+_state = (0, None)
+# Decisions by call site (code object): [generation, enabled, rate, acc]
+_sites = {}
+# Sinks created by the config, as (printer, sink).
+_sinks = []
+_watcher = None
+_lock = threading.Lock()
+
+
+class Rules(object):
+    """ Per-module rules from a config file. """
+    __slots__ = ('default', 'modules', 'sample')
+
+    def __init__(self, default=True, modules=None, sample=None):
+        self.default = default
+        self.modules = dict(modules or {})
+        self.sample = dict(sample or {})
+
+    def __repr__(self):
+        return '{}(default={!r}, modules={!r}, sample={!r})'.format(
+            self.__class__.__name__,
+            self.default,
+            self.modules,
+            self.sample,
+        )
+
+    def decide(self, module):
+        """ Return (enabled, sample_rate) for a module name. """
+        enabled = _match(self.modules, module)
+        rate = _match(self.sample, module)
+        return (
+            self.default if enabled is None else enabled,
+            1.0 if rate is None else rate,
+        )
+
+
+class ConfigWatcher(object):
+    """ Polls a config file's mtime in a background thread, and applies
+        it when it changes. Errors in a changed file are reported with a
+        warning, and the last good config is kept.
+    """
+    def __init__(self, path, interval=None, printer=None):
+        self.path = path
+        self.interval = default_interval if interval is None else interval
+        self.printer = printer
+        self.stamp = None
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(
+            target=self._run,
+            name='printdebug-config',
+            daemon=True,
+        )
+
+    def __repr__(self):
+        return '{}({!r}, interval={!r})'.format(
+            self.__class__.__name__,
+            self.path,
+            self.interval,
+        )
+
+    def check(self):
+        """ Load the config if it changed since the last check. Returns
+            True if it was loaded.
+        """
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            # Missing for now, maybe it's being replaced.
+            return False
+        stamp = (st.st_mtime_ns, st.st_size, st.st_ino)
+        if stamp == self.stamp:
+            return False
+        self.stamp = stamp
+        try:
+            load_config(self.path, printer=self.printer)
+        except (OSError, ValueError) as ex:
+            warn('Failed to load printdebug config: {}: {}'.format(
+                self.path,
+                ex,
+            ))
+            return False
+        return True
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            self.check()
+
+    def start(self):
+        self.check()
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread.is_alive() and (
+                self.thread is not threading.current_thread()):
+            self.thread.join()
+
+
+def apply_config(config, printer=None):
+    """ Apply a config dict (see `parse_config()`).
+        Arguments:
+            config   : Config dict.
+            printer  : A DebugPrinter for the config's sinks. Without
+                       one, sinks are ignored with a warning.
+    """
+    global _state
+    config = normalize_config(config)
+    rules = Rules(
+        default=config['default'],
+        modules=config['modules'],
+        sample=config['sample'],
+    )
+    if config['sinks'] and (printer is None):
+        # The sink files aren't opened, nothing could close them.
+        warn('printdebug config has sinks, but no printer was given.')
+        sinks = []
+    else:
+        sinks = [_make_sink(spec) for spec in config['sinks']]
+    with _lock:
+        _replace_sinks(printer, sinks)
+        if config['enabled'] is not None:
+            tools.debug_enable(config['enabled'])
+        if config['verbosity'] is not None:
+            signals.set_verbosity(config['verbosity'])
+        active = rules.modules or rules.sample or not rules.default
+        _state = (_state[0] + 1, rules if active else None)
+        # Only call sites pay for the rules, and only when there are any.
+        tools._site_filter = site_allowed if active else None
+
+
+def clear_config():
+    """ Remove the config's rules and sinks. """
+    global _state
+    with _lock:
+        _replace_sinks(None, [])
+        _state = (_state[0] + 1, None)
+        tools._site_filter = None
+
+
+def generation():
+    """ Return the current config generation. It's bumped each time a
+        config is applied.
+    """
+    return _state[0]
+
+
+def load_config(path, printer=None):
+    """ Read a config file, and apply it.
+        Arguments:
+            path     : A .toml, .json, .ini, or .cfg file.
+            printer  : A DebugPrinter for the config's sinks.
+    """
+    config = read_config(path)
+    apply_config(config, printer=printer)
+    return config
+
+
+def _make_sink(spec):
+    """ Create a Sink from a config sink spec. """
+    path = spec['path']
+    if spec['format'] == 'jsonl':
+        # The writer owns (and closes) the file when given a path.
+        return Sink(JSONLinesWriter(sys.stderr if path == '-' else path))
+    if path == '-':
+        return Sink(sys.stderr)
+    return Sink(open(path, 'a', encoding='utf-8'))
+
+
+def _match(table, module):
+    """ Return the value for the longest prefix of a dotted module name
+        in `table`, or None.
+    """
+    if not table:
+        return None
+    name = module
+    while True:
+        value = table.get(name, None)
+        if value is not None:
+            return value
+        name, _, _ = name.rpartition('.')
+        if not name:
+            return table.get('', None)
+
+
+def normalize_config(config):
+    """ Return a config dict with every key, checking the values.
+        Raises ValueError for bad values.
+    """
+    unknown = set(config) - {
+        'default', 'enabled', 'modules', 'sample', 'sinks', 'verbosity',
+    }
+    if unknown:
+        raise ValueError('Unknown config keys: {}'.format(
+            ', '.join(sorted(unknown))
+        ))
+    normalized = {
+        'enabled': _to_bool(config.get('enabled', None), 'enabled'),
+        'verbosity': config.get('verbosity', None),
+        'default': _to_bool(config.get('default', True), 'default'),
+        'modules': {},
+        'sample': {},
+        'sinks': [],
+    }
+    if normalized['verbosity'] is not None:
+        try:
+            normalized['verbosity'] = int(normalized['verbosity'])
+        except (TypeError, ValueError):
+            raise ValueError('Invalid verbosity: {!r}'.format(
+                normalized['verbosity']
+            ))
+    for module, value in dict(config.get('modules', {})).items():
+        normalized['modules'][module] = _to_bool(value, module)
+    for module, value in dict(config.get('sample', {})).items():
+        try:
+            rate = float(value)
+        except (TypeError, ValueError):
+            rate = -1
+        if not (0 <= rate <= 1):
+            raise ValueError('Invalid sample rate for {}: {!r}'.format(
+                module,
+                value,
+            ))
+        normalized['sample'][module] = rate
+    for spec in config.get('sinks', []):
+        if not spec.get('path', None):
+            raise ValueError('Sinks need a path: {!r}'.format(spec))
+        fmt = spec.get('format', 'text')
+        if fmt not in sink_formats:
+            raise ValueError('Invalid sink format: {!r} (expecting {})'.format(
+                fmt,
+                ', '.join(sink_formats),
+            ))
+        normalized['sinks'].append({'path': spec['path'], 'format': fmt})
+    return normalized
+
+
+def parse_config(text, fmt):
+    """ Parse config text into a dict.
+        Arguments:
+            text  : Config file content.
+            fmt   : 'toml', 'json', or 'ini'.
+    """
+    if fmt == 'json':
+        try:
+            config = json.loads(text)
+        except ValueError as ex:
+            raise ValueError('Invalid JSON config: {}'.format(ex))
+        if not isinstance(config, dict):
+            raise ValueError('JSON config must be an object.')
+        return config
+    if fmt == 'toml':
+        if tomllib is None:
+            raise ValueError('TOML configs need Python 3.11+, or tomli.')
+        try:
+            return tomllib.loads(text)
+        except tomllib.TOMLDecodeError as ex:
+            raise ValueError('Invalid TOML config: {}'.format(ex))
+    if fmt == 'ini':
+        return _parse_ini(text)
+    raise ValueError('Unknown config format: {!r}'.format(fmt))
+
+
+def _parse_ini(text):
+    """ Parse an INI config, with a [printdebug] section for settings,
+        [modules] and [sample] sections, and a [sink:<name>] section for
+        each sink.
+    """
+    parser = configparser.ConfigParser(interpolation=None)
+    # Module names are case-sensitive.
+    parser.optionxform = str
+    try:
+        parser.read_string(text)
+    except configparser.Error as ex:
+        raise ValueError('Invalid INI config: {}'.format(ex))
+    config = {}
+    if parser.has_section('printdebug'):
+        config.update(parser['printdebug'])
+    for section in ('modules', 'sample'):
+        if parser.has_section(section):
+            config[section] = dict(parser[section])
+    sinks = [
+        dict(parser[section])
+        for section in parser.sections()
+        if section.startswith('sink:')
+    ]
+    if sinks:
+        config['sinks'] = sinks
+    return config
+
+
+def read_config(path):
+    """ Read a config file into a dict, using its extension for the
+        format.
+    """
+    ext = os.path.splitext(path)[-1].lower()
+    fmt = {'.json': 'json', '.toml': 'toml'}.get(ext, 'ini')
+    with open(path, 'r', encoding='utf-8') as f:
+        return parse_config(f.read(), fmt)
+
+
+def _replace_sinks(printer, sinks):
+    """ Swap the sinks from the last config for new ones.
+        Each printer's sink list is replaced at once, so debug() calls in
+        other threads use either the old sinks or the new ones. The old
+        sinks are only flushed, a call that started before the swap may
+        still be writing to them. Their files are closed when they are
+        garbage collected.
+        The lock must be held.
+    """
+    oldsinks = [sink for _, sink in _sinks]
+    printers = {id(oldprinter): oldprinter for oldprinter, _ in _sinks}
+    if printer is not None:
+        printers[id(printer)] = printer
+    with tools._printer_lock:
+        for target in printers.values():
+            # Sinks that were removed by hand stay removed.
+            kept = [sink for sink in target.sinks if sink not in oldsinks]
+            if target is printer:
+                kept.extend(sinks)
+            target.sinks = kept
+    _sinks[:] = [(printer, sink) for sink in sinks] if printer else []
+    for sink in oldsinks:
+        try:
+            sink.file.flush()
+        except (OSError, ValueError):
+            # Already closed by hand.
+            pass
+
+
+def site_allowed(frame):
+    """ Return True if a debug call from `frame` should print, using the
+        cached decision for its code object. Only used while a config
+        has rules.
+    """
+    gen, rules = _state
+    code = frame.f_code
+    site = _sites.get(code, None)
+    if (site is None) or (site[0] != gen):
+        if rules is None:
+            return True
+        enabled, rate = rules.decide(frame.f_globals.get('__name__', ''))
+        site = _sites[code] = [gen, enabled, rate, 0.0]
+    if not site[1]:
+        return False
+    rate = site[2]
+    if rate >= 1:
+        return True
+    # Deterministic sampling: exactly `rate` of the calls are printed.
+    site[3] += rate
+    if site[3] >= 1:
+        site[3] -= 1
+        return True
+    return False
+
+
+def _to_bool(value, name):
+    """ Convert a config value to a bool (or None). """
+    if (value is None) or isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        lowered = value.strip().lower()
+        if lowered in ('1', 'true', 'yes', 'on'):
+            return True
+        if lowered in ('0', 'false', 'no', 'off'):
+            return False
+    raise ValueError('Invalid boolean for {}: {!r}'.format(name, value))
+
+
+def unwatch_config():
+    """ Stop watching the config file from `watch_config()`. The config
+        stays applied, see `clear_config()` to remove it.
+    """
+    global _watcher
+    watcher = _watcher
+    _watcher = None
+    if watcher is not None:
+        watcher.stop()
+
+
+def watch_config(path, interval=None, printer=None):
+    """ Load a config file, and reload it when its mtime changes.
+        Only one file is watched at a time.
+        Arguments:
+            path      : Config file path.
+            interval  : Seconds between checks. Default: default_interval
+            printer   : A DebugPrinter for the config's sinks.
+    """
+    global _watcher
+    unwatch_config()
+    _watcher = ConfigWatcher(path, interval=interval, printer=printer)
+    return _watcher.start()
+
+
+def watch_environ(printer=None):
+    """ Watch the config file named in the PRINTDEBUG_CONFIG environment
+        variable, if it's set.
+        Arguments:
+            printer  : A DebugPrinter for the config's sinks.
+                       Default: the root printer from `get_printer()`, so
+                       named printers inherit the sinks.
+    """
+    path = os.environ.get(environ_var, None)
+    if not path:
+        return None
+    if printer is None:
+        printer = tools.get_printer()
+    return watch_config(path, printer=printer)
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" PrintDebug - Context
+    ...request-scoped fields for debug output, backed by `contextvars`, so
+    they follow asyncio tasks (and threads started with
+    `contextvars.copy_context().run`).
+
+    Usage:
+        with context(request_id='abc123', tenant='acme'):
+            debug('Handling request.', fmt='{context} {name}(): ')
+            # or use the fields by name:
+            debug('Handling request.', fmt='[{request_id}] {name}(): ')
+"""
+import contextvars
+import json
+
+_context = contextvars.ContextVar('printdebug_context', default=None)
+
+
+class DebugContext(object):
+    """ An immutable set of context fields.
+        The rendered text and JSON are cached, so they are only computed
+        once per context, not once per debug call.
+    """
+    __slots__ = ('fields', '_json', '_text')
+
+    def __init__(self, fields):
+        # This dict is never modified, entering a new context makes a copy.
+        self.fields = fields
+        self._json = None
+        self._text = None
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, self.fields)
+
+    @property
+    def json(self):
+        """ The fields as an encoded JSON object. """
+        if self._json is None:
+            self._json = json.dumps(self.fields, default=str)
+        return self._json
+
+    @property
+    def text(self):
+        """ The fields as 'key=value' pairs, for the {context} field. """
+        if self._text is None:
+            self._text = ' '.join(
+                '{}={}'.format(k, v) for k, v in self.fields.items()
+            )
+        return self._text
+
+
+class context(object):
+    """ Context manager that adds fields to all debug output inside the
+        'with' block. Contexts can be nested, inner fields are merged with
+        (and override) the outer ones.
+
+        Usage:
+            with context(request_id='abc123'):
+                debug('Test.', fmt='[{request_id}] {name}(): ')
+    """
+
+    def __init__(self, **fields):
+        self.fields = fields
+        self.token = None
+
+    def __enter__(self):
+        parent = _context.get()
+        if parent is None:
+            fields = dict(self.fields)
+        else:
+            fields = dict(parent.fields)
+            fields.update(self.fields)
+        ctx = DebugContext(fields)
+        self.token = _context.set(ctx)
+        return ctx
+
+    def __exit__(self, exctype, value, traceback):
+        _context.reset(self.token)
+        self.token = None
+        # Allow exceptions to propogate by not returning True.
+        return None
+
+
+# Used when there is no context, so field lookups don't need a None check.
+empty_context = DebugContext({})
+
+
+def current_context():
+    """ Return the current DebugContext, or None if there is none. """
+    return _context.get()
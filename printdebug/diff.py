@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" PrintDebug - Diff
+    ...structural diffs for nested dicts, lists, tuples, and sets, showing
+    only added, removed, and changed paths.
+
+    Usage:
+        debug_diff(old_config, new_config)
+        # myfile.py:   12    main(): diff: 2 changes
+        #                                + ['debug'] = True
+        #                                ~ ['workers'][0]['port'] = 80 -> 8080
+
+    Unchanged subtrees are skipped by identity, and by a (C-speed) equality
+    check before they are walked, so diffing large, mostly identical
+    structures is close to linear, and the output stays small.
+"""
+import collections.abc
+import itertools
+
+from . import tools
+
+# Change kinds, and the prefix used for them in output.
+ADDED = '+'
+REMOVED = '-'
+CHANGED = '~'
+
+
+def _equal(old, new):
+    """ Return True if two objects are equal, and False if they are not
+        (or can't be compared).
+    """
+    try:
+        return bool(old == new)
+    except Exception:
+        # Like numpy arrays, or broken __eq__ methods.
+        return False
+
+
+def _kind(obj):
+    """ Return how an object is diffed: 'mapping', 'set', 'sequence', or
+        None for plain values. Like `object_str`, strings and bytes are
+        plain values.
+    """
+    if isinstance(obj, (str, bytes, bytearray)):
+        return None
+    if isinstance(obj, collections.abc.Mapping):
+        return 'mapping'
+    if isinstance(obj, (set, frozenset)):
+        return 'set'
+    if isinstance(obj, (list, tuple)):
+        return 'sequence'
+    return None
+
+
+def _sorted(items):
+    """ Sort items if they are orderable, for stable output. """
+    try:
+        return sorted(items)
+    except TypeError:
+        return list(items)
+
+
+def iter_diff(old, new, path=()):
+    """ Yield (kind, path, old_value, new_value) for every difference
+        between two nested structures, where `kind` is ADDED, REMOVED, or
+        CHANGED, and `path` is a tuple of keys/indexes.
+        Missing values (for ADDED and REMOVED) are None.
+    """
+    if (old is new) or _equal(old, new):
+        return
+    yield from _diff(old, new, path)
+
+
+def _diff(old, new, path):
+    """ Diff two objects that are known to be different. Equal items are
+        compared in C, and never walked.
+    """
+    oldkind = _kind(old)
+    if (oldkind is None) or (oldkind != _kind(new)):
+        yield CHANGED, path, old, new
+    elif oldkind == 'mapping':
+        yield from _diff_mapping(old, new, path)
+    elif oldkind == 'set':
+        for item in _sorted(old - new):
+            yield REMOVED, path + (item,), item, None
+        for item in _sorted(new - old):
+            yield ADDED, path + (item,), None, item
+    else:
+        yield from _diff_sequence(old, new, path)
+
+
+def _diff_mapping(old, new, path):
+    """ Diff two mappings. Removed and changed keys are yielded in the
+        old mapping's order, and added keys in the new mapping's order.
+    """
+    for key, oldvalue in old.items():
+        # Not new[key], a defaultdict would add the missing key.
+        if key not in new:
+            yield REMOVED, path + (key,), oldvalue, None
+            continue
+        newvalue = new[key]
+        if (oldvalue is newvalue) or _equal(oldvalue, newvalue):
+            continue
+        yield from _diff(oldvalue, newvalue, path + (key,))
+    for key, newvalue in new.items():
+        if key not in old:
+            yield ADDED, path + (key,), None, newvalue
+
+
+def _diff_sequence(old, new, path):
+    """ Diff two lists/tuples by index. A common prefix and suffix are
+        skipped, so a single insertion or removal doesn't show up as a
+        change for every item after it.
+    """
+    oldlen = len(old)
+    newlen = len(new)
+    start = 0
+    shortest = min(oldlen, newlen)
+    while (start < shortest) and (
+            (old[start] is new[start]) or _equal(old[start], new[start])):
+        start += 1
+    end = 0
+    while (end < (shortest - start)) and (
+            (old[oldlen - end - 1] is new[newlen - end - 1]) or
+            _equal(old[oldlen - end - 1], new[newlen - end - 1])):
+        end += 1
+    oldrange = range(start, oldlen - end)
+    newrange = range(start, newlen - end)
+    for i, j in itertools.zip_longest(oldrange, newrange):
+        if j is None:
+            yield REMOVED, path + (i,), old[i], None
+        elif i is None:
+            yield ADDED, path + (j,), None, new[j]
+        else:
+            yield from iter_diff(old[i], new[j], path + (j,))
+
+
+def format_path(path):
+    """ Return a path from `iter_diff()` as text, like: ['a'][0] """
+    if not path:
+        return '<root>'
+    return ''.join('[{!r}]'.format(key) for key in path)
+
+
+def diff_lines(old, new, limit=50, maxlen=80):
+    """ Return lines for the differences between two structures, with a
+        header line.
+        Arguments:
+            old     : Old structure.
+            new     : New structure.
+            limit   : Maximum number of changes to show.
+                      The walk stops when this is reached.
+            maxlen  : Maximum length for values.
+    """
+    lines = []
+    more = False
+    for change in iter_diff(old, new):
+        if (limit is not None) and (len(lines) == limit):
+            more = True
+            break
+        kind, path, oldvalue, newvalue = change
+        if kind == ADDED:
+            value = tools.short_repr(newvalue, maxlen)
+        elif kind == REMOVED:
+            value = tools.short_repr(oldvalue, maxlen)
+        else:
+            value = '{} -> {}'.format(
+                tools.short_repr(oldvalue, maxlen),
+                tools.short_repr(newvalue, maxlen),
+            )
+        lines.append('    {} {} = {}'.format(kind, format_path(path), value))
+    if more:
+        lines.append('    ...')
+        header = 'diff: more than {} changes'.format(limit)
+    elif lines:
+        header = 'diff: {} change{}'.format(
+            len(lines),
+            '' if len(lines) == 1 else 's',
+        )
+    else:
+        header = 'diff: no changes'
+    lines.insert(0, header)
+    return lines
+
+
+def debug_diff(
+        old, new, limit=50, maxlen=80, printer=None, file=None, level=0):
+    """ Debug-print the added, removed, and changed paths between two
+        nested dict/list/tuple/set structures.
+        Arguments:
+            old      : Old structure.
+            new      : New structure.
+            limit    : Maximum number of changes to print.
+            maxlen   : Maximum length for values.
+            printer  : A DebugPrinter to print with.
+                       Default: printdebug.debug
+            file     : File to print to, when no printer is given.
+            level    : Number of frames to go back.
+    """
+    if not tools._should_print(printer):
+        return None
+    tools._debug_lines(
+        diff_lines(old, new, limit=limit, maxlen=maxlen),
+        printer=printer,
+        file=file,
+        level=tools._ensure_level(level) + 1,
+    )
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" PrintDebug - Expressions
+    ...recovers the source text for a call's arguments, for
+    `debug_expr()`.
+    Source is parsed once per call site (code object and instruction), and
+    the result is cached, so repeated calls only cost a dict lookup.
+"""
+import ast
+import itertools
+import linecache
+import threading
+
+# Argument sources by call site, (code, lasti): (source, ...) or None.
+_sources = {}
+_sources_lock = threading.Lock()
+
+# Names for functions that echo their arguments, for finding calls when
+# instruction positions are not available (before Python 3.11).
+call_names = {'debug_changes', 'debug_expr'}
+
+
+def arg_sources(frame):
+    """ Return the source text for each positional argument of the call
+        that `frame` is currently making, or None if the source is not
+        available or the call can't be found.
+    """
+    key = (frame.f_code, frame.f_lasti)
+    try:
+        return _sources[key]
+    except KeyError:
+        pass
+    sources = _find_sources(frame)
+    with _sources_lock:
+        _sources[key] = sources
+    return sources
+
+
+def _call_positions(frame):
+    """ Return (lineno, end_lineno, col, end_col) for the instruction a
+        frame is executing, or None if it's unknown.
+    """
+    code = frame.f_code
+    lasti = frame.f_lasti
+    if (lasti < 0) or not hasattr(code, 'co_positions'):
+        return None
+    # One entry for each 2-byte code unit.
+    positions = next(
+        itertools.islice(code.co_positions(), lasti // 2, None),
+        None,
+    )
+    if (positions is None) or (None in positions):
+        return None
+    return positions
+
+
+def _find_call(tree, frame):
+    """ Find the ast.Call node for the call a frame is making. """
+    positions = _call_positions(frame)
+    calls = [node for node in ast.walk(tree) if isinstance(node, ast.Call)]
+    if positions is not None:
+        for node in calls:
+            if (
+                    node.lineno,
+                    node.end_lineno,
+                    node.col_offset,
+                    node.end_col_offset) == positions:
+                return node
+    # No positions, guess by name. This only works when there is one
+    # matching call on the line.
+    lineno = frame.f_lineno
+    found = [
+        node for node in calls
+        if (node.lineno == lineno) and (_call_name(node) in call_names)
+    ]
+    if len(found) == 1:
+        return found[0]
+    return None
+
+
+def _call_name(node):
+    """ Return the function or method name for an ast.Call. """
+    func = node.func
+    if isinstance(func, ast.Name):
+        return func.id
+    if isinstance(func, ast.Attribute):
+        return func.attr
+    return None
+
+
+def _find_sources(frame):
+    lines = linecache.getlines(frame.f_code.co_filename, frame.f_globals)
+    if not lines:
+        # No source, like `python -c` or a zipapp without it.
+        return None
+    source = ''.join(lines)
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        # The file changed, or isn't Python source.
+        return None
+    node = _find_call(tree, frame)
+    if node is None:
+        return None
+    if any(isinstance(arg, ast.Starred) for arg in node.args):
+        # The number of arguments isn't known until runtime.
+        return None
+    sources = []
+    for arg in node.args:
+        segment = ast.get_source_segment(source, arg)
+        if segment is None:
+            return None
+        # Multi-line arguments are shown on one line.
+        sources.append(' '.join(s.strip() for s in segment.splitlines()))
+    return tuple(sources)
+
+
+def format_args(sources, args):
+    """ Return text for `debug_expr()`, like: 'x = 5, len(items) = 12'.
+        Literals are shown as-is, and only values are shown when the
+        source is unknown.
+    """
+    if (sources is None) or (len(sources) != len(args)):
+        return ', '.join(repr(arg) for arg in args)
+    parts = []
+    for source, arg in zip(sources, args):
+        value = repr(arg)
+        if source == value:
+            parts.append(value)
+        else:
+            parts.append('{} = {}'.format(source, value))
+    return ', '.join(parts)
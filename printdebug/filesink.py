@@ -0,0 +1,293 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" PrintDebug - File Sink
+    ...a rotating file sink for debug output, with background compression
+    of rotated segments.
+"""
+import glob
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+from warnings import warn
+
+# Compressed file openers, by name.
+compressors = {}
+try:
+    import gzip
+    compressors['gzip'] = ('.gz', gzip.open)
+except ImportError:
+    pass
+try:
+    import lzma
+    compressors['lzma'] = ('.xz', lzma.open)
+except ImportError:
+    pass
+
+
+class RotatingFileSink(object):
+    """ A file-like object that appends debug output to a file, and rotates
+        it by size and/or age.
+        Every chunk of text ending with a newline is written with a single
+        O_APPEND write, so multiple processes can share the file.
+        Rotated segments are compressed and pruned in a background thread,
+        so `debug()` never waits on them.
+
+        Usage:
+            sink = RotatingFileSink(
+                'debug.log',
+                max_bytes=10485760,
+                compress='gzip',
+                retention=104857600,
+            )
+            dp = DebugPrinter(file=sink)
+    """
+    # How many writes between checks for rotation by another process.
+    check_every = 100
+
+    def __init__(
+            self, filename, max_bytes=None, interval=None, compress=None,
+            retention=None):
+        """ Open a file for appending.
+            Arguments:
+                filename   : File path to write to.
+                max_bytes  : Rotate when the file reaches this size.
+                interval   : Rotate after this many seconds.
+                compress   : Compression for rotated segments,
+                             'gzip', 'lzma', or None.
+                retention  : Maximum total size, in bytes, of rotated
+                             segments. The oldest ones are removed.
+        """
+        if compress and (compress not in compressors):
+            raise ValueError('Unknown compression: {!r} (expecting {})'.format(
+                compress,
+                ', '.join(sorted(compressors)),
+            ))
+        self.filename = filename
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self.compress = compress
+        self.retention = retention
+        self.lock = threading.Lock()
+        # Text that has been written, but not committed yet.
+        self.pending = []
+        # Rotated segments waiting on the worker thread.
+        self.queue = queue.Queue()
+        self.worker = None
+        self.fd = None
+        self._open()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exctype, value, traceback):
+        self.close()
+        # Allow exceptions to propogate by not returning True.
+        return None
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, self.filename)
+
+    def _append(self, data):
+        """ Write a chunk of bytes with a single write, and rotate if
+            needed.
+        """
+        os.write(self.fd, data)
+        self.size += len(data)
+        self.writes += 1
+        if self.writes % self.check_every == 0:
+            self._check_rotated()
+        if self.max_bytes and (self.size >= self.max_bytes):
+            self._rotate()
+        elif self.interval and (
+                time.monotonic() - self.opened >= self.interval):
+            self._rotate()
+
+    def _check_rotated(self):
+        """ Reopen the file if another process rotated it, and sync the size
+            with appends from other processes.
+        """
+        try:
+            pathstat = os.stat(self.filename)
+        except EnvironmentError:
+            pathstat = None
+        fdstat = os.fstat(self.fd)
+        if (pathstat is None) or (pathstat.st_ino != fdstat.st_ino):
+            os.close(self.fd)
+            self._open()
+            return None
+        self.size = fdstat.st_size
+
+    def _open(self):
+        self.fd = os.open(
+            self.filename,
+            os.O_WRONLY | os.O_APPEND | os.O_CREAT,
+            0o644,
+        )
+        self.size = os.fstat(self.fd).st_size
+        self.writes = 0
+        self.opened = time.monotonic()
+
+    def _rotate(self):
+        """ Move the current file aside, and start a new one.
+            Only the renames happen here, compression and retention are
+            handled by the worker thread.
+        """
+        try:
+            pathstat = os.stat(self.filename)
+        except EnvironmentError:
+            pathstat = None
+        if (pathstat is not None) and (
+                pathstat.st_ino == os.fstat(self.fd).st_ino):
+            rotated = self.rotated_name()
+            os.rename(self.filename, rotated)
+            self._start_worker()
+            self.queue.put(rotated)
+        # Otherwise, another process already rotated it.
+        os.close(self.fd)
+        self._open()
+
+    def _start_worker(self):
+        if (self.worker is not None) and self.worker.is_alive():
+            return None
+        self.worker = threading.Thread(
+            target=self._work,
+            name='printdebug-rotation',
+        )
+        self.worker.daemon = True
+        self.worker.start()
+
+    def _work(self):
+        """ Compress rotated segments and enforce the retention cap, until
+            a None is queued.
+        """
+        while True:
+            rotated = self.queue.get()
+            if rotated is None:
+                break
+            if self.compress:
+                try:
+                    compress_file(rotated, self.compress)
+                except OSError as ex:
+                    # The segment is kept uncompressed, and still pruned.
+                    warn('Failed to compress {}: {}'.format(rotated, ex))
+            if self.retention is not None:
+                self.prune()
+
+    def close(self):
+        """ Write any pending text, close the file, and wait for background
+            compression to finish.
+        """
+        if self.fd is None:
+            return None
+        self.flush()
+        with self.lock:
+            os.close(self.fd)
+            self.fd = None
+        if self.worker is not None:
+            self.queue.put(None)
+            self.worker.join()
+            self.worker = None
+
+    @property
+    def closed(self):
+        return self.fd is None
+
+    def flush(self):
+        """ Write any pending text, even without a newline. """
+        with self.lock:
+            if self.pending:
+                self._append(''.join(self.pending).encode('utf-8', 'replace'))
+                self.pending = []
+
+    def prune(self):
+        """ Remove the oldest rotated segments until their total size is
+            within `self.retention`. Only files named like `rotated_name()`
+            (and their compressed versions) are removed.
+        """
+        pattern = segment_pattern(self.filename)
+        segments = []
+        for path in glob.glob('{}.*'.format(glob.escape(self.filename))):
+            if not pattern.match(os.path.basename(path)):
+                # Not a segment, like app.log.bak.
+                continue
+            try:
+                st = os.stat(path)
+            except EnvironmentError:
+                # Removed by another process.
+                continue
+            segments.append((st.st_mtime, st.st_size, path))
+        segments.sort()
+        total = sum(size for _, size, _ in segments)
+        for _, size, path in segments:
+            if total <= self.retention:
+                break
+            try:
+                os.remove(path)
+            except EnvironmentError:
+                continue
+            total -= size
+
+    def rotated_name(self):
+        """ Return a unique name for the current file, once rotated. """
+        base = '{}.{}.{}'.format(
+            self.filename,
+            time.strftime('%Y%m%d-%H%M%S'),
+            os.getpid(),
+        )
+        # Earlier segments may have been compressed (and the originals
+        # removed) already.
+        ext = compressors[self.compress][0] if self.compress else ''
+        name = base
+        count = 0
+        while os.path.exists(name) or (
+                ext and os.path.exists('{}{}'.format(name, ext))):
+            count += 1
+            name = '{}-{}'.format(base, count)
+        return name
+
+    def write(self, s):
+        with self.lock:
+            if self.fd is None:
+                raise ValueError('I/O operation on closed file.')
+            if not s:
+                return 0
+            self.pending.append(s)
+            if s.endswith('\n'):
+                self._append(''.join(self.pending).encode('utf-8', 'replace'))
+                self.pending = []
+        return len(s)
+
+
+def segment_pattern(filename):
+    """ Return a compiled regex that matches the base names of rotated
+        segments for a file: name.YYYYmmdd-HHMMSS.pid[-N][.ext]
+    """
+    exts = '|'.join(re.escape(ext) for ext, _ in compressors.values())
+    return re.compile(r'{}\.\d{{8}}-\d{{6}}\.\d+(-\d+)?({})?$'.format(
+        re.escape(os.path.basename(filename)),
+        exts,
+    ))
+
+
+def compress_file(filename, compress='gzip'):
+    """ Compress a file by streaming it through a compressor, and remove
+        the original. Returns the compressed file name.
+    """
+    ext, opener = compressors[compress]
+    compressed = '{}{}'.format(filename, ext)
+    try:
+        with open(filename, 'rb') as fin:
+            with opener(compressed, 'wb') as fout:
+                shutil.copyfileobj(fin, fout)
+    except OSError:
+        # Don't leave a partial file behind.
+        try:
+            os.remove(compressed)
+        except OSError:
+            pass
+        raise
+    os.remove(filename)
+    return compressed
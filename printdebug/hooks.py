@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" PrintDebug - Hooks
+    ...exception hooks for uncaught exceptions in the main thread, other
+    threads, and asyncio loops, that print with `debug_exc()`.
+
+    Usage:
+        install_hooks(suppress_strs=['Connection reset'])
+        # Uncaught exceptions are debug-printed, with line info for the
+        # frame that raised them. Repeated exceptions (same type and
+        # traceback locations) are printed once, and then counted:
+        # app.py:   43 load(): ValueError: bad (repeated 12 more times)
+        uninstall_hooks()
+
+    When debug printing is disabled, the previous hooks are used. They also
+    handle exceptions that match `suppress` or `suppress_strs`, so those
+    are not lost.
+"""
+import sys
+import threading
+
+from . import tools
+
+# Hook settings, from install_hooks().
+_settings = {
+    'printer': None,
+    'suppress': None,
+    'suppress_strs': None,
+    'style': None,
+}
+# Previous hooks, to restore them.
+_previous = {}
+_lock = threading.Lock()
+
+
+def _debug_exc(msg, exc_info):
+    """ Print an exception with the installed settings, like
+        `debug_exc()` does. Returns True if it was handled, or False if
+        debug printing is disabled or the exception is suppressed.
+    """
+    if not _enabled():
+        return False
+    exc_type, exc_value, exc_tb = exc_info
+    if tools._exc_suppressed(
+            exc_type,
+            exc_value,
+            suppress=_settings['suppress'],
+            suppress_strs=_settings['suppress_strs']):
+        return False
+    text = tools._exc_text(exc_info, dedupe=True, style=_settings['style'])
+    if text is None:
+        # A repeat, it will be counted later.
+        return True
+    printer = _settings['printer']
+    debug = tools.debug if printer is None else printer.debug
+    # The line info is for the frame that raised, not for this hook.
+    info = _raised_info(exc_tb)
+    if msg:
+        debug(msg, info=info)
+    debug(text, info=info)
+    return True
+
+
+def _raised_info(tb):
+    """ Return a LineInfo for the frame that raised an exception, from
+        its traceback, or None if there is no traceback.
+    """
+    if tb is None:
+        return None
+    while tb.tb_next is not None:
+        tb = tb.tb_next
+    code = tb.tb_frame.f_code
+    return tools.LineInfo(code.co_filename, code.co_name, tb.tb_lineno)
+
+
+def _enabled():
+    """ Return True if the hooks' printer is enabled. """
+    printer = _settings['printer']
+    return tools.enabled() and ((printer is None) or printer.enabled)
+
+
+def excepthook(exc_type, exc_value, exc_tb):
+    """ A `sys.excepthook` that uses `debug_exc()`. """
+    if not _debug_exc(None, (exc_type, exc_value, exc_tb)):
+        _previous.get('sys', sys.__excepthook__)(exc_type, exc_value, exc_tb)
+
+
+def thread_excepthook(args):
+    """ A `threading.excepthook` that uses `debug_exc()`. """
+    if args.exc_type is SystemExit:
+        # Like the default hook, this is not an error.
+        return None
+    if args.thread is None:
+        name = tools.thread_name()
+    else:
+        name = args.thread.name
+    handled = _debug_exc(
+        'Exception in thread {}:'.format(name),
+        (args.exc_type, args.exc_value, args.exc_traceback),
+    )
+    if not handled:
+        _previous.get('threading', threading.__excepthook__)(args)
+
+
+def loop_exception_handler(loop, context):
+    """ An asyncio loop exception handler that uses `debug_exc()`.
+        Usage:
+            loop.set_exception_handler(loop_exception_handler)
+    """
+    exc = context.get('exception', None)
+    if exc is None:
+        # Not every error has an exception, like unclosed resources.
+        if _enabled():
+            printer = _settings['printer'] or tools
+            printer.debug(context.get('message', 'Unhandled error in loop.'))
+            return None
+        _previous_loop_handler(loop, context)
+        return None
+    handled = _debug_exc(
+        context.get('message', None),
+        (type(exc), exc, exc.__traceback__),
+    )
+    if not handled:
+        _previous_loop_handler(loop, context)
+
+
+def _previous_loop_handler(loop, context):
+    """ Call the loop exception handler that was replaced by
+        `install_hooks()`, or the loop's default handler.
+    """
+    previous = _previous.get('loop', None)
+    if (previous is not None) and (previous[0] is loop) and (
+            previous[1] is not None):
+        previous[1](loop, context)
+        return None
+    loop.default_exception_handler(context)
+
+
+def install_hooks(
+        printer=None, suppress=None, suppress_strs=None, threads=True,
+        loop=None, style=None):
+    """ Install exception hooks that print uncaught exceptions with
+        `debug_exc()`, deduplicating repeats.
+        Arguments:
+            printer        : A DebugPrinter to print with.
+                             Default: printdebug.debug
+            suppress       : Exception types to ignore. They are passed on
+                             to the previous hooks.
+            suppress_strs  : Ignore exceptions when their message contains
+                             any of these strings, like `suppress`.
+            threads        : Whether to install `threading.excepthook`.
+            loop           : An asyncio loop to install a handler on.
+                             Default: the running loop, if there is one.
+            style          : A `tracebacks.TracebackStyle`, for shorter
+                             tracebacks.
+    """
+    with _lock:
+        _settings.update(
+            printer=printer,
+            suppress=suppress,
+            suppress_strs=suppress_strs,
+            style=style,
+        )
+        if 'sys' not in _previous:
+            _previous['sys'] = sys.excepthook
+            sys.excepthook = excepthook
+        if threads and ('threading' not in _previous):
+            _previous['threading'] = threading.excepthook
+            threading.excepthook = thread_excepthook
+        # If asyncio was never imported, there are no loops.
+        asyncio = sys.modules.get('asyncio', None)
+        if (loop is None) and (asyncio is not None):
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                # No loop is running.
+                pass
+        if (loop is not None) and ('loop' not in _previous):
+            _previous['loop'] = (loop, loop.get_exception_handler())
+            loop.set_exception_handler(loop_exception_handler)
+
+
+def uninstall_hooks():
+    """ Restore the exception hooks that were replaced by
+        `install_hooks()`.
+    """
+    with _lock:
+        if 'sys' in _previous:
+            sys.excepthook = _previous.pop('sys')
+        if 'threading' in _previous:
+            threading.excepthook = _previous.pop('threading')
+        if 'loop' in _previous:
+            loop, handler = _previous.pop('loop')
+            if not loop.is_closed():
+                loop.set_exception_handler(handler)
@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" PrintDebug - Logging Bridge
+    ...connects printdebug and the standard `logging` module, so one
+    configured pipeline handles both APIs.
+
+    Usage:
+        # logging records, rendered by printdebug:
+        handler = logging.StreamHandler()
+        handler.setFormatter(PrintDebugFormatter(color=True))
+        logging.getLogger().addHandler(handler)
+
+        # logging records, sent through a DebugPrinter's sinks:
+        logging.getLogger().addHandler(PrintDebugHandler(dp))
+
+        # printdebug records, sent to a logger:
+        dp = DebugPrinter(sinks=[LoggerSink(logging.getLogger('myapp'))])
+"""
+import logging
+
+from .sinks import (
+    ColrFormatter,
+    Sink,
+    TextFormatter,
+)
+from .tools import (
+    DebugRecord,
+    LineInfo,
+    enabled,
+)
+
+# Attribute set on LogRecords that LoggerSink forwards, so
+# PrintDebugHandler doesn't send them back through printdebug.
+forwarded_attr = '_printdebug'
+
+
+def debug_record(logrecord, text=None):
+    """ Build a DebugRecord from a logging.LogRecord, without looking at
+        any frames.
+    """
+    return DebugRecord(
+        LineInfo(logrecord.pathname, logrecord.funcName, logrecord.lineno),
+        logrecord.getMessage() if text is None else text,
+        timestamp=logrecord.created,
+        thread=logrecord.thread,
+    )
+
+
+class PrintDebugFormatter(logging.Formatter):
+    """ A logging.Formatter that renders records with printdebug's `fmt`
+        templates ({filename}, {lineno}, {name}).
+        The rendered line info is cached per (pathname, lineno, funcName).
+    """
+    def __init__(
+            self, fmt=None, ljustwidth=40, basename=True, color=False,
+            formatter=None):
+        """ Initialize a formatter.
+            Arguments:
+                fmt         : .format() string for line info.
+                              Default: printdebug.default_format, or
+                              printdebug.default_colr_format with `color`.
+                ljustwidth  : str.ljust() value for line info.
+                basename    : Whether to use just the base name of the file.
+                color       : Whether to colorize output, like
+                              DebugColrPrinter does.
+                formatter   : A printdebug formatter to use instead of
+                              creating one from the other arguments.
+        """
+        super(PrintDebugFormatter, self).__init__()
+        if formatter is None:
+            formatter_cls = ColrFormatter if color else TextFormatter
+            formatter = formatter_cls(
+                fmt=fmt,
+                ljustwidth=ljustwidth,
+                basename=basename,
+            )
+        self.formatter = formatter
+
+    def format(self, record):
+        text = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            text = '\n'.join((text, record.exc_text))
+        if record.stack_info:
+            text = '\n'.join((text, self.formatStack(record.stack_info)))
+        line = self.formatter.format(debug_record(record, text))
+        # TextFormatter adds `end` for files, logging handlers add their
+        # own newline. Only that one is removed, custom formatters may not
+        # add it.
+        if line.endswith('\n'):
+            return line[:-1]
+        return line
+
+
+class PrintDebugHandler(logging.Handler):
+    """ A logging.Handler that sends records through a DebugPrinter,
+        using its sinks (or printing to its file when it has none).
+        The printer's enabled state, and `debug_enable()`, are respected.
+    """
+    def __init__(self, printer, level=logging.NOTSET):
+        super(PrintDebugHandler, self).__init__(level=level)
+        self.printer = printer
+        # Used when the printer has no sinks.
+        self.setFormatter(PrintDebugFormatter(
+            fmt=printer.fmt,
+            ljustwidth=printer.ljustwidth,
+            basename=printer.basename,
+        ))
+
+    def emit(self, record):
+        printer = self.printer
+        if getattr(record, forwarded_attr, False):
+            # This record came from a LoggerSink, sending it back to the
+            # printer would loop when both directions are configured.
+            return None
+        if not (printer.enabled and enabled()):
+            return None
+        try:
+            if not printer.all_sinks:
+                printer.file.write('{}\n'.format(self.format(record)))
+                return None
+            text = record.getMessage()
+            if record.exc_info:
+                text = '\n'.join((text, self.formatter.formatException(
+                    record.exc_info
+                )))
+            printer.emit(debug_record(record, text))
+        except Exception:
+            self.handleError(record)
+
+
+class LoggerSink(Sink):
+    """ A printdebug sink that forwards records to a logger.
+        The LogRecord is built from the DebugRecord's line info, so the
+        frame is not looked up again.
+        This can also be used as the `file` for `debug()`.
+    """
+    def __init__(
+            self, logger, level=logging.DEBUG, enabled=True, filter=None):
+        super(LoggerSink, self).__init__(
+            self,
+            enabled=enabled,
+            filter=filter,
+        )
+        self.logger = logger
+        self.level = level
+
+    def __repr__(self):
+        return '{}({!r}, level={!r}, enabled={!r})'.format(
+            self.__class__.__name__,
+            self.logger,
+            self.level,
+            self.enabled,
+        )
+
+    def write_record(self, record):
+        """ Forward a DebugRecord to the logger. """
+        logger = self.logger
+        if not logger.isEnabledFor(self.level):
+            return None
+        info = record.info
+        logrecord = logger.makeRecord(
+            logger.name,
+            self.level,
+            info.filename,
+            info.lineno,
+            record.text,
+            (),
+            None,
+            func=record.name,
+        )
+        # Shift relativeCreated by the same amount, it's based on a private
+        # start time in logging.
+        logrecord.relativeCreated += (
+            (record.time - logrecord.created) * 1000
+        )
+        logrecord.created = record.time
+        logrecord.msecs = (record.time - int(record.time)) * 1000
+        setattr(logrecord, forwarded_attr, True)
+        if record.context is not None:
+            # Like logging's `extra`, without overwriting record attributes.
+            for key, value in record.context.fields.items():
+                if key not in logrecord.__dict__:
+                    setattr(logrecord, key, value)
+        logger.handle(logrecord)
@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" PrintDebug - Memory
+    ...debug-print memory usage and allocation changes, with `tracemalloc`.
+
+    Usage:
+        debug_mem()
+        # myfile.py:   12    main(): memory: current=1.2 MiB, peak=3.4 MiB
+        # ...and on later calls from the same line, the biggest changes:
+        #                                 myfile.py:30: +512.0 KiB (+12)
+
+        with debug_mem_span('load'):
+            load()
+        # myfile.py:   40    main(): load: net +1.1 MiB, peak 2.0 MiB
+"""
+import heapq
+import os.path
+import sys
+import threading
+import tracemalloc
+
+from . import tools
+
+# Allocation statistics from the last debug_mem() call at each site,
+# (filename, lineno, key_type): {traceback: (size, count)}
+_site_stats = {}
+_site_stats_lock = threading.Lock()
+
+# Allocations by tracemalloc and printdebug are not reported.
+_filters = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<unknown>'),
+    tracemalloc.Filter(
+        False,
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), '*'),
+    ),
+)
+
+key_types = ('filename', 'lineno', 'traceback')
+
+
+def _ensure_tracing():
+    """ Start tracemalloc if it isn't tracing already.
+        Returns True if it was already tracing.
+    """
+    if tracemalloc.is_tracing():
+        return True
+    tracemalloc.start()
+    return False
+
+
+def allocation_stats(key_type='lineno'):
+    """ Take a snapshot, and return a dict of allocation sizes and counts,
+        grouped by `key_type`: {traceback: (size, count)}
+    """
+    if key_type not in key_types:
+        raise ValueError('Invalid key type: {!r} (expecting {})'.format(
+            key_type,
+            ', '.join(key_types),
+        ))
+    snapshot = tracemalloc.take_snapshot().filter_traces(_filters)
+    return {
+        stat.traceback: (stat.size, stat.count)
+        for stat in snapshot.statistics(key_type)
+    }
+
+
+def diff_stats(old, new, limit=10):
+    """ Return the biggest changes between two `allocation_stats()` dicts,
+        as [(traceback, size_diff, count_diff, size)], largest change
+        first.
+    """
+    diffs = []
+    for key, (size, count) in new.items():
+        oldsize, oldcount = old.get(key, (0, 0))
+        if (size != oldsize) or (count != oldcount):
+            diffs.append((key, size - oldsize, count - oldcount, size))
+    for key, (oldsize, oldcount) in old.items():
+        if key not in new:
+            diffs.append((key, -oldsize, -oldcount, 0))
+    return heapq.nlargest(limit, diffs, key=lambda diff: abs(diff[1]))
+
+
+def format_diffs(diffs):
+    """ Return lines for `diff_stats()` results. """
+    return [
+        '{}: {} ({:+}), total {}'.format(
+            traceback,
+            format_size(sizediff, sign=True),
+            countdiff,
+            format_size(size),
+        )
+        for traceback, sizediff, countdiff, size in diffs
+    ]
+
+
+def format_size(size, sign=False):
+    """ Return a human-readable size, like '1.2 KiB'. """
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if (abs(size) < 1024) or (unit == 'GiB'):
+            break
+        size /= 1024
+    if unit == 'B':
+        return '{}{} B'.format('+' if (sign and size >= 0) else '', size)
+    return '{}{:.1f} {}'.format(
+        '+' if (sign and size >= 0) else '',
+        size,
+        unit,
+    )
+
+
+def debug_mem(
+        limit=10, key_type='lineno', printer=None, file=None, level=0):
+    """ Debug-print the current and peak traced memory, and the biggest
+        allocation changes since the last `debug_mem()` call from the same
+        line. tracemalloc is started if it isn't tracing already.
+        Arguments:
+            limit     : Maximum number of changes to print.
+                        Use 0 to only print current/peak memory, which
+                        doesn't need a snapshot.
+            key_type  : How to group allocations,
+                        'filename', 'lineno', or 'traceback'.
+            printer   : A DebugPrinter to print with.
+                        Default: printdebug.debug
+            file      : File to print to, when no printer is given.
+            level     : Number of frames to go back.
+    """
+    if not tools._should_print(printer):
+        return None
+    level = tools._ensure_level(level)
+    wastracing = _ensure_tracing()
+    current, peak = tracemalloc.get_traced_memory()
+    lines = ['memory: current={}, peak={}'.format(
+        format_size(current),
+        format_size(peak),
+    )]
+    if limit:
+        frame = sys._getframe(level + 1)
+        key = (frame.f_code.co_filename, frame.f_lineno, key_type)
+        stats = allocation_stats(key_type)
+        with _site_stats_lock:
+            old = _site_stats.get(key, None)
+            _site_stats[key] = stats
+        if old is not None:
+            lines.extend(format_diffs(diff_stats(old, stats, limit=limit)))
+        elif not wastracing:
+            lines.append('(tracemalloc started, changes are shown next time)')
+    tools._debug_lines(lines, printer=printer, file=file, level=level + 1)
+
+
+class debug_mem_span(object):
+    """ A context manager that debug-prints the net allocations inside a
+        block, and the biggest changes.
+        The tracemalloc peak is reset when the block is entered.
+
+        Usage:
+            with debug_mem_span('load'):
+                load()
+    """
+    def __init__(
+            self, label=None, limit=10, key_type='lineno', printer=None,
+            file=None):
+        """ Initialize a memory span.
+            Arguments:
+                label     : Label for the output. Default: 'memory'
+                others    : See debug_mem().
+        """
+        self.label = label or 'memory'
+        self.limit = limit
+        self.key_type = key_type
+        self.printer = printer
+        self.file = file
+        self.start = None
+        self.stats = None
+
+    def __enter__(self):
+        _ensure_tracing()
+        if self.limit:
+            self.stats = allocation_stats(self.key_type)
+        self.start = tracemalloc.get_traced_memory()[0]
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        return self
+
+    def __exit__(self, exctype, value, traceback):
+        current, peak = tracemalloc.get_traced_memory()
+        printer = self.printer
+        if tools._should_print(printer):
+            lines = ['{}: net {}, peak {}'.format(
+                self.label,
+                format_size(current - self.start, sign=True),
+                format_size(peak),
+            )]
+            if self.limit:
+                lines.extend(format_diffs(diff_stats(
+                    self.stats,
+                    allocation_stats(self.key_type),
+                    limit=self.limit,
+                )))
+            tools._debug_lines(
+                lines,
+                printer=printer,
+                file=self.file,
+                level=1,
+            )
+        self.stats = None
+        # Allow exceptions to propogate by not returning True.
+        return None
@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" PrintDebug - Ring Buffer
+    ...a memory-mapped file used as a circular buffer for debug output.
+    The last records survive a SIGKILL or an OOM-kill, because the kernel
+    still owns the dirty pages when the process dies.
+"""
+import mmap
+import os
+import struct
+import threading
+
+# File header: magic, version, data size, head, tail, next seq, tail seq.
+HEADER = struct.Struct('<4sIQQQQQ')
+HEADER_SIZE = 64
+MAGIC = b'PDRB'
+VERSION = 1
+# Record header: payload length, sequence number.
+RECORD = struct.Struct('<IQ')
+# Marks the end of a lap, when a record did not fit at the end of the data.
+LENGTH = struct.Struct('<I')
+WRAP = 0xFFFFFFFF
+
+default_size = 1024 * 1024
+
+
+class MmapRingBuffer(object):
+    """ A file-like object that writes debug output into a fixed-size,
+        memory-mapped file used as a circular buffer.
+        Every chunk of text ending with a newline becomes a record, and the
+        oldest records are overwritten when the buffer is full.
+        Writes are memory copies into the map, there is no syscall per
+        record. Use `sync()` to force the pages to disk.
+
+        Usage:
+            ringbuf = MmapRingBuffer('/tmp/myapp.pdring', size=4194304)
+            dp = DebugPrinter(file=ringbuf)
+            dp.debug('This will survive a SIGKILL.')
+
+        Records can be read back with `read_ring_buffer()`, or with:
+            python -m printdebug dump /tmp/myapp.pdring
+    """
+
+    def __init__(self, filename, size=None, reset=False):
+        """ Open or create a ring buffer file.
+            Arguments:
+                filename  : File path for the ring buffer.
+                size      : Size of the data area, in bytes.
+                            Default: printdebug.ringbuffer.default_size
+                reset     : Whether to discard existing records.
+                            Existing records are kept by default, unless the
+                            file is not a ring buffer or `size` differs.
+        """
+        self.filename = filename
+        size = size or default_size
+        if size < RECORD.size + 1:
+            raise ValueError(
+                'Ring buffer size is too small: {}'.format(size)
+            )
+        self.lock = threading.Lock()
+        # Text that has been written, but not committed as a record yet.
+        self.pending = []
+        fd = os.open(filename, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            existing = _read_header_fd(fd)
+            if reset or (existing is None) or (existing[2] != size):
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, HEADER_SIZE + size)
+                existing = None
+            self.map = mmap.mmap(fd, HEADER_SIZE + size)
+        finally:
+            # The map keeps its own reference to the file.
+            os.close(fd)
+
+        self.data_size = size
+        if existing is None:
+            self.head = self.tail = 0
+            self.next_seq = self.tail_seq = 0
+            self._write_header()
+        else:
+            (_, _, _,
+             self.head, self.tail, self.next_seq, self.tail_seq) = existing
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exctype, value, traceback):
+        self.close()
+        # Allow exceptions to propogate by not returning True.
+        return None
+
+    def __repr__(self):
+        return '{}({!r}, size={})'.format(
+            self.__class__.__name__,
+            self.filename,
+            self.data_size,
+        )
+
+    def _append(self, data):
+        """ Copy a single record into the map, overwriting the oldest
+            records if needed.
+        """
+        size = self.data_size
+        maxlength = size - RECORD.size
+        if len(data) > maxlength:
+            # Keep the end of huge records, it's usually the interesting part.
+            data = data[-maxlength:]
+        reclen = RECORD.size + len(data)
+        head = self.head
+        if head + reclen > size:
+            # Not enough room at the end, everything after head is dropped.
+            self._evict(head, size - head)
+            if head + LENGTH.size <= size:
+                LENGTH.pack_into(self.map, HEADER_SIZE + head, WRAP)
+            head = 0
+        self._evict(head, reclen)
+        if self.tail_seq == self.next_seq:
+            # The buffer was empty (or a huge record evicted everything).
+            self.tail = head
+        offset = HEADER_SIZE + head
+        RECORD.pack_into(self.map, offset, len(data), self.next_seq)
+        self.map[offset + RECORD.size:offset + reclen] = data
+        self.head = head + reclen
+        self.next_seq += 1
+        # The header is written last, so a crash mid-record leaves the
+        # previous state intact.
+        self._write_header()
+
+    def _evict(self, start, length):
+        """ Drop the oldest records until the area from `start` to
+            `start + length` is free.
+        """
+        end = start + length
+        while self.tail_seq < self.next_seq:
+            tail = self.tail
+            if (tail < start) or (tail >= end):
+                break
+            reclen, = LENGTH.unpack_from(self.map, HEADER_SIZE + tail)
+            tail += RECORD.size + reclen
+            self.tail_seq += 1
+            if _is_wrap(self.map, tail, self.data_size):
+                tail = 0
+            self.tail = tail
+
+    def _write_header(self):
+        HEADER.pack_into(
+            self.map,
+            0,
+            MAGIC,
+            VERSION,
+            self.data_size,
+            self.head,
+            self.tail,
+            self.next_seq,
+            self.tail_seq,
+        )
+
+    def close(self):
+        """ Commit any pending text, sync, and close the map. """
+        if self.map is None:
+            return None
+        self.flush()
+        self.map.flush()
+        self.map.close()
+        self.map = None
+
+    @property
+    def closed(self):
+        return self.map is None
+
+    def flush(self):
+        """ Commit any pending text as a record.
+            This does not sync the map to disk, see `sync()` for that.
+        """
+        with self.lock:
+            if self.pending:
+                self._append(''.join(self.pending).encode('utf-8', 'replace'))
+                self.pending = []
+
+    def records(self):
+        """ Return a list of (seq, bytes) for all records, oldest first. """
+        with self.lock:
+            return list(_iter_records(self.map))
+
+    def sync(self):
+        """ Force the map out to disk. This is a syscall, and is not needed
+            to survive a process crash. It is needed to survive a
+            system crash.
+        """
+        self.map.flush()
+
+    def write(self, s):
+        if not s:
+            return 0
+        with self.lock:
+            self.pending.append(s)
+            if s.endswith('\n'):
+                self._append(''.join(self.pending).encode('utf-8', 'replace'))
+                self.pending = []
+        return len(s)
+
+
+def _is_wrap(data, pos, size):
+    """ Returns True if a reader at `pos` should wrap to the start of the
+        data area.
+    """
+    if pos + LENGTH.size > size:
+        return True
+    return LENGTH.unpack_from(data, HEADER_SIZE + pos)[0] == WRAP
+
+
+def _iter_records(data):
+    """ Yield (seq, bytes) for all records in ring buffer data (bytes or a
+        map), oldest first.
+        Iteration stops early if the buffer is corrupt.
+    """
+    header = HEADER.unpack_from(data, 0)
+    magic, _, size, head, tail, next_seq, tail_seq = header
+    if magic != MAGIC:
+        raise ValueError('Not a printdebug ring buffer.')
+    if len(data) < HEADER_SIZE + size:
+        # Truncated file.
+        size = len(data) - HEADER_SIZE
+    pos = tail
+    for expected in range(tail_seq, next_seq):
+        if (pos >= size) or _is_wrap(data, pos, size):
+            pos = 0
+        reclen, seq = RECORD.unpack_from(data, HEADER_SIZE + pos)
+        start = HEADER_SIZE + pos + RECORD.size
+        if (seq != expected) or (pos + RECORD.size + reclen > size):
+            break
+        yield seq, bytes(data[start:start + reclen])
+        pos += RECORD.size + reclen
+
+
+def _read_header_fd(fd):
+    """ Read a ring buffer header from an open file descriptor.
+        Returns None if this is not a ring buffer.
+    """
+    data = os.pread(fd, HEADER.size, 0)
+    if len(data) < HEADER.size:
+        return None
+    header = HEADER.unpack(data)
+    if header[0] != MAGIC:
+        return None
+    if os.fstat(fd).st_size != HEADER_SIZE + header[2]:
+        return None
+    return header
+
+
+def read_ring_buffer(filename):
+    """ Yield (seq, bytes) for all records in a ring buffer file,
+        oldest first. This is safe to use on the file of a dead process.
+    """
+    with open(filename, 'rb') as f:
+        data = f.read()
+    if len(data) < HEADER_SIZE:
+        raise ValueError('Not a printdebug ring buffer: {}'.format(filename))
+    for record in _iter_records(data):
+        yield record
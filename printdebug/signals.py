@@ -0,0 +1,281 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" PrintDebug - Signals
+    ...opt-in signal handlers to control debug printing in a running
+    process: toggle it, change the verbosity, and dump thread stacks and
+    the ring buffer.
+
+    Usage:
+        install_signal_handlers(ring_buffer=ringbuf)
+        # kill -USR1 <pid>  : toggle debug printing.
+        # kill -USR2 <pid>  : dump the ring buffer and all thread stacks.
+
+    Dumps ('stacks', 'ring', and 'dump') are written even while debug
+    printing is disabled, because that's when they are needed most.
+
+    Signal handlers only queue an action. The actions run in a worker
+    thread, so a signal that arrives while the main thread holds a lock
+    (like in the middle of a debug print) can't deadlock.
+"""
+import queue
+import signal
+import sys
+import threading
+import traceback
+
+from . import tools
+
+# Actions that can be mapped to signals.
+actions = (
+    'toggle',
+    'enable',
+    'disable',
+    'verbose',
+    'quiet',
+    'stacks',
+    'ring',
+    'dump',
+)
+
+# Current verbosity, see verbosity_filter().
+_verbosity = 0
+# Actions queued by signal handlers, for the worker thread.
+# SimpleQueue.put() is safe to call from signal handlers.
+_queue = queue.SimpleQueue()
+# Settings, from install_signal_handlers().
+_settings = {
+    'printer': None,
+    'file': None,
+    'ring_buffer': None,
+}
+# Actions for the installed handlers, by signal number.
+_signal_actions = {}
+# Previous handlers, by signal number.
+_previous = {}
+_worker = None
+_lock = threading.Lock()
+# Line info for dump records.
+_dump_info = tools.LineInfo(__file__, 'run_action', 0)
+
+
+def default_actions():
+    """ Return the default {signal_number: action}, for signals that exist
+        on this platform.
+    """
+    sigactions = {}
+    for name, action in (('SIGUSR1', 'toggle'), ('SIGUSR2', 'dump')):
+        signum = getattr(signal, name, None)
+        if signum is not None:
+            sigactions[signum] = action
+    return sigactions
+
+
+def _handle_signal(signum, frame):
+    """ Signal handler, queues the action for the worker. """
+    _queue.put((_signal_actions.get(signum, None), signum))
+
+
+def install_signal_handlers(
+        sigactions=None, printer=None, file=None, ring_buffer=None):
+    """ Install signal handlers that control debug printing.
+        This must be called from the main thread.
+        Arguments:
+            sigactions   : A dict of {signal_number: action}, where action
+                           is one of `actions`:
+                               toggle   : Toggle `debug_enable()`.
+                               enable   : Enable debug printing.
+                               disable  : Disable debug printing.
+                               verbose  : Raise the verbosity by 1.
+                               quiet    : Lower the verbosity by 1.
+                               stacks   : Print stacks for all threads.
+                               ring     : Print the ring buffer records.
+                               dump     : Both `ring` and `stacks`.
+                           Default: `default_actions()`
+            printer      : A DebugPrinter to print messages with. Dumps
+                           go to its sinks, or its file.
+                           Default: printdebug.debug
+            file         : File to print to, instead of the printer's
+                           file (or stderr).
+            ring_buffer  : An MmapRingBuffer to dump.
+    """
+    global _worker
+    if sigactions is None:
+        sigactions = default_actions()
+    for action in sigactions.values():
+        if action not in actions:
+            raise ValueError('Invalid action: {!r} (expecting {})'.format(
+                action,
+                ', '.join(actions),
+            ))
+    with _lock:
+        _settings.update(
+            printer=printer,
+            file=file,
+            ring_buffer=ring_buffer,
+        )
+        if _worker is None:
+            _worker = threading.Thread(
+                target=_work,
+                name='printdebug-signals',
+                daemon=True,
+            )
+            _worker.start()
+        for signum, action in sigactions.items():
+            _signal_actions[signum] = action
+            previous = signal.signal(signum, _handle_signal)
+            _previous.setdefault(signum, previous)
+
+
+def uninstall_signal_handlers():
+    """ Restore the previous signal handlers, and stop the worker thread
+        after it runs any queued actions.
+    """
+    global _worker
+    with _lock:
+        for signum, previous in _previous.items():
+            signal.signal(signum, previous)
+        _previous.clear()
+        _signal_actions.clear()
+        worker = _worker
+        _worker = None
+    if worker is not None:
+        _queue.put((None, None))
+        worker.join()
+
+
+def run_action(action, signum=None):
+    """ Run a signal action now, in this thread.
+        Arguments:
+            action  : One of `actions`.
+            signum  : Signal number that triggered it, for messages.
+    """
+    source = action
+    if signum:
+        try:
+            source = signal.Signals(signum).name
+        except ValueError:
+            source = 'signal {}'.format(signum)
+    if action == 'toggle':
+        tools.debug_enable(not tools.enabled())
+        _debug_lines(['debug printing enabled by {}'.format(source)])
+    elif action == 'enable':
+        tools.debug_enable(True)
+        _debug_lines(['debug printing enabled by {}'.format(source)])
+    elif action == 'disable':
+        tools.debug_enable(False)
+    elif action in ('verbose', 'quiet'):
+        set_verbosity(_verbosity + (1 if action == 'verbose' else -1))
+        _debug_lines(['verbosity: {}'.format(_verbosity)])
+    elif action == 'stacks':
+        _dump_lines(stack_lines())
+    elif action == 'ring':
+        _dump_lines(ring_lines(_settings['ring_buffer']))
+    elif action == 'dump':
+        run_action('ring', signum=signum)
+        run_action('stacks', signum=signum)
+    else:
+        raise ValueError('Invalid action: {!r}'.format(action))
+
+
+def _debug_lines(lines):
+    """ Print lines with the installed printer or file. """
+    tools._debug_lines(
+        lines,
+        printer=_settings['printer'],
+        file=_settings['file'],
+    )
+
+
+def _dump_lines(lines):
+    """ Write dump lines to the installed printer's sinks, or the file,
+        without checking whether debug printing is enabled.
+    """
+    printer = _settings['printer']
+    file = _settings['file']
+    record = tools.DebugRecord(_dump_info, '\n'.join(lines))
+    if (file is None) and (printer is not None) and printer.all_sinks:
+        printer.emit(record)
+        return None
+    if file is None:
+        file = sys.stderr if printer is None else printer.file
+    if hasattr(file, 'write_record'):
+        file.write_record(record)
+        return None
+    file.write('{}\n'.format(record.text))
+    file.flush()
+
+
+def _work():
+    """ Run queued actions, until a None action is queued. """
+    while True:
+        action, signum = _queue.get()
+        if action is None:
+            return None
+        try:
+            run_action(action, signum=signum)
+        except Exception:
+            # Keep handling signals, the traceback is printed if possible.
+            tools.debug_exc()
+
+
+def ring_lines(ring_buffer):
+    """ Return lines for all records in an MmapRingBuffer. """
+    if (ring_buffer is None) or ring_buffer.closed:
+        return ['ring buffer: none']
+    ring_buffer.flush()
+    records = ring_buffer.records()
+    lines = ['ring buffer: {} record{}'.format(
+        len(records),
+        '' if len(records) == 1 else 's',
+    )]
+    for seq, data in records:
+        text = data.decode('utf-8', 'replace').rstrip('\n')
+        lines.extend(
+            '    {:>6} {}'.format(seq, line) for line in text.splitlines()
+        )
+    return lines
+
+
+def set_verbosity(value):
+    """ Set the verbosity for `verbosity_filter()`. It's never below 0. """
+    global _verbosity
+    _verbosity = max(int(value), 0)
+
+
+def stack_lines():
+    """ Return lines for the current stack of every thread. """
+    frames = sys._current_frames()
+    threads = {t.ident: t for t in threading.enumerate()}
+    lines = ['stacks: {} thread{}'.format(
+        len(frames),
+        '' if len(frames) == 1 else 's',
+    )]
+    current = threading.get_ident()
+    for ident, frame in frames.items():
+        thread = threads.get(ident, None)
+        lines.append('    Thread {} ({}){}:'.format(
+            ident if thread is None else thread.name,
+            ident,
+            ' (dumping)' if ident == current else '',
+        ))
+        for entry in traceback.format_stack(frame):
+            lines.extend(
+                '    {}'.format(line) for line in entry.rstrip().splitlines()
+            )
+    return lines
+
+
+def verbosity():
+    """ Return the current verbosity. """
+    return _verbosity
+
+
+def verbosity_filter(minimum):
+    """ Return a `Sink(filter=...)` function that only passes records while
+        the verbosity is at least `minimum`. The verbosity can be changed
+        with `set_verbosity()`, or the 'verbose' and 'quiet' signal
+        actions.
+    """
+    def verbosity_ok(record):
+        return _verbosity >= minimum
+    return verbosity_ok
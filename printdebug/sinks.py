@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" PrintDebug - Sinks
+    ...fan debug records out to several destinations, formatting each
+    record once per distinct formatter.
+
+    Usage:
+        plain = TextFormatter()
+        dp = DebugPrinter(sinks=[
+            Sink(sys.stderr, ColrFormatter()),
+            Sink(open('debug.log', 'a'), plain),
+            Sink(MmapRingBuffer('debug.pdring'), plain),
+            Sink(BinaryLogWriter('debug.pdbl')),
+        ])
+        # The frame is inspected once, and `plain` renders once.
+        dp.debug('Hello.')
+"""
+import os.path
+
+from . import tools
+from .context import empty_context
+
+
+class TextFormatter(object):
+    """ Renders a DebugRecord as a line of text, using a `fmt` template
+        like `DebugPrinter` does.
+        The line info is cached per call site, unless the template uses
+        dynamic fields like {time}.
+    """
+    def __init__(self, fmt=None, ljustwidth=40, basename=True):
+        self.fmt = fmt or tools.default_format
+        self.ljustwidth = ljustwidth
+        self.basename = basename
+        # Rendered line info, (filename, lineno, name): str
+        self.lineinfos = {}
+        # Last record times, for the {delta_ms} and {site_delta_ms} fields.
+        self.field_state = tools.FieldState()
+        # Whether the last record didn't end the line, so the next one
+        # continues it without line info.
+        self.continued = False
+
+    def __repr__(self):
+        return '{}(fmt={!r}, ljustwidth={!r}, basename={!r})'.format(
+            self.__class__.__name__,
+            str(self.fmt),
+            self.ljustwidth,
+            self.basename,
+        )
+
+    def format(self, record):
+        """ Return a full line (with `record.end`) for a DebugRecord.
+            Aligned records get spaces instead of line info, and records
+            that follow one without a newline get no line info at all, like
+            `debug()` does.
+        """
+        continued = self.continued
+        self.continued = not record.end.endswith('\n')
+        if continued:
+            return ''.join((self.format_text(record.text), record.end))
+        fields = tools._fmt_fields(self.fmt)
+        if fields:
+            lineinfo = self.format_lineinfo(record, fields)
+        else:
+            info = record.info
+            key = (info.filename, info.lineno, record.name)
+            lineinfo = self.lineinfos.get(key, None)
+            if lineinfo is None:
+                lineinfo = self.lineinfos[key] = self.format_lineinfo(record)
+        if record.align:
+            lineinfo = ' ' * self.lineinfo_len(lineinfo)
+        return ''.join((lineinfo, self.format_text(record.text), record.end))
+
+    def format_lineinfo(self, record, fields=None):
+        """ Return the line info for a DebugRecord.
+            Arguments:
+                record  : The DebugRecord to render.
+                fields  : Dynamic fields used by `self.fmt`, if any.
+        """
+        info = record.info
+        if self.basename:
+            fname = os.path.split(info.filename)[-1]
+        else:
+            fname = info.filename
+        # fmt may be a Colr instance, it knows how to justify itself.
+        return str(self.fmt.format(
+            filename=fname,
+            lineno=info.lineno,
+            name=record.name,
+            **tools._fmt_values(
+                fields,
+                info,
+                self.field_state,
+                timestamp=record.time,
+                monotonic=record.monotonic,
+                thread=record.thread,
+                ctx=record.context or empty_context,
+            )
+        ).ljust(self.ljustwidth))
+
+    def format_text(self, text):
+        """ Overridable, transforms the message text. """
+        return text
+
+    def lineinfo_len(self, s):
+        """ Overridable, returns the length of rendered line info. """
+        return len(s)
+
+
+class ColrFormatter(TextFormatter):
+    """ Renders a DebugRecord as colorized text, like `DebugColrPrinter`
+        does.
+    """
+    textcolor = 'green'
+
+    def __init__(self, fmt=None, ljustwidth=40, basename=True):
+        if tools.default_colr_format is None:
+            imperr = ImportError(
+                'The colr module is required for ColrFormatter.'
+            )
+            imperr.name = 'colr'
+            raise imperr
+        super(ColrFormatter, self).__init__(
+            fmt=fmt or tools.default_colr_format,
+            ljustwidth=ljustwidth,
+            basename=basename,
+        )
+
+    def format_text(self, text):
+        return str(tools.C(text, self.textcolor))
+
+    def lineinfo_len(self, s):
+        """ Return the line info length, without escape codes. """
+        return len(tools.C(s).stripped())
+
+
+class Sink(object):
+    """ A destination for debug records, used with `DebugPrinter(sinks=)`.
+        Text sinks need a `file` with a `write` method, and are given a
+        TextFormatter by default. Structured sinks (anything with a
+        `write_record` method, like BinaryLogWriter) get the raw record
+        when no formatter is given.
+    """
+    def __init__(self, file, formatter=None, enabled=True, filter=None):
+        """ Initialize a sink.
+            Arguments:
+                file       : File-like object to write to.
+                formatter  : Formatter to render records with.
+                             Share one instance between sinks to render
+                             records only once.
+                enabled    : Whether this sink is enabled.
+                filter     : A function that accepts a DebugRecord, and
+                             returns False if it should be skipped.
+        """
+        if (formatter is None) and not hasattr(file, 'write_record'):
+            formatter = TextFormatter()
+        self.file = file
+        self.formatter = formatter
+        self.enabled = enabled
+        self.filter = filter
+
+    def __repr__(self):
+        return '{}({!r}, formatter={!r}, enabled={!r})'.format(
+            self.__class__.__name__,
+            self.file,
+            self.formatter,
+            self.enabled,
+        )
+
+    def emit(self, record, rendered=None):
+        """ Write a DebugRecord to this sink, if it is enabled and passes
+            the filter.
+            Arguments:
+                record    : The DebugRecord to write.
+                rendered  : A dict of formatter: output for this record,
+                            shared between sinks.
+        """
+        if not self.enabled:
+            return None
+        if (self.filter is not None) and (not self.filter(record)):
+            return None
+        formatter = self.formatter
+        if formatter is None:
+            self.file.write_record(record)
+            return None
+        if rendered is None:
+            rendered = {}
+        text = rendered.get(formatter, None)
+        if text is None:
+            text = rendered[formatter] = formatter.format(record)
+        self.file.write(text)
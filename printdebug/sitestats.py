@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" PrintDebug - Site Stats
+    ...per call site statistics for `debug()` calls, to find the ones that
+    cost the most.
+
+    Usage:
+        stats_enable(atexit_report=True)
+        ...
+        for site in stats(sort='time', limit=10):
+            print(site)
+"""
+import atexit
+import sys
+import threading
+import weakref
+
+# The StatsTable that debug() records into, or None when disabled.
+table = None
+# The last StatsTable, kept after stats are disabled so they can be read.
+_recorded = None
+# Whether the atexit report was registered.
+_atexit_registered = False
+# Report options for the atexit report.
+_atexit_options = {}
+
+# Sort keys for stats().
+sort_keys = ('calls', 'bytes', 'suppressed', 'time')
+
+
+class SiteStats(object):
+    """ Statistics for a single call site, returned by `stats()`. """
+    def __init__(
+            self, filename, lineno, name, calls, bytes, suppressed,
+            time_ns):
+        self.filename = filename
+        self.lineno = lineno
+        self.name = name
+        # Number of calls, including suppressed calls.
+        self.calls = calls
+        # Bytes written, encoded as UTF-8.
+        self.bytes = bytes
+        # Calls that were suppressed because debug was disabled.
+        self.suppressed = suppressed
+        # Cumulative time spent inside printdebug, in nanoseconds.
+        self.time_ns = time_ns
+
+    def __repr__(self):
+        return '{}({})'.format(
+            self.__class__.__name__,
+            ', '.join(
+                '{}={!r}'.format(k, getattr(self, k))
+                for k in (
+                    'filename', 'lineno', 'name', 'calls', 'bytes',
+                    'suppressed', 'time_ns',
+                )
+            )
+        )
+
+    def __str__(self):
+        return '{}:{} {}(): {}'.format(
+            self.filename,
+            self.lineno,
+            self.name,
+            '{} calls, {} bytes, {} suppressed, {:.3f}ms'.format(
+                self.calls,
+                self.bytes,
+                self.suppressed,
+                self.time_ns / 1000000,
+            ),
+        )
+
+    @property
+    def avg_ns(self):
+        """ Average time per call, in nanoseconds. """
+        if not self.calls:
+            return 0
+        return self.time_ns // self.calls
+
+    @property
+    def time(self):
+        """ Sort key alias for `time_ns`. """
+        return self.time_ns
+
+
+class _ThreadRows(object):
+    """ Holds a thread's rows in a StatsTable's thread-local storage.
+        It's freed when the thread ends, so it can be watched with a
+        weakref.
+    """
+    __slots__ = ('rows', '__weakref__')
+
+    def __init__(self):
+        self.rows = {}
+
+
+class StatsTable(object):
+    """ A table of call site counters.
+        Each site gets a row of 4 counters: calls, bytes, suppressed,
+        time_ns. Every thread records into its own rows, so there is no
+        lock on the hot path, and rows are merged when they are read.
+        When a thread ends, its rows are merged into `retired`.
+    """
+    def __init__(self):
+        self.local = threading.local()
+        # Rows for every running thread that recorded anything,
+        # [{(filename, lineno, name): [calls, bytes, suppressed, time_ns]}]
+        self.tables = []
+        # Merged rows from threads that ended.
+        self.retired = {}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.merged())
+
+    def add(self, key, size, elapsed_ns, suppressed=False):
+        """ Count a single call for a call site. """
+        try:
+            rows = self.local.rows
+        except AttributeError:
+            rows = self._add_thread()
+        row = rows.get(key, None)
+        if row is None:
+            row = rows[key] = [0, 0, 0, 0]
+        row[0] += 1
+        row[1] += size
+        if suppressed:
+            row[2] += 1
+        row[3] += elapsed_ns
+
+    def _add_thread(self):
+        """ Create rows for the current thread, and return them. """
+        holder = _ThreadRows()
+        rows = self.local.rows = holder.rows
+        self.local.holder = holder
+        with self.lock:
+            self.tables.append(rows)
+        # Runs when the thread's local storage is freed.
+        weakref.finalize(holder, self._retire, rows).atexit = False
+        return rows
+
+    def _retire(self, rows):
+        """ Merge rows from a thread that ended into `retired`. """
+        with self.lock:
+            try:
+                self.tables.remove(rows)
+            except ValueError:
+                return None
+            _merge_rows(self.retired, rows)
+
+    def clear(self):
+        with self.lock:
+            for rows in self.tables:
+                rows.clear()
+            self.retired.clear()
+
+    def merged(self):
+        """ Return rows for all threads, merged into a single dict. """
+        merged = {}
+        with self.lock:
+            tables = list(self.tables)
+            _merge_rows(merged, self.retired)
+        for rows in tables:
+            _merge_rows(merged, rows)
+        return merged
+
+    def sites(self):
+        """ Return a list of SiteStats, in no particular order. """
+        return [
+            SiteStats(filename, lineno, name, *row)
+            for (filename, lineno, name), row in self.merged().items()
+        ]
+
+
+def _merge_rows(merged, rows):
+    """ Add the counters from a rows dict to another one. """
+    # list() copies the items without letting other threads in.
+    for key, row in list(rows.items()):
+        existing = merged.get(key, None)
+        if existing is None:
+            merged[key] = list(row)
+        else:
+            for i, value in enumerate(row):
+                existing[i] += value
+
+
+def print_stats(file=None, sort='time', limit=20):
+    """ Print a report of the hottest call sites.
+        Arguments:
+            file   : File to print to. Default: sys.stderr
+            sort   : Sort key, see `stats()`.
+            limit  : Maximum number of sites to print.
+    """
+    if file is None:
+        file = sys.stderr
+    sites = stats(sort=sort, limit=limit)
+    print('\nprintdebug stats: ({} sites, by {})'.format(
+        len(_recorded or ()),
+        sort,
+    ), file=file)
+    for site in sites:
+        print('    {}'.format(site), file=file)
+
+
+def _print_atexit():
+    if _recorded is not None:
+        print_stats(**_atexit_options)
+
+
+def stats(sort='time', limit=None):
+    """ Return a list of SiteStats, sorted in descending order.
+        Arguments:
+            sort   : Sort key, one of `sort_keys`: 'calls', 'bytes',
+                     'suppressed', or 'time'.
+            limit  : Maximum number of sites to return.
+    """
+    if sort not in sort_keys:
+        raise ValueError('Invalid sort key: {!r} (expecting {})'.format(
+            sort,
+            ', '.join(sort_keys),
+        ))
+    if _recorded is None:
+        return []
+    sites = sorted(
+        _recorded.sites(),
+        key=lambda site: getattr(site, sort),
+        reverse=True,
+    )
+    if limit is not None:
+        return sites[:limit]
+    return sites
+
+
+def stats_enable(enabled=True, atexit_report=False, **report_options):
+    """ Enable or disable per call site stats for `debug()` and
+        `DebugPrinter.debug()`. Recorded stats are kept when disabled,
+        and recording continues where it left off when re-enabled.
+        Arguments:
+            enabled         : Whether to record stats.
+            atexit_report   : Whether to print a report at exit.
+            report_options  : Arguments for `print_stats()` at exit.
+    """
+    global table, _recorded, _atexit_registered
+    if not enabled:
+        table = None
+        return None
+    if _recorded is None:
+        _recorded = StatsTable()
+    table = _recorded
+    if atexit_report:
+        _atexit_options.clear()
+        _atexit_options.update(report_options)
+        if not _atexit_registered:
+            atexit.register(_print_atexit)
+            _atexit_registered = True
+
+
+def stats_reset():
+    """ Clear all recorded stats. """
+    if _recorded is not None:
+        _recorded.clear()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" PrintDebug - Structured Output
+    ...JSON Lines output for debug records, one object per record.
+"""
+import json
+import os
+from json.encoder import encode_basestring_ascii
+
+from . import tools
+
+
+class JSONLinesWriter(object):
+    """ A structured sink that writes one JSON object per debug record.
+        Pass it as the `file` for `debug()` or `DebugPrinter`.
+
+        Usage:
+            dp = DebugPrinter(file=JSONLinesWriter(sys.stderr))
+            dp.debug('Hello.')
+            # or:
+            debug('Hello.', file=JSONLinesWriter(sys.stderr))
+
+        Output:
+            {"filename": "myfile.py", "lineno": 3, "function": "main",
+             "parent": null, "pid": 1234, "thread": 1403, "time": 1.5e9,
+             "monotonic": 8812.3, "message": "Hello."}
+
+        The call site fields are encoded once per call site, so only the
+        thread, times, and message are encoded per call. Fields from
+        `printdebug.context()` are added as a "context" object, encoded
+        once per context.
+    """
+
+    def __init__(self, file, basename=False):
+        """ Initialize a writer for an open text file object, or a
+            file name.
+            Arguments:
+                file      : Open file object, or a file name to open.
+                basename  : Whether to use just the base name of the file.
+                            Default: False
+        """
+        if isinstance(file, str):
+            self.file = open(file, 'a')
+            self.owned = True
+        else:
+            self.file = file
+            self.owned = False
+        self.basename = basename
+        # Encoded JSON object prefixes, (filename, lineno, name, parent, pid)
+        self.prefixes = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exctype, value, traceback):
+        self.close()
+        # Allow exceptions to propogate by not returning True.
+        return None
+
+    def close(self):
+        """ Flush the file, and close it if it was opened by this writer. """
+        self.flush()
+        if self.owned:
+            self.file.close()
+
+    def flush(self):
+        self.file.flush()
+
+    def format_record(self, record):
+        """ Return a JSON line (with newline) for a DebugRecord. """
+        info = record.info
+        key = (
+            info.filename, info.lineno, info.name, record.parent, tools._pid,
+        )
+        prefix = self.prefixes.get(key, None)
+        if prefix is None:
+            prefix = self.prefixes[key] = self.format_prefix(record)
+        monotonic = record.monotonic
+        if record.context is None:
+            end = '}\n'
+        else:
+            end = ''.join((', "context": ', record.context.json, '}\n'))
+        return ''.join((
+            prefix,
+            '"thread": ',
+            str(record.thread),
+            ', "time": ',
+            repr(record.time),
+            ', "monotonic": ',
+            'null' if monotonic is None else repr(monotonic),
+            ', "message": ',
+            encode_basestring_ascii(record.text),
+            end,
+        ))
+
+    def format_prefix(self, record):
+        """ Encode the call site fields for a record, which are the same for
+            every call from that site.
+        """
+        info = record.info
+        if self.basename:
+            filename = os.path.split(info.filename)[-1]
+        else:
+            filename = info.filename
+        prefix = json.dumps({
+            'filename': filename,
+            'lineno': info.lineno,
+            'function': info.name,
+            'parent': record.parent,
+            'pid': tools._pid,
+        })
+        # Leave the object open for the per-call fields.
+        return '{}, '.format(prefix[:-1])
+
+    def write_record(self, record):
+        """ Write a single DebugRecord as a JSON line. """
+        self.file.write(self.format_record(record))
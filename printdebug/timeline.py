@@ -0,0 +1,287 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" PrintDebug - Timeline
+    ...trace spans, streamed to a Chrome trace-event JSON file that can be
+    opened in chrome://tracing or https://ui.perfetto.dev.
+
+    Usage:
+        timeline_start('trace.json')
+        with debug_span('load', path=path):
+            with debug_span('parse'):
+                ...
+        timeline_stop()
+
+        # debug() output can be added to the timeline as instant events:
+        dp = DebugPrinter(sinks=[Sink(sys.stderr), Sink(timeline_writer())])
+"""
+import json
+import os.path
+import sys
+import threading
+import time
+
+from . import tools
+
+# The TraceWriter that debug_span() records into, or None.
+_writer = None
+
+
+class Span(object):
+    """ A context manager that records a complete event ('X') when it
+        exits. Spans nest by time, so inner spans show up under outer
+        spans on the same thread.
+    """
+    __slots__ = ('writer', 'name', 'args', 'start')
+
+    def __init__(self, writer, name, args=None):
+        self.writer = writer
+        self.name = name
+        self.args = args
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.monotonic_ns()
+        return self
+
+    def __exit__(self, exctype, value, traceback):
+        end = time.monotonic_ns()
+        args = self.args
+        if exctype is not None:
+            args = dict(args or {})
+            args['exception'] = exctype.__name__
+        self.writer.complete(self.name, self.start, end, args)
+        # Allow exceptions to propogate by not returning True.
+        return None
+
+
+class NullSpan(object):
+    """ A span that records nothing, used when there is no timeline. """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exctype, value, traceback):
+        # Allow exceptions to propogate by not returning True.
+        return None
+
+
+_null_span = NullSpan()
+
+
+class TraceWriter(object):
+    """ Writes Chrome trace events to a file as a JSON array.
+        Events are buffered, and encoded/written every `buffer_size`
+        events, so large traces don't stay in memory.
+        This can be used as a `file` for `debug()`, or in a Sink, to add
+        debug records as instant events.
+    """
+    def __init__(self, file, buffer_size=1000):
+        """ Initialize a writer.
+            Arguments:
+                file         : File name, or file-like object opened for
+                               writing text.
+                buffer_size  : Number of events to buffer before writing.
+        """
+        if isinstance(file, str):
+            self.file = open(file, 'w')
+            self.owned = True
+        else:
+            self.file = file
+            self.owned = False
+        self.buffer_size = buffer_size
+        # Unencoded events: (phase, name, ts_ns, dur_ns, tid, args)
+        self.buffer = []
+        self.lock = threading.Lock()
+        # Thread idents that have a 'thread_name' metadata event.
+        self.threads = set()
+        # Whether an event was written, to separate them with commas.
+        self.written = False
+        self.file.write('[\n')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exctype, value, traceback):
+        self.close()
+        # Allow exceptions to propogate by not returning True.
+        return None
+
+    def __repr__(self):
+        return '{}({!r}, buffer_size={!r})'.format(
+            self.__class__.__name__,
+            getattr(self.file, 'name', self.file),
+            self.buffer_size,
+        )
+
+    def _add(self, event):
+        tid = event[4]
+        with self.lock:
+            if self.buffer is None:
+                # Closed.
+                return None
+            if tid not in self.threads:
+                self.threads.add(tid)
+                self.buffer.append((
+                    'M',
+                    'thread_name',
+                    0,
+                    None,
+                    tid,
+                    {'name': tools.thread_name(tid)},
+                ))
+            self.buffer.append(event)
+            if len(self.buffer) >= self.buffer_size:
+                self._flush()
+
+    def _flush(self):
+        """ Encode and write buffered events. The lock must be held. """
+        if not self.buffer:
+            return None
+        pid = tools._pid
+        lines = []
+        for phase, name, ts, dur, tid, args in self.buffer:
+            event = {
+                'ph': phase,
+                'name': name,
+                'cat': 'printdebug',
+                'pid': pid,
+                'tid': tid,
+                'ts': ts / 1000,
+            }
+            if dur is not None:
+                event['dur'] = dur / 1000
+            if phase == 'i':
+                # Thread-scoped instant event.
+                event['s'] = 't'
+            if args:
+                event['args'] = args
+            lines.append(json.dumps(event, default=str))
+        self.buffer = []
+        if self.written:
+            self.file.write(',\n')
+        self.file.write(',\n'.join(lines))
+        self.written = True
+
+    def close(self):
+        """ Write any buffered events, and finish the JSON array. """
+        with self.lock:
+            if self.buffer is None:
+                return None
+            self._flush()
+            self.buffer = None
+            self.file.write('\n]\n')
+            if self.owned:
+                self.file.close()
+            else:
+                self.file.flush()
+
+    @property
+    def closed(self):
+        return self.buffer is None
+
+    def complete(self, name, start_ns, end_ns, args=None, tid=None):
+        """ Record a complete event ('X'), with monotonic nanosecond
+            start/end times.
+        """
+        self._add((
+            'X',
+            name,
+            start_ns,
+            end_ns - start_ns,
+            threading.get_ident() if tid is None else tid,
+            args,
+        ))
+
+    def flush(self):
+        """ Write any buffered events. """
+        with self.lock:
+            if self.buffer is not None:
+                self._flush()
+            self.file.flush()
+
+    def instant(self, name, ts_ns=None, args=None, tid=None):
+        """ Record an instant event ('i'). """
+        self._add((
+            'i',
+            name,
+            time.monotonic_ns() if ts_ns is None else ts_ns,
+            None,
+            threading.get_ident() if tid is None else tid,
+            args,
+        ))
+
+    def span(self, name, **args):
+        """ Return a Span context manager for this writer. """
+        return Span(self, name, args or None)
+
+    def write(self, s):
+        """ Record text as instant events, one per line. """
+        for line in s.splitlines():
+            if line:
+                self.instant(line)
+        return len(s)
+
+    def write_record(self, record):
+        """ Record a DebugRecord as an instant event, with it's line info.
+        """
+        info = record.info
+        monotonic = record.monotonic
+        self.instant(
+            record.text,
+            ts_ns=None if monotonic is None else int(monotonic * 1e9),
+            args={
+                'site': '{}:{}'.format(
+                    os.path.split(info.filename)[-1],
+                    info.lineno,
+                ),
+                'name': record.name,
+            },
+            tid=record.thread,
+        )
+
+
+def debug_span(name, **args):
+    """ Return a context manager that records a span on the timeline,
+        with it's call site. When there is no timeline (see
+        `timeline_start()`), this does nothing.
+        Arguments:
+            name  : Name for the span.
+            args  : Extra info for the span, shown in the trace viewer.
+    """
+    writer = _writer
+    if writer is None:
+        return _null_span
+    frame = sys._getframe(1)
+    args['site'] = '{}:{}'.format(
+        os.path.split(frame.f_code.co_filename)[-1],
+        frame.f_lineno,
+    )
+    return Span(writer, name, args)
+
+
+def timeline_start(file, buffer_size=1000):
+    """ Start recording spans from `debug_span()` into a trace file, and
+        return the TraceWriter. Any previous timeline is closed.
+        Arguments:
+            file         : File name, or file-like object.
+            buffer_size  : Number of events to buffer before writing.
+    """
+    global _writer
+    timeline_stop()
+    _writer = TraceWriter(file, buffer_size=buffer_size)
+    return _writer
+
+
+def timeline_stop():
+    """ Stop recording spans, and close the trace file. """
+    global _writer
+    writer = _writer
+    _writer = None
+    if writer is not None:
+        writer.close()
+
+
+def timeline_writer():
+    """ Return the current TraceWriter, or None. """
+    return _writer
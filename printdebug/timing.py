@@ -0,0 +1,305 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" PrintDebug - Timing
+    ...a timer for debug output, usable as a context manager or decorator,
+    with per call site latency histograms.
+
+    Usage:
+        with debug_timer('loading'):
+            load()
+        # myfile.py:   12    main(): loading: 12.345ms
+
+        @debug_timer(aggregate=True, report_every=10)
+        def handle(request):
+            ...
+        # Every 10 seconds (at most), a summary is printed instead:
+        # myfile.py:   30    main(): handle: n=1520 p50=1.210ms ...
+"""
+import functools
+import sys
+import threading
+import time
+
+from . import tools
+
+# Sub-buckets per power of two, as bits. 4 bits = 16 sub-buckets, so values
+# are within about 6% of their bucket.
+SUBBUCKET_BITS = 4
+
+# Histograms for aggregate timers, by site: LatencyHistogram
+_histograms = {}
+_histograms_lock = threading.Lock()
+
+
+class LatencyHistogram(object):
+    """ A log-linear histogram of nanosecond durations.
+        Each power of two is split into linear sub-buckets, so recording is
+        cheap and percentiles have a bounded relative error.
+    """
+    def __init__(self, label=None):
+        self.label = label
+        self.lock = threading.Lock()
+        self._clear()
+
+    def __repr__(self):
+        return '{}({!r}, count={})'.format(
+            self.__class__.__name__,
+            self.label,
+            self.count,
+        )
+
+    def __str__(self):
+        return self.summary()
+
+    def add(self, ns):
+        """ Record a single duration, in nanoseconds. """
+        bucket = bucket_index(ns)
+        with self.lock:
+            counts = self.counts
+            counts[bucket] = counts.get(bucket, 0) + 1
+            self.count += 1
+            self.total += ns
+            if ns > self.max:
+                self.max = ns
+            if (self.min is None) or (ns < self.min):
+                self.min = ns
+
+    @property
+    def mean(self):
+        """ Mean duration in nanoseconds. """
+        if not self.count:
+            return 0
+        return self.total / self.count
+
+    def percentile(self, pct):
+        """ Return an estimated duration, in nanoseconds, for a percentile
+            (0-100). The estimate is the middle of the bucket, clamped to
+            the recorded min/max.
+        """
+        if not self.count:
+            return 0
+        target = self.count * (pct / 100)
+        seen = 0
+        with self.lock:
+            buckets = sorted(self.counts.items())
+        for bucket, count in buckets:
+            seen += count
+            if seen >= target:
+                low, high = bucket_range(bucket)
+                return max(self.min, min(self.max, (low + high) // 2))
+        return self.max
+
+    def _clear(self):
+        """ Clear all recorded durations. The lock must be held. """
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self.min = None
+        # When this histogram was last reset/reported, for periodic dumps.
+        self.started = time.monotonic()
+
+    def reset(self):
+        """ Clear all recorded durations. """
+        with self.lock:
+            self._clear()
+
+    def take(self, min_age=None):
+        """ Return a copy of this histogram and reset it, atomically.
+            Arguments:
+                min_age  : Only take the durations if this many seconds
+                           passed since the last reset, otherwise return
+                           None. Only one thread gets a report window.
+        """
+        with self.lock:
+            if (min_age is not None) and (
+                    time.monotonic() - self.started < min_age):
+                return None
+            snapshot = LatencyHistogram(self.label)
+            snapshot.counts = self.counts
+            snapshot.count = self.count
+            snapshot.total = self.total
+            snapshot.max = self.max
+            snapshot.min = self.min
+            snapshot.started = self.started
+            self._clear()
+        return snapshot
+
+    def summary(self):
+        """ Return a one-line summary, with times in milliseconds. """
+        return ' '.join((
+            '{}: n={}'.format(self.label, self.count),
+            'p50={:.3f}ms p95={:.3f}ms p99={:.3f}ms max={:.3f}ms'.format(
+                self.percentile(50) / 1000000,
+                self.percentile(95) / 1000000,
+                self.percentile(99) / 1000000,
+                self.max / 1000000,
+            ),
+        ))
+
+
+def bucket_index(ns):
+    """ Return the log-linear bucket index for a duration. """
+    if ns < (1 << SUBBUCKET_BITS):
+        # Small values get exact buckets.
+        return ns
+    shift = ns.bit_length() - SUBBUCKET_BITS - 1
+    # The top bits (without the leading 1) pick the sub-bucket.
+    return ((shift + 1) << SUBBUCKET_BITS) | (
+        (ns >> shift) & ((1 << SUBBUCKET_BITS) - 1)
+    )
+
+
+def bucket_range(bucket):
+    """ Return the (low, high) durations covered by a bucket index. """
+    if bucket < (1 << SUBBUCKET_BITS):
+        return bucket, bucket
+    shift = (bucket >> SUBBUCKET_BITS) - 1
+    sub = bucket & ((1 << SUBBUCKET_BITS) - 1)
+    low = ((1 << SUBBUCKET_BITS) | sub) << shift
+    return low, low + (1 << shift) - 1
+
+
+class debug_timer(object):
+    """ Debug-print elapsed time for a block or function call, with the
+        caller's line info.
+        In aggregate mode, durations are recorded into a histogram per call
+        site (or per decorated function), and a summary is printed every
+        `report_every` seconds instead of a line per call.
+
+        Usage:
+            with debug_timer('loading'):
+                load()
+
+            @debug_timer()
+            def load():
+                ...
+    """
+    def __init__(
+            self, label=None, aggregate=False, report_every=10,
+            printer=None, file=None):
+        """ Initialize a timer.
+            Arguments:
+                label         : Label for the output.
+                                Default: 'elapsed', or the function name
+                                when used as a decorator.
+                aggregate     : Whether to record into histograms and print
+                                periodic summaries.
+                report_every  : Seconds between summaries in aggregate mode.
+                                Summaries are printed (and reset) by the next
+                                timer to finish after this many seconds.
+                printer       : A DebugPrinter to print with.
+                                Default: printdebug.debug
+                file          : File to print to, when no printer is given.
+        """
+        self.label = label
+        self.aggregate = aggregate
+        self.report_every = report_every
+        self.printer = printer
+        self.file = file
+        # Start times and sites for nested/reused context managers.
+        self.local = threading.local()
+
+    def __call__(self, func):
+        """ Decorate a function, timing every call to it. """
+        label = self.label or getattr(func, '__qualname__', func.__name__)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter_ns()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                # A single histogram per decorated function.
+                self._report(
+                    func,
+                    label,
+                    time.perf_counter_ns() - start,
+                    level=1,
+                )
+        return wrapper
+
+    def __enter__(self):
+        stack = self.local.__dict__.setdefault('stack', [])
+        if self.aggregate:
+            # The with statement is the site.
+            frame = sys._getframe(1)
+            site = (frame.f_code.co_filename, frame.f_lineno)
+        else:
+            site = None
+        stack.append((site, time.perf_counter_ns()))
+        return self
+
+    def __exit__(self, exctype, value, traceback):
+        site, start = self.local.stack.pop()
+        self._report(
+            site,
+            self.label or 'elapsed',
+            time.perf_counter_ns() - start,
+            level=1,
+        )
+        # Allow exceptions to propogate by not returning True.
+        return None
+
+    def _debug(self, text, level=0):
+        """ Print with the printer, or printdebug.debug.
+            Account for the call to _debug().
+        """
+        if self.printer is None:
+            tools.debug(text, file=self.file, level=level + 1)
+        else:
+            self.printer.debug(text, level=level + 1)
+
+    def _report(self, site, label, elapsed_ns, level=0):
+        """ Print the elapsed time, or record it in aggregate mode.
+            Account for the call to _report().
+        """
+        level += 1
+        if not self.aggregate:
+            self._debug(
+                '{}: {:.3f}ms'.format(label, elapsed_ns / 1000000),
+                level=level,
+            )
+            return None
+        histogram = get_histogram(site, label)
+        histogram.add(elapsed_ns)
+        if time.monotonic() - histogram.started >= self.report_every:
+            # Threads can get here together, only one takes the window.
+            snapshot = histogram.take(min_age=self.report_every)
+            if snapshot is not None:
+                self._debug(snapshot.summary(), level=level)
+
+
+def get_histogram(site, label=None):
+    """ Return the LatencyHistogram for a timer site, creating it if
+        needed.
+    """
+    histogram = _histograms.get(site, None)
+    if histogram is None:
+        with _histograms_lock:
+            histogram = _histograms.get(site, None)
+            if histogram is None:
+                histogram = _histograms[site] = LatencyHistogram(label)
+    return histogram
+
+
+def timer_histograms():
+    """ Return a list of all aggregate timer histograms. """
+    with _histograms_lock:
+        return list(_histograms.values())
+
+
+def print_timer_summaries(file=None, reset=False):
+    """ Print summaries for all aggregate timers that recorded anything.
+        Arguments:
+            file   : File to print to. Default: sys.stderr
+            reset  : Whether to reset the histograms afterwards.
+    """
+    if file is None:
+        file = sys.stderr
+    for histogram in timer_histograms():
+        if not histogram.count:
+            continue
+        print(histogram.summary(), file=file)
+        if reset:
+            histogram.reset()
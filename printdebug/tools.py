@@ -7,8 +7,13 @@ from __future__ import print_function, with_statement
 import inspect
 import json
 import os.path
+import reprlib
+import string
 import sys
+import threading
+import time
 import traceback
+import weakref
 from warnings import warn
 
 try:
@@ -20,22 +25,38 @@ try:
 except ImportError:
     C = None
 
+from . import sitestats as _stats
+from . import tracebacks as _tracebacks
+from .expr import (
+    arg_sources,
+    format_args,
+)
+from .context import (
+    current_context,
+    empty_context,
+)
+
 __version__ = '0.3.5'
 
 __all__ = [
     '__version__',
     'DebugColrPrinter',
     'DebugPrinter',
+    'DebugRecord',
     'debug',
     'debug_enable',
     'debug_exc',
+    'debug_expr',
     'debug_json',
+    'debug_locals',
     'debug_object',
     'default_colr_format',
     'default_format',
     'enabled',
+    'format_time',
     'get_frame',
     'get_lineinfo',
+    'get_printer',
     'json_str',
     'object_str',
     'pop_or',
@@ -43,7 +64,11 @@ __all__ = [
     'print_object',
     'printobject',
     'LineInfo',
+    'short_repr',
     'suppress',
+    'task_name',
+    'thread_name',
+    'truncate',
 ]
 
 default_format = '{filename}:{lineno:>5} {name:>25}(): '
@@ -60,6 +85,60 @@ else:
 # Module-level flag to disable debug() and DebugPrinter().debug().
 # Better called through debug_enable(True/False)
 _enabled = True
+# A function that accepts a caller's frame, and returns False if debug()
+# calls from it should be skipped. Set by printdebug.config, when a config
+# has rules.
+_site_filter = None
+# Printers from get_printer(), by dotted name. The root printer is ''.
+_printers = {}
+# Held while changing the printer hierarchy, or any printer's inherited
+# settings.
+_printer_lock = threading.RLock()
+
+# strftime() format for the {time} field in line info.
+# Milliseconds are appended to this.
+time_format = '%H:%M:%S'
+# Fields that are always available for line info.
+base_fields = frozenset(('filename', 'lineno', 'name'))
+# Fields that are computed per call, only when a fmt template uses them.
+# Any other field is looked up in the current `printdebug.context()`.
+dynamic_fields = frozenset((
+    'context',
+    'delta_ms',
+    'mono_ms',
+    'pid',
+    'site_delta_ms',
+    'task',
+    'thread',
+    'time',
+))
+# Dynamic/context fields used by each fmt template, parsed once per template.
+_fmt_fields_cache = {}
+# The pid is cached, and refreshed in forked children.
+_pid = os.getpid()
+# Thread-local storage for the current thread name.
+_thread_local = threading.local()
+# Cached thread names, by thread ident.
+_thread_names = {}
+# The last second that was formatted for {time}, and its strftime() text.
+_time_cache = (None, '')
+# Bounded repr() for short_repr(), large containers are not fully rendered.
+_repr = reprlib.Repr()
+_repr.maxlevel = 2
+_repr.maxstring = 60
+_repr.maxother = 60
+# Local variable fingerprints from the last debug_locals() call at each
+# site, (code, lineno): {name: (id, fingerprint)}
+_locals_seen = {}
+
+
+def _reset_pid():
+    global _pid
+    _pid = os.getpid()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_pid)
 
 
 def debug_enable(enabled=True):
@@ -88,18 +167,42 @@ def debug(*args, **kwargs):
                                Default: False
                 fmt          : .format() string for line info.
                                Default: printdebug.default_format
+                info         : A LineInfo to use, instead of the one for
+                               the caller's frame.
                 level        : Number of frames to go back.
                                Default: 1
                 ljustwidth   : str.ljust() value for line info.
                                Default: 40
                 parent       : Parent class to include name for methods.
+                sampled      : Skip the config rules for this call, because
+                               the caller already checked them. Used for
+                               multi-line helpers.
     """
     if not args:
         return None
-    elif not _enabled:
+    table = _stats.table
+    if table is None:
+        _debug(args, kwargs)
+        return None
+    start = time.perf_counter_ns()
+    # _debug() pops the level.
+    level = kwargs.get('level', 0)
+    info = written = None
+    try:
+        info, written = _debug(args, kwargs)
+    finally:
+        _stats_add(table, info, written, start, level)
+
+
+def _debug(args, kwargs):
+    """ Implementation for `debug()`.
+        Returns a LineInfo and a (text, end) tuple for the text that was
+        written, or (None, None) if the call was suppressed.
+    """
+    if not _enabled:
         if debug.should_raise:
             raise DebugNotEnabled()
-        return None
+        return None, None
 
     # Use stderr by default.
     if kwargs.get('file', None) is None:
@@ -110,8 +213,12 @@ def debug(*args, **kwargs):
 
     # Go back more than once when given.
     backlevel = _ensure_level(pop_or(kwargs, 'level', 0))
-    # Account for call to debug().
-    backlevel += 1
+    # Account for calls to debug() and _debug().
+    backlevel += 2
+    sampled = pop_or(kwargs, 'sampled', False)
+    if (_site_filter is not None) and (not sampled) and (
+            not _site_filter(sys._getframe(backlevel))):
+        return None, None
 
     # Get format string.
     fmt = pop_or(kwargs, 'fmt', default_format)
@@ -122,8 +229,21 @@ def debug(*args, **kwargs):
     # Are we omitting the line info, and just aligning with the end of it?
     align = pop_or(kwargs, 'align', False)
 
-    info = get_lineinfo(level=backlevel)
+    info = pop_or(kwargs, 'info', None)
+    if info is None:
+        info = get_lineinfo(level=backlevel)
     usebasename = pop_or(kwargs, 'basename', True)
+    if hasattr(kwargs['file'], 'write_record'):
+        # Structured sinks get the raw record instead of formatted text.
+        text = kwargs.get('sep', ' ').join((str(s) for s in args))
+        kwargs['file'].write_record(DebugRecord(
+            info,
+            text,
+            parent=parent.__class__.__name__ if parent else None,
+            align=align,
+            end=kwargs.get('end', '\n'),
+        ))
+        return info, (text, '')
     fname = os.path.split(info.filename)[-1] if usebasename else info.filename
 
     if parent:
@@ -136,7 +256,9 @@ def debug(*args, **kwargs):
     lineinfo = fmt.format(
         filename=fname,
         lineno=info.lineno,
-        name=func).ljust(ljustwidth)
+        name=func,
+        **_fmt_values(_fmt_fields(fmt), info, debug.field_state)
+    ).ljust(ljustwidth)
 
     # Is this a continuation from a previous line?
     # Getting this for debug(), re-setting for print().
@@ -146,14 +268,16 @@ def debug(*args, **kwargs):
     if align or continued:
         debug.continued[kwargs['file']] = willcontinue
         if align:
-            pargs[0] = ''.join((' ' * len(lineinfo), pargs[0]))
-        print(*pargs, **kwargs)
-        return None
+            pargs[0] = ''.join((' ' * len(lineinfo), str(pargs[0])))
+        text = kwargs.get('sep', ' ').join((str(s) for s in pargs))
+        print(text, **kwargs)
+        return info, (text, kwargs['end'])
     debug.continued[kwargs['file']] = willcontinue
 
     text = kwargs.get('sep', ' ').join((str(s) for s in pargs))
     line = ''.join((str(lineinfo), text))
     print(line, **kwargs)
+    return info, (line, kwargs['end'])
 
 
 # This dict keeps track of whether a line is "continued", based on the last
@@ -163,7 +287,9 @@ debug.continued = {sys.stderr: False}
 debug.should_raise = False
 
 
-def debug_exc(msg=None, suppress=None, suppress_strs=None):
+def debug_exc(
+        msg=None, suppress=None, suppress_strs=None, exc_info=None,
+        dedupe=False, style=None):
     """ Print a formatted traceback for the last exception, if there is any.
         Arguments:
             msg            : Optional message to print before the traceback.
@@ -173,28 +299,42 @@ def debug_exc(msg=None, suppress=None, suppress_strs=None):
             suppress_strs  : An iterable of strings. If str(last_exception)
                              contains any of these strings, it will not be
                              debug-printed.
+            exc_info       : An (type, value, traceback) tuple to print,
+                             instead of the last exception.
+            dedupe         : Whether to print repeated exceptions (same type
+                             and traceback locations) only once, followed
+                             by a count every `tracebacks.repeat_interval`
+                             seconds.
+            style          : A `tracebacks.TracebackStyle`, for shorter
+                             tracebacks.
     """
     if not _enabled:
         # No debugging exceptions when debug is disabled.
         return None
-    # Show actual exception tracebacks.
-    ex_type, ex_value, ex_tb = sys.exc_info()
-    if suppress and (ex_type in suppress):
-        # Ignore this exception type.
+    text = _exc_text(exc_info, suppress, suppress_strs, dedupe, style)
+    if text is None:
         return None
-    elif suppress_strs:
-        if str_contains(str(ex_value), suppress_strs):
-            # Exception message matched a substring, don't debug it.
-            return None
-    if any((ex_type, ex_value, ex_tb)):
-        if msg:
-            debug(msg, level=1)
-        debug(
-            ''.join(
-                traceback.format_exception(ex_type, ex_value, ex_tb)
-            ),
-            level=1,
-        )
+    if msg:
+        debug(msg, level=1)
+    debug(text, level=1)
+
+
+def debug_expr(*args, **kwargs):
+    """ Debug-print arguments with their source text, like:
+            x = 5, len(items) = 12
+        The source is only parsed once for each call site. When it's not
+        available, only the values are printed.
+        Keyword arguments are passed on to `debug()`.
+    """
+    if not args:
+        return None
+    if not _should_print():
+        return None
+    level = _ensure_level(kwargs.get('level', 0))
+    # Account for debug_expr().
+    kwargs['level'] = level + 1
+    text = format_args(arg_sources(get_frame(level + 1)), args)
+    debug(text, **kwargs)
 
 
 def debug_json(
@@ -223,13 +363,35 @@ def debug_json(
     )
 
 
+def debug_locals(
+        names=None, changed_only=True, maxlen=80, file=None, level=0):
+    """ Debug-print the caller's local variables, with a short repr() for
+        each, aligned like `debug_object()`.
+        Arguments:
+            names         : Names of the variables to print.
+                            Default: all of them
+            changed_only  : Only print variables that changed (by identity,
+                            or hash/length) since the last call from this
+                            line. Nothing is printed if none changed.
+            maxlen        : Maximum length for each repr().
+            file          : File to print to.
+            level         : Number of frames to go back.
+    """
+    if not _should_print():
+        return None
+    level = _ensure_level(level)
+    lines = _locals_lines(
+        get_frame(level + 1),
+        names=names,
+        changed_only=changed_only,
+        maxlen=maxlen,
+    )
+    _debug_lines(lines, file=file, level=level + 1)
+
+
 def debug_object(obj, file=None, indent=4):
     """ Debug-print an object like `print_object` does. """
-    linegen = object_str(obj, indent=indent)
-    firstline = linegen.send(None)
-    debug(firstline, file=file, level=1)
-    for line in linegen:
-        debug(line, align=True, file=file, level=1)
+    _debug_lines(object_str(obj, indent=indent), file=file, level=1)
 
 
 def enabled():
@@ -237,6 +399,45 @@ def enabled():
     return _enabled
 
 
+def _stats_add(table, info, written, start, level):
+    """ Record call site stats for a `debug()` call, when stats are enabled.
+        Arguments:
+            table    : The StatsTable to record in.
+            info     : LineInfo for the call, or None if it was suppressed.
+            written  : A (text, end) tuple for the text that was written,
+                       or None if it was suppressed.
+            start    : time.perf_counter_ns() when the call started.
+            level    : The `level` argument for the call, to find the call
+                       site for suppressed calls.
+    """
+    if info is None:
+        # The frame was never looked up. Account for _stats_add() and
+        # debug(). This is the cheapest way to get the call site.
+        try:
+            frame = sys._getframe(_ensure_level(level) + 2)
+        except ValueError:
+            return None
+        code = frame.f_code
+        key = (code.co_filename, frame.f_lineno, code.co_name)
+        size = 0
+    else:
+        key = (info.filename, info.lineno, info.name)
+        size = _byte_len(written[0]) + _byte_len(written[1])
+    table.add(
+        key,
+        size,
+        time.perf_counter_ns() - start,
+        suppressed=info is None,
+    )
+
+
+def _byte_len(text):
+    """ Return the UTF-8 encoded length of a str, for stats. """
+    if text.isascii():
+        return len(text)
+    return len(text.encode('utf-8', 'surrogatepass'))
+
+
 def _ensure_level(level=0):
     """ Ensure the level argument is a non-negative integer, defaulting to 0
         on errors.
@@ -248,6 +449,219 @@ def _ensure_level(level=0):
     return l
 
 
+def _debug_lines(lines, printer=None, file=None, level=0):
+    """ Debug-print the first line with line info, and the rest aligned
+        with it, like `debug_object()`.
+        Config rules are checked once for the caller, so sampling prints
+        all of the lines or none of them.
+        Arguments:
+            lines    : Lines to print.
+            printer  : A DebugPrinter to print with. Default: debug()
+            file     : File to print to.
+            level    : Number of frames to go back.
+    """
+    # Account for _debug_lines().
+    level = _ensure_level(level) + 1
+    if (_site_filter is not None) and (
+            not _site_filter(sys._getframe(level))):
+        return None
+    if printer is None:
+        printer_debug = debug
+    else:
+        printer_debug = printer.debug
+    for i, line in enumerate(lines):
+        printer_debug(
+            line,
+            align=(i > 0),
+            file=file,
+            level=level,
+            sampled=True,
+        )
+
+
+def _should_print(printer=None):
+    """ Return True if a printer (or debug()) is enabled, for helpers
+        that do some work before printing. When it's disabled, this raises
+        DebugNotEnabled if the printer should raise, like debug() does.
+    """
+    if printer is None:
+        if _enabled:
+            return True
+        should_raise = debug.should_raise
+    else:
+        if printer._enabled and _enabled:
+            return True
+        should_raise = printer.should_raise
+    if should_raise:
+        raise DebugNotEnabled()
+    return False
+
+
+def _fingerprint(value):
+    """ Return a cheap fingerprint for a value, to detect changes in
+        `debug_locals()`. This is the hash, or the length for unhashable
+        containers.
+    """
+    try:
+        return hash(value)
+    except TypeError:
+        pass
+    try:
+        return len(value)
+    except TypeError:
+        return None
+
+
+def _fmt_fields(fmt):
+    """ Return the dynamic fields (see `dynamic_fields`) and context fields
+        that a fmt template uses. Templates are only parsed once.
+    """
+    try:
+        return _fmt_fields_cache[fmt]
+    except KeyError:
+        pass
+    except TypeError:
+        # Not hashable (a Colr instance maybe), the escape codes don't
+        # matter to the parser.
+        fmt = str(fmt)
+        fields = _fmt_fields_cache.get(fmt, None)
+        if fields is not None:
+            return fields
+    fields = set()
+    for _, fieldname, _, _ in string.Formatter().parse(str(fmt)):
+        if not fieldname:
+            continue
+        # Only the base name matters, for things like {thing.attr}.
+        fieldname = fieldname.partition('.')[0].partition('[')[0]
+        if fieldname.isdigit() or (fieldname in base_fields):
+            continue
+        fields.add(fieldname)
+    fields = _fmt_fields_cache[fmt] = frozenset(fields)
+    return fields
+
+
+def _fmt_values(
+        fields, info, state=None, timestamp=None, monotonic=None,
+        thread=None, ctx=None):
+    """ Compute values for the dynamic and context fields that a fmt
+        template uses.
+        Arguments:
+            fields     : Field names, from `_fmt_fields()`.
+            info       : LineInfo for the call site.
+            state      : FieldState for {delta_ms} and {site_delta_ms}.
+                         Default: debug.field_state
+            timestamp  : time.time() for the record, or None for now.
+            monotonic  : time.monotonic() for the record, or None for now.
+            thread     : Thread ident for the record, or None for the
+                         current thread.
+            ctx        : DebugContext for the record, or None for the
+                         current context.
+    """
+    if not fields:
+        return {}
+    values = {}
+    contextfields = fields.difference(dynamic_fields)
+    if contextfields or ('context' in fields):
+        if ctx is None:
+            ctx = current_context() or empty_context
+        if 'context' in fields:
+            values['context'] = ctx.text
+        for key in contextfields:
+            values[key] = ctx.fields.get(key, '')
+    if 'time' in fields:
+        values['time'] = format_time(
+            time.time() if timestamp is None else timestamp
+        )
+    if ('mono_ms' in fields) or ('delta_ms' in fields) or (
+            'site_delta_ms' in fields):
+        if monotonic is None:
+            # Stored records may not have a monotonic time.
+            monotonic = time.monotonic() if timestamp is None else timestamp
+        values['mono_ms'] = round(monotonic * 1000, 3)
+        if state is None:
+            state = debug.field_state
+        if 'delta_ms' in fields:
+            values['delta_ms'] = state.delta_ms(
+                state.threads,
+                threading.get_ident() if thread is None else thread,
+                monotonic,
+            )
+        if 'site_delta_ms' in fields:
+            values['site_delta_ms'] = state.delta_ms(
+                state.sites,
+                (info.filename, info.lineno),
+                monotonic,
+            )
+    if 'thread' in fields:
+        values['thread'] = thread_name(thread)
+    if 'pid' in fields:
+        values['pid'] = _pid
+    if 'task' in fields:
+        values['task'] = task_name()
+    return values
+
+
+def format_time(timestamp):
+    """ Format a time.time() value with `time_format` and milliseconds.
+        The strftime() part is only computed once per second.
+    """
+    global _time_cache
+    second = int(timestamp)
+    cachedsecond, text = _time_cache
+    if second != cachedsecond:
+        text = time.strftime(time_format, time.localtime(second))
+        _time_cache = (second, text)
+    return '{}.{:03d}'.format(text, int((timestamp - second) * 1000))
+
+
+def _exc_text(
+        exc_info=None, suppress=None, suppress_strs=None, dedupe=False,
+        style=None):
+    """ Return traceback text for `debug_exc()`, or None if there is no
+        exception, or it shouldn't be printed.
+        See `debug_exc()` for the arguments.
+    """
+    # Show actual exception tracebacks.
+    ex_type, ex_value, ex_tb = exc_info or sys.exc_info()
+    if not any((ex_type, ex_value, ex_tb)):
+        return None
+    if _exc_suppressed(ex_type, ex_value, suppress, suppress_strs):
+        return None
+    if (not dedupe) and (style is None):
+        # Only deduplicated and styled tracebacks are cached.
+        return ''.join(traceback.format_exception(ex_type, ex_value, ex_tb))
+    key = _tracebacks.fingerprint(ex_type, ex_value, ex_tb)
+    if dedupe:
+        repeats = _tracebacks.repeats(key)
+        if repeats is None:
+            return None
+        elif repeats:
+            return '{} (repeated {} more time{})'.format(
+                ''.join(
+                    _tracebacks.format_message(ex_type, ex_value)
+                ).rstrip(),
+                repeats,
+                '' if repeats == 1 else 's',
+            )
+    if style is not None:
+        return style.format(ex_type, ex_value, ex_tb, key=key)
+    return _tracebacks.format_exc(ex_type, ex_value, ex_tb, key=key)
+
+
+def _exc_suppressed(ex_type, ex_value, suppress=None, suppress_strs=None):
+    """ Return True if an exception matches the `suppress` types or
+        `suppress_strs` for `debug_exc()`.
+    """
+    if suppress and (ex_type in suppress):
+        # Ignore this exception type.
+        return True
+    elif suppress_strs:
+        if str_contains(str(ex_value), suppress_strs):
+            # Exception message matched a substring, don't debug it.
+            return True
+    return False
+
+
 def get_frame(level=0):
     """ Gets a previous frame for inspecting or getting source code info from.
     """
@@ -275,6 +689,60 @@ def get_lineinfo(level=0):
     return LineInfo.from_frame(get_frame(level=level + 1))
 
 
+def get_printer(name=None):
+    """ Return the cached DebugPrinter for a dotted name, like
+        'myapp.db.pool', creating it and its parents if needed.
+        Printers inherit the enabled state, sinks, and format from their
+        parent, unless they set their own.
+        Arguments:
+            name  : Dotted name for the printer.
+                    Default: the root printer, ''.
+    """
+    name = name or ''
+    printer = _printers.get(name, None)
+    if printer is not None:
+        return printer
+    with _printer_lock:
+        printer = _printers.get(name, None)
+        if printer is None:
+            if name:
+                parent = get_printer(name.rpartition('.')[0])
+            else:
+                parent = None
+            printer = _printers[name] = DebugPrinter(name=name, parent=parent)
+    return printer
+
+
+def _locals_lines(frame, names=None, changed_only=True, maxlen=80):
+    """ Return lines for `debug_locals()`, or an empty list if there is
+        nothing to print.
+    """
+    localvars = frame.f_locals
+    if names is None:
+        names = list(localvars)
+    if changed_only:
+        key = (frame.f_code, frame.f_lineno)
+        seen = _locals_seen.get(key, None)
+        if seen is None:
+            seen = _locals_seen[key] = {}
+    lines = []
+    for name in names:
+        try:
+            value = localvars[name]
+        except KeyError:
+            continue
+        if changed_only:
+            current = (id(value), _fingerprint(value))
+            if seen.get(name, None) == current:
+                continue
+            seen[name] = current
+        lines.append('    {} = {}'.format(name, short_repr(value, maxlen)))
+    if not lines:
+        return lines
+    lines.insert(0, 'changed locals:' if changed_only else 'locals:')
+    return lines
+
+
 def json_str(
         obj, skipkeys=False, ensure_ascii=True, check_circular=True,
         allow_nan=True, cls=None, indent=None, separators=None, default=None,
@@ -447,6 +915,50 @@ def printobject(obj, file=None, indent=0):
     return print_object(obj, file=file, indent=indent)
 
 
+def task_name():
+    """ Return the name of the current asyncio task, or '' if there is
+        none.
+    """
+    # If asyncio was never imported, there are no tasks.
+    asyncio = sys.modules.get('asyncio', None)
+    if asyncio is None:
+        return ''
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        # No running event loop.
+        return ''
+    if task is None:
+        return ''
+    return task.get_name()
+
+
+def thread_name(ident=None):
+    """ Return the name of a thread, by ident (the current thread by
+        default). Names are cached per thread.
+        Threads that have not been seen yet are named by their ident.
+    """
+    if (ident is None) or (ident == threading.get_ident()):
+        # Thread-local storage is never stale, even when idents are reused.
+        name = getattr(_thread_local, 'name', None)
+        if name is None:
+            name = _thread_local.name = threading.current_thread().name
+            _thread_names[threading.get_ident()] = name
+        return name
+    return _thread_names.get(ident, str(ident))
+
+
+def short_repr(obj, maxlen=60):
+    """ Return a repr() for an object, without building huge reprs for
+        large containers, truncated to `maxlen` characters.
+    """
+    try:
+        s = _repr.repr(obj)
+    except Exception as ex:
+        s = '<{} repr() failed: {}>'.format(type(obj).__name__, ex)
+    return truncate(s, maxlen)
+
+
 def str_contains(s, substrs):
     """ Returns True if the str `s` contains any substrings in `substrs`.
         Like `substr in s`, except you can use an iterable of strings instead
@@ -469,6 +981,15 @@ def str_contains(s, substrs):
     return False
 
 
+def truncate(s, maxlen=60):
+    """ Truncate a string to `maxlen` characters, ending with '...' if
+        it was too long.
+    """
+    if len(s) > maxlen:
+        return '{}...'.format(s[:max(maxlen - 3, 0)])
+    return s
+
+
 class DebugNotEnabled(ValueError):
     """ Used with DebugOnly, to signal that code should not run. """
     pass
@@ -480,40 +1001,109 @@ class DebugPrinter(object):
     """
     def __init__(
             self, fmt=None, ljustwidth=40, basename=True, file=None,
-            should_raise=False):
-        self.fmt = fmt or default_format
+            should_raise=False, sinks=None, name=None, parent=None):
+        # Dotted name, for printers from get_printer().
+        self.name = name
+        # Printers that inherit settings from this one.
+        self.children = weakref.WeakSet()
+        self._parent = None
+        # This instance's own settings. None means "use the parent's".
+        self._enabled_setting = None
+        self._fmt_setting = fmt
+        # Sinks (printdebug.sinks.Sink) to fan records out to, instead of
+        # printing to `self.file`.
+        self._sinks = list(sinks or [])
+        # Effective settings, computed by _update() when this instance or a
+        # parent changes, so debug() only checks one attribute.
+        self._enabled = True
+        self._fmt = fmt or default_format
+        self._all_sinks = self._sinks
         self.ljustwidth = ljustwidth
         self.basename = basename
         # Use stderr by default.
         self.file = file or sys.stderr
         # Keeps track of line continuations, per file descriptor.
         self.continued = {self.file: False}
-        # Whether this single instance is disabled.
-        self._enabled = True
+        # Last record times, for the {delta_ms} and {site_delta_ms} fields.
+        self.field_state = FieldState()
         # Whether this instance should raise DebugNotEnabled, when debug()
         # is called while disabled.
         self.should_raise = should_raise
+        if parent is not None:
+            self.parent = parent
 
     def debug(self, *args, **kwargs):
         """ Wrapper for print() that adds file, line, and func info. """
         if not args:
             return None
-        elif not (self._enabled and _enabled):
+        table = _stats.table
+        if table is None:
+            self._debug(args, kwargs)
+            return None
+        start = time.perf_counter_ns()
+        # _debug() pops the level.
+        level = kwargs.get('level', 0)
+        info = written = None
+        try:
+            info, written = self._debug(args, kwargs)
+        finally:
+            _stats_add(table, info, written, start, level)
+
+    def _debug(self, args, kwargs):
+        """ Implementation for `debug()`.
+            Returns a LineInfo and a (text, end) tuple for the text that
+            was written, or (None, None) if the call was suppressed.
+        """
+        if not (self._enabled and _enabled):
             if self.should_raise:
                 raise DebugNotEnabled()
-            return None
-        # Use stderr by default.
+            return None, None
+        # Use stderr by default, or the sinks when there are any.
+        usesinks = False
         if kwargs.get('file', None) is None:
             kwargs['file'] = self.file
+            usesinks = bool(self._all_sinks)
 
         # Include parent class name when given.
         parent = pop_or(kwargs, 'parent', None)
 
         # Go back more than once when given.
         backlevel = _ensure_level(pop_or(kwargs, 'level', 0))
-        # Account for call to debug().
-        backlevel += 1
-        info = get_lineinfo(level=backlevel)
+        # Account for calls to debug() and _debug().
+        backlevel += 2
+        sampled = pop_or(kwargs, 'sampled', False)
+        if (_site_filter is not None) and (not sampled) and (
+                not _site_filter(sys._getframe(backlevel))):
+            return None, None
+        info = pop_or(kwargs, 'info', None)
+        if info is None:
+            info = get_lineinfo(level=backlevel)
+        if usesinks:
+            text = kwargs.get('sep', ' ').join((str(s) for s in args))
+            # Formatters handle colors, only custom transforms are used.
+            transfunc = pop_or(kwargs, 'transform', None)
+            builtin = (None, self.transform_text, self.transform_err)
+            if transfunc not in builtin:
+                text = str(transfunc(text))
+            self.emit(DebugRecord(
+                info,
+                text,
+                parent=parent.__class__.__name__ if parent else None,
+                align=pop_or(kwargs, 'align', False),
+                end=kwargs.get('end', '\n'),
+            ))
+            return info, (text, '')
+        if hasattr(kwargs['file'], 'write_record'):
+            # Structured sinks get the raw record instead of formatted text.
+            text = kwargs.get('sep', ' ').join((str(s) for s in args))
+            kwargs['file'].write_record(DebugRecord(
+                info,
+                text,
+                parent=parent.__class__.__name__ if parent else None,
+                align=pop_or(kwargs, 'align', False),
+                end=kwargs.get('end', '\n'),
+            ))
+            return info, (text, '')
         if self.basename:
             fname = os.path.split(info.filename)[-1]
         else:
@@ -526,10 +1116,12 @@ class DebugPrinter(object):
 
         # Patch args to stay compatible with print().
         pargs = list(args)
-        lineinfo = self.fmt.format(
+        lineinfo = self._fmt.format(
             filename=fname,
             lineno=info.lineno,
-            name=func).ljust(self.ljustwidth)
+            name=func,
+            **_fmt_values(_fmt_fields(self._fmt), info, self.field_state)
+        ).ljust(self.ljustwidth)
         # Run any transformations that child classes may have, or
         # any transformation functions that were passed in.
         transfunc = pop_or(kwargs, 'transform', self.transform_text)
@@ -548,13 +1140,14 @@ class DebugPrinter(object):
             if align:
                 text = ''.join((' ' * self.lineinfo_len(lineinfo), text))
             print(text, **kwargs)
-            return None
+            return info, (text, kwargs['end'])
         self.continued[kwargs['file']] = willcontinue
 
         # lineinfo may be a Colr instance.
         line = ''.join((str(lineinfo), text))
 
         print(line, **kwargs)
+        return info, (line, kwargs['end'])
 
     def debug_err(self, *args, **kwargs):
         """ Like `debug`, except the messages are passed through
@@ -564,7 +1157,9 @@ class DebugPrinter(object):
         kwargs['level'] = kwargs.get('level', 0) + 1
         return self.debug(*args, **kwargs)
 
-    def debug_exc(self, msg=None, suppress=None, suppress_strs=None):
+    def debug_exc(
+            self, msg=None, suppress=None, suppress_strs=None,
+            exc_info=None, dedupe=False, style=None):
         """ Print a formatted traceback for the last exception, if there is
             any.
             Arguments:
@@ -576,28 +1171,41 @@ class DebugPrinter(object):
                 suppress_strs  : An iterable of strings.
                                  If str(last_exception) contains any of these
                                  strings, it will not be debug-printed.
+                exc_info       : An (type, value, traceback) tuple to print,
+                                 instead of the last exception.
+                dedupe         : Whether to print repeated exceptions only
+                                 once, followed by periodic counts.
+                style          : A `tracebacks.TracebackStyle`, for
+                                 shorter tracebacks.
         """
         if not _enabled:
             # No debugging exceptions when debug is disabled.
             return None
-        # Show actual exception tracebacks.
-        ex_type, ex_value, ex_tb = sys.exc_info()
-        if suppress and (ex_type in suppress):
-            # Ignore this exception type.
+        text = _exc_text(
+            exc_info,
+            suppress,
+            suppress_strs,
+            dedupe,
+            style,
+        )
+        if text is None:
             return None
-        elif suppress_strs:
-            if str_contains(str(ex_value), suppress_strs):
-                # Exception message matched a substring, don't debug it.
-                return None
-        if any((ex_type, ex_value, ex_tb)):
-            if msg:
-                self.debug(msg, level=1)
-            self.debug(
-                ''.join(
-                    traceback.format_exception(ex_type, ex_value, ex_tb)
-                ),
-                level=1,
-            )
+        if msg:
+            self.debug(msg, level=1)
+        self.debug(text, level=1)
+
+    def debug_expr(self, *args, **kwargs):
+        """ Debug-print arguments with their source text, like
+            `debug_expr()` does.
+        """
+        if not args:
+            return None
+        if not _should_print(self):
+            return None
+        level = _ensure_level(kwargs.get('level', 0))
+        kwargs['level'] = level + 1
+        text = format_args(arg_sources(get_frame(level + 1)), args)
+        self.debug(text, **kwargs)
 
     def debug_json(
             self, obj, skipkeys=False, ensure_ascii=True, check_circular=True,
@@ -624,17 +1232,49 @@ class DebugPrinter(object):
             level=1,
         )
 
+    def debug_locals(
+            self, names=None, changed_only=True, maxlen=80, file=None,
+            level=0):
+        """ Debug-print the caller's local variables, like
+            `debug_locals()` does.
+        """
+        if not _should_print(self):
+            return None
+        level = _ensure_level(level)
+        lines = _locals_lines(
+            get_frame(level + 1),
+            names=names,
+            changed_only=changed_only,
+            maxlen=maxlen,
+        )
+        _debug_lines(lines, printer=self, file=file, level=level + 1)
+
     def debug_object(self, obj, file=None, indent=4):
         """ Debug-print an object like `print_object` does. """
-        linegen = object_str(obj, indent=indent)
-        firstline = linegen.send(None)
-        self.debug(firstline, file=file, level=1)
-        for line in linegen:
-            self.debug(line, align=True, file=file, level=1)
+        _debug_lines(
+            object_str(obj, indent=indent),
+            printer=self,
+            file=file,
+            level=1,
+        )
+
+    def add_sink(self, sink):
+        """ Add a sink (printdebug.sinks.Sink) to fan records out to. """
+        with _printer_lock:
+            self._sinks.append(sink)
+            self._update()
+        return sink
+
+    @property
+    def all_sinks(self):
+        """ This instance's sinks, and the ones inherited from parents. """
+        return self._all_sinks
 
     def disable(self, disabled=True):
-        """ Disable this instance. """
-        self._enabled = not disabled
+        """ Disable this instance, and children that don't set their own
+            enabled state.
+        """
+        self._set_enabled(not disabled)
 
     @property
     def disabled(self):
@@ -645,11 +1285,22 @@ class DebugPrinter(object):
 
     @disabled.setter
     def disabled(self, value):
-        self._enabled = not bool(value)
+        self._set_enabled(not value)
+
+    def emit(self, record):
+        """ Send a DebugRecord to all sinks. Each distinct formatter only
+            renders the record once, no matter how many sinks use it.
+        """
+        rendered = {}
+        for sink in self._all_sinks:
+            sink.emit(record, rendered)
 
     def enable(self, enabled=True):
-        """ Re-enable this instance, if it was disabled. """
-        self._enabled = enabled
+        """ Re-enable this instance, if it was disabled.
+            Use `inherit_enabled()` to follow the parent's enabled state
+            again.
+        """
+        self._set_enabled(enabled)
 
     @property
     def enabled(self):
@@ -660,7 +1311,26 @@ class DebugPrinter(object):
 
     @enabled.setter
     def enabled(self, value):
-        self._enabled = bool(value)
+        self._set_enabled(value)
+
+    @property
+    def fmt(self):
+        """ The line info format, set here or inherited from a parent. """
+        return self._fmt
+
+    @fmt.setter
+    def fmt(self, value):
+        with _printer_lock:
+            self._fmt_setting = value
+            self._update()
+
+    def inherit_enabled(self):
+        """ Forget this instance's own enabled state, and follow the
+            parent's again (or enabled, without a parent).
+        """
+        with _printer_lock:
+            self._enabled_setting = None
+            self._update()
 
     def lineinfo_len(self, s):
         """ Overridable, returns the length of line info.
@@ -668,6 +1338,74 @@ class DebugPrinter(object):
         """
         return len(s)
 
+    def remove_sink(self, sink):
+        """ Remove a sink that was added with `add_sink` or `sinks=`. """
+        with _printer_lock:
+            self._sinks.remove(sink)
+            self._update()
+
+    @property
+    def parent(self):
+        """ The DebugPrinter this instance inherits settings from. """
+        return self._parent
+
+    @parent.setter
+    def parent(self, value):
+        with _printer_lock:
+            ancestor = value
+            while ancestor is not None:
+                if ancestor is self:
+                    raise ValueError('DebugPrinter parents can\'t be cyclic.')
+                ancestor = ancestor._parent
+            if self._parent is not None:
+                self._parent.children.discard(self)
+            self._parent = value
+            if value is not None:
+                value.children.add(self)
+            self._update()
+
+    def _set_enabled(self, value):
+        """ Set this instance's own enabled state. """
+        with _printer_lock:
+            self._enabled_setting = bool(value)
+            self._update()
+
+    @property
+    def sinks(self):
+        """ A tuple of this instance's own sinks. Use `add_sink()`,
+            `remove_sink()`, or set this property to change them, so
+            children see the change.
+        """
+        return tuple(self._sinks)
+
+    @sinks.setter
+    def sinks(self, value):
+        with _printer_lock:
+            self._sinks = list(value or [])
+            self._update()
+
+    def _update(self):
+        """ Compute the effective settings for this instance and its
+            children. The printer lock must be held.
+        """
+        parent = self._parent
+        if self._enabled_setting is not None:
+            self._enabled = self._enabled_setting
+        else:
+            self._enabled = True if parent is None else parent._enabled
+        if self._fmt_setting:
+            self._fmt = self._fmt_setting
+        else:
+            self._fmt = default_format if parent is None else parent._fmt
+        if (parent is None) or (not parent._all_sinks):
+            self._all_sinks = self._sinks
+        else:
+            self._all_sinks = self._sinks + [
+                sink for sink in parent._all_sinks if sink not in self._sinks
+            ]
+        for child in list(self.children):
+            child._update()
+
     def transform_err(self, text):
         """ Run a transformation on the actual text before printing,
             specifically for `debug_err`.
@@ -696,7 +1434,7 @@ class DebugColrPrinter(DebugPrinter):
 
     def __init__(
             self, fmt=None, ljustwidth=40, basename=True, file=None,
-            should_raise=False):
+            should_raise=False, sinks=None, name=None, parent=None):
         if default_colr_format is None:
             # Raise an error on instantiation if colr is not available.
             # At least the Python 2 users can use the regular debug prints.
@@ -715,11 +1453,14 @@ class DebugColrPrinter(DebugPrinter):
             raise imperr
 
         super(DebugColrPrinter, self).__init__(
-            fmt=fmt or default_colr_format,
+            fmt=fmt or (default_colr_format if parent is None else None),
             ljustwidth=ljustwidth,
             basename=basename,
             file=file,
             should_raise=should_raise,
+            sinks=sinks,
+            name=name,
+            parent=parent,
         )
 
     def lineinfo_len(self, s):
@@ -737,6 +1478,79 @@ class DebugColrPrinter(DebugPrinter):
         return C(text, self.textcolor)
 
 
+class DebugRecord(object):
+    """ Holds everything about a single debug call.
+        Sinks that want structured data instead of text can implement a
+        `write_record(record)` method, and `debug()` will pass them one of
+        these instead of calling `print()`.
+    """
+    def __init__(
+            self, info, text, parent=None, timestamp=None, thread=None,
+            monotonic=None, context=None, align=False, end='\n'):
+        # A LineInfo for the call site.
+        self.info = info
+        # The message text, without line info.
+        self.text = text
+        # Parent class name, when `parent` was passed to `debug()`.
+        self.parent = parent
+        if timestamp is None:
+            self.time = time.time()
+            self.monotonic = time.monotonic()
+            # The DebugContext from printdebug.context(), if any.
+            self.context = current_context()
+        else:
+            # A stored record, the monotonic clock may not be known.
+            self.time = timestamp
+            self.monotonic = monotonic
+            self.context = context
+        self.thread = threading.get_ident() if thread is None else thread
+        # Whether to replace the line info with spaces, and the line ending,
+        # like the `align` and `end` arguments for `debug()`.
+        self.align = align
+        self.end = end
+
+    def __repr__(self):
+        return '{}({})'.format(
+            self.__class__.__name__,
+            ', '.join(
+                '{}={!r}'.format(k, getattr(self, k))
+                for k in (
+                    'info', 'text', 'parent', 'time', 'monotonic', 'thread',
+                    'context',
+                )
+            )
+        )
+
+    @property
+    def name(self):
+        """ Function name, including the parent class name if any. """
+        if self.parent:
+            return '{}.{}'.format(self.parent, self.info.name)
+        return self.info.name
+
+
+class FieldState(object):
+    """ Remembers the last record times per thread and per call site, for
+        the {delta_ms} and {site_delta_ms} fields.
+    """
+    def __init__(self):
+        # Thread ident: last monotonic time
+        self.threads = {}
+        # (filename, lineno): last monotonic time
+        self.sites = {}
+
+    @staticmethod
+    def delta_ms(lasttimes, key, monotonic):
+        """ Return milliseconds since the last time for `key`, and remember
+            the new time. The first time for a key is 0.0.
+        """
+        last = lasttimes.get(key, None)
+        lasttimes[key] = monotonic
+        if last is None:
+            return 0.0
+        return round((monotonic - last) * 1000, 3)
+
+
 class LineInfo(object):
     """ Holds information about where the debug print came from. """
     def __init__(self, filename, name, lineno):
@@ -777,6 +1591,11 @@ class LineInfo(object):
         return cls.from_frame(get_frame(level=level))
 
 
+# Last record times for debug(), for the {delta_ms} and {site_delta_ms}
+# fields.
+debug.field_state = FieldState()
+
+
 class suppress:
     """Context manager to suppress specified exceptions
 
@@ -0,0 +1,432 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" PrintDebug - Tracebacks
+    ...fingerprinting, cached formatting, and repeat throttling for
+    exception tracebacks, for `debug_exc()` and the exception hooks.
+
+    A fingerprint is the exception type and the code locations of its
+    traceback (and of any chained exceptions), so the same error raised
+    from the same place has the same fingerprint, whatever its message is.
+
+    A TracebackStyle renders shorter tracebacks, with head/tail limits,
+    collapsed repeats, hidden library frames, or on one line:
+        style = TracebackStyle(head=3, tail=5, hide_paths=library_paths())
+        debug_exc(style=style)
+"""
+import builtins
+import linecache
+import os
+import sysconfig
+import threading
+import time
+import traceback
+
+# Maximum number of fingerprints to remember, for formatting and repeat
+# counts. The oldest ones are forgotten first.
+max_fingerprints = 1024
+# Minimum number of seconds between repeat counts for one fingerprint,
+# for deduplicated exceptions.
+repeat_interval = 10.0
+
+# Formatted tracebacks, without the final exception message, by
+# (fingerprint, chained messages): text
+_formatted = {}
+# Repeats for deduplicated exceptions, by fingerprint:
+#   [count since last print, last print time]
+_repeats = {}
+_lock = threading.Lock()
+# Exception groups (Python 3.11+) nest their sub-exceptions' tracebacks,
+# so their messages aren't at the end of the formatted traceback.
+_group_type = getattr(builtins, 'BaseExceptionGroup', None)
+
+
+# Messages between chained exceptions, like traceback uses.
+chain_messages = {
+    True: 'The above exception was the direct cause of the following '
+          'exception:',
+    False: 'During handling of the above exception, another exception '
+           'occurred:',
+}
+
+
+def _chain(exc_value):
+    """ Yield the exceptions chained to an exception (the cause, or the
+        context when it isn't suppressed), like tracebacks show them.
+    """
+    for chained, _ in _chain_links(exc_value):
+        yield chained
+
+
+def _chain_links(exc_value):
+    """ Yield (chained_exception, is_cause) for the exceptions chained to
+        an exception, newest first.
+    """
+    seen = {id(exc_value)}
+    while True:
+        if exc_value.__cause__ is not None:
+            exc_value = exc_value.__cause__
+            cause = True
+        elif (exc_value.__context__ is not None) and (
+                not exc_value.__suppress_context__):
+            exc_value = exc_value.__context__
+            cause = False
+        else:
+            return None
+        if id(exc_value) in seen:
+            return None
+        seen.add(id(exc_value))
+        yield exc_value, cause
+
+
+def _has_group(exc_value):
+    """ Return True if an exception, or one chained to it, is an
+        exception group.
+    """
+    if _group_type is None:
+        return False
+    if isinstance(exc_value, _group_type):
+        return True
+    return any(isinstance(exc, _group_type) for exc in _chain(exc_value))
+
+
+def _locations(tb):
+    """ Return a tuple of (code, lineno) for each frame in a traceback. """
+    locations = []
+    while tb is not None:
+        locations.append((tb.tb_frame.f_code, tb.tb_lineno))
+        tb = tb.tb_next
+    return tuple(locations)
+
+
+def library_paths():
+    """ Return path prefixes for the standard library and installed
+        packages, for `TracebackStyle(hide_paths=...)`.
+    """
+    paths = set()
+    for name in ('stdlib', 'platstdlib', 'purelib', 'platlib'):
+        path = sysconfig.get_path(name)
+        if path:
+            paths.add(os.path.join(path, ''))
+    return tuple(sorted(paths))
+
+
+def fingerprint(exc_type, exc_value, exc_tb):
+    """ Return a hashable fingerprint for an exception: its type, and the
+        code locations of its traceback and chained exceptions.
+    """
+    parts = [(exc_type, _locations(exc_tb))]
+    if exc_value is not None:
+        for chained in _chain(exc_value):
+            parts.append((type(chained), _locations(chained.__traceback__)))
+    return tuple(parts)
+
+
+def _remember(cache, key, value):
+    """ Store a value in one of the caches, forgetting the oldest entries
+        when `max_fingerprints` is reached. The lock must be held.
+    """
+    if (key not in cache) and (len(cache) >= max_fingerprints):
+        # Dicts keep insertion order, so this is the oldest.
+        del cache[next(iter(cache))]
+    cache[key] = value
+
+
+def format_message(exc_type, exc_value):
+    """ Return lines for an exception's message, like
+        `traceback.format_exception_only()`, without reading source for
+        the chained exceptions.
+    """
+    return list(traceback.TracebackException(
+        exc_type,
+        exc_value,
+        None,
+        lookup_lines=False,
+    ).format_exception_only())
+
+
+def format_exc(exc_type, exc_value, exc_tb, key=None):
+    """ Return a formatted traceback, like
+        `''.join(traceback.format_exception(...))`.
+        The traceback is formatted once per fingerprint (and chained
+        messages), and only the final exception message is formatted each
+        time. Exception groups are formatted in full every time.
+        Arguments:
+            exc_type   : Exception type.
+            exc_value  : Exception.
+            exc_tb     : Traceback.
+            key        : Fingerprint, if it's already known.
+    """
+    if (exc_value is not None) and _has_group(exc_value):
+        return ''.join(
+            traceback.format_exception(exc_type, exc_value, exc_tb)
+        )
+    if key is None:
+        key = fingerprint(exc_type, exc_value, exc_tb)
+    if exc_value is not None:
+        key = (key, tuple(str(chained) for chained in _chain(exc_value)))
+    message = format_message(exc_type, exc_value)
+    stack = _formatted.get(key, None)
+    if stack is None:
+        lines = traceback.format_exception(exc_type, exc_value, exc_tb)
+        split = len(lines) - len(message)
+        if lines[split:] != message:
+            # The message isn't at the end, it can't be cached.
+            return ''.join(lines)
+        stack = ''.join(lines[:split])
+        with _lock:
+            _remember(_formatted, key, stack)
+    return stack + ''.join(message)
+
+
+def repeats(key, interval=None):
+    """ Count an occurrence of a deduplicated exception, and return:
+            0     : It's new, and should be printed in full.
+            None  : It was printed recently, and shouldn't be printed.
+            N     : It happened N times since it was last printed, and
+                    `interval` seconds have passed, so a count should be
+                    printed.
+        Arguments:
+            key       : Fingerprint for the exception.
+            interval  : Minimum seconds between counts.
+                        Default: repeat_interval
+    """
+    if interval is None:
+        interval = repeat_interval
+    now = time.monotonic()
+    with _lock:
+        entry = _repeats.get(key, None)
+        if entry is None:
+            _remember(_repeats, key, [0, now])
+            return 0
+        entry[0] += 1
+        if (now - entry[1]) < interval:
+            return None
+        count = entry[0]
+        entry[0] = 0
+        entry[1] = now
+    return count
+
+
+def reset():
+    """ Forget all cached tracebacks and repeat counts. """
+    with _lock:
+        _formatted.clear()
+        _repeats.clear()
+
+
+class TracebackStyle(object):
+    """ Options for rendering shorter tracebacks in `debug_exc()`.
+        The traceback is walked without reading any source, frames are
+        hidden, collapsed, and limited, and only the frames that are shown
+        are looked up in linecache.
+        Rendered tracebacks are cached per fingerprint, like `format_exc()`.
+    """
+    def __init__(
+            self, head=None, tail=None, collapse=True, hide_paths=None,
+            oneline=False, chain=True):
+        """ Initialize a traceback style.
+            Arguments:
+                head        : Number of frames to show from the start of
+                              a traceback, or None.
+                tail        : Number of frames to show from the end of a
+                              traceback, or None.
+                              When both are None, every frame is shown.
+                collapse    : Whether to collapse repeated frames (the
+                              same line, like in recursion) to a count.
+                hide_paths  : Path prefixes for frames to hide, like
+                              `library_paths()`. The last frame is always
+                              shown.
+                oneline     : Whether to render each exception on one
+                              line, like:
+                              ValueError: bad [app.py:3 main > app.py:9 f]
+                chain       : Whether to include chained exceptions
+                              (causes and contexts).
+        """
+        self.head = head
+        self.tail = tail
+        self.collapse = collapse
+        self.hide_paths = tuple(hide_paths or ())
+        self.oneline = oneline
+        self.chain = chain
+        # Rendered tracebacks, by (fingerprint, chained messages):
+        #   (prefix, suffix)
+        self._cache = {}
+
+    def __repr__(self):
+        return ''.join((
+            '{}(head={!r}, tail={!r}, collapse={!r}, hide_paths={!r}, ',
+            'oneline={!r}, chain={!r})',
+        )).format(
+            self.__class__.__name__,
+            self.head,
+            self.tail,
+            self.collapse,
+            self.hide_paths,
+            self.oneline,
+            self.chain,
+        )
+
+    def entries(self, exc_tb):
+        """ Return the entries to show for a traceback, without reading
+            any source. Entries are (frame, lineno) for frames, or
+            (note, count) where `note` is 'repeated', 'hidden', or
+            'omitted'.
+        """
+        frames = []
+        while exc_tb is not None:
+            frames.append((exc_tb.tb_frame, exc_tb.tb_lineno))
+            exc_tb = exc_tb.tb_next
+        entries = []
+        last = len(frames) - 1
+        hidden = repeats = 0
+        previous = None
+        for i, (frame, lineno) in enumerate(frames):
+            filename = frame.f_code.co_filename
+            if self.hide_paths and (i != last) and (
+                    filename.startswith(self.hide_paths)):
+                if repeats:
+                    entries.append(('repeated', repeats))
+                    repeats = 0
+                hidden += 1
+                previous = None
+                continue
+            if hidden:
+                entries.append(('hidden', hidden))
+                hidden = 0
+            location = (frame.f_code, lineno)
+            if self.collapse and (location == previous):
+                repeats += 1
+                continue
+            if repeats:
+                entries.append(('repeated', repeats))
+                repeats = 0
+            entries.append((frame, lineno))
+            previous = location
+        if repeats:
+            entries.append(('repeated', repeats))
+        return self._limit(entries)
+
+    def _limit(self, entries):
+        """ Apply the head and tail limits to stack entries. """
+        if (self.head is None) and (self.tail is None):
+            return entries
+        head = self.head or 0
+        tail = self.tail or 0
+        if head + tail >= len(entries):
+            return entries
+        limited = entries[:head]
+        limited.append(('omitted', len(entries) - head - tail))
+        if tail:
+            limited.extend(entries[-tail:])
+        return limited
+
+    def format(self, exc_type, exc_value, exc_tb, key=None):
+        """ Return a rendered traceback.
+            Arguments:
+                exc_type   : Exception type.
+                exc_value  : Exception.
+                exc_tb     : Traceback.
+                key        : Fingerprint, if it's already known.
+        """
+        if key is None:
+            key = fingerprint(exc_type, exc_value, exc_tb)
+        links = []
+        if self.chain and (exc_value is not None):
+            links = list(_chain_links(exc_value))
+        cachekey = (key, tuple(str(chained) for chained, _ in links))
+        message = self._message(exc_type, exc_value)
+        cached = self._cache.get(cachekey, None)
+        if cached is None:
+            cached = self._render(exc_tb, links)
+            with _lock:
+                _remember(self._cache, cachekey, cached)
+        prefix, suffix = cached
+        return ''.join((prefix, message, suffix))
+
+    def _message(self, exc_type, exc_value):
+        """ Return the message part for an exception. """
+        lines = format_message(exc_type, exc_value)
+        if self.oneline:
+            return ' '.join(line.strip() for line in lines)
+        return ''.join(lines)
+
+    def _render(self, exc_tb, links):
+        """ Return (prefix, suffix) for a rendered traceback, to go around
+            the final exception message.
+        """
+        if self.oneline:
+            parts = [' [{}]'.format(self._render_oneline(exc_tb))]
+            for chained, cause in links:
+                parts.append(' <- {} {} [{}]'.format(
+                    'caused by' if cause else 'during handling of',
+                    self._message(type(chained), chained),
+                    self._render_oneline(chained.__traceback__),
+                ))
+            return '', ''.join(parts)
+        parts = []
+        # Chained exceptions are shown oldest first, like traceback does.
+        for chained, cause in reversed(links):
+            parts.append(self._render_stack(chained.__traceback__))
+            parts.append(self._message(type(chained), chained))
+            parts.append('\n{}\n\n'.format(chain_messages[cause]))
+        parts.append(self._render_stack(exc_tb))
+        return ''.join(parts), ''
+
+    def _render_oneline(self, exc_tb):
+        """ Render stack entries on one line. """
+        parts = []
+        for entry, count in self.entries(exc_tb):
+            if isinstance(entry, str):
+                parts.append('...({} {})'.format(count, entry))
+                continue
+            code = entry.f_code
+            parts.append('{}:{} {}'.format(
+                os.path.basename(code.co_filename),
+                count,
+                code.co_name,
+            ))
+        return ' > '.join(parts)
+
+    def _render_stack(self, exc_tb):
+        """ Render stack entries like traceback does, with notes for
+            frames that are not shown.
+        """
+        if exc_tb is None:
+            return ''
+        lines = ['Traceback (most recent call last):\n']
+        for entry, count in self.entries(exc_tb):
+            plural = '' if count == 1 else 's'
+            if entry == 'repeated':
+                lines.append(
+                    '  [Previous line repeated {} more time{}]\n'.format(
+                        count,
+                        plural,
+                    )
+                )
+                continue
+            elif entry == 'hidden':
+                lines.append('  [{} library frame{} hidden]\n'.format(
+                    count,
+                    plural,
+                ))
+                continue
+            elif entry == 'omitted':
+                lines.append('  ... {} frame{} omitted ...\n'.format(
+                    count,
+                    plural,
+                ))
+                continue
+            code = entry.f_code
+            lines.append('  File "{}", line {}, in {}\n'.format(
+                code.co_filename,
+                count,
+                code.co_name,
+            ))
+            source = linecache.getline(
+                code.co_filename,
+                count,
+                entry.f_globals,
+            ).strip()
+            if source:
+                lines.append('    {}\n'.format(source))
+        return ''.join(lines)
@@ -0,0 +1,511 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" PrintDebug - Tracing
+    ...debug-print function calls, with arguments, return values or
+    exceptions, and durations, indented by nesting level.
+
+    Usage:
+        @debug_calls
+        def add(a, b):
+            return a + b
+        # myfile.py:   10         add(): -> (a=1, b=2)
+        # myfile.py:   10         add(): <- 3 [0.002ms]
+
+        # Every function in a module, for 1% of top-level calls:
+        tracer = trace_module(mymodule, sample=0.01)
+        ...
+        tracer.stop()
+
+    `trace_module()` uses `sys.monitoring` on Python 3.12+, where code that
+    is not traced is disabled after its first call, and `sys.setprofile`
+    on older versions. With `sys.setprofile`, exception types are not
+    available, so they are only reported as 'raised'.
+    Generators, coroutines, and comprehensions are not traced.
+"""
+import dis
+import functools
+import inspect
+import os.path
+import random
+import sys
+import threading
+import time
+
+from . import tools
+from .sinks import (
+    Sink,
+    TextFormatter,
+)
+
+# Code flags for functions that suspend, and are not traced.
+CO_SUSPENDS = (
+    inspect.CO_GENERATOR |
+    inspect.CO_COROUTINE |
+    inspect.CO_ASYNC_GENERATOR |
+    inspect.CO_ITERABLE_COROUTINE
+)
+
+# Names for comprehensions, which are functions before Python 3.12.
+COMPREHENSIONS = ('<listcomp>', '<dictcomp>', '<setcomp>')
+
+# Opcodes that return from a frame, to tell returns from exceptions in
+# sys.setprofile() functions.
+_return_ops = {
+    dis.opmap[opname]
+    for opname in ('RETURN_VALUE', 'RETURN_CONST')
+    if opname in dis.opmap
+}
+
+# Directory for printdebug's own code, which is never traced.
+_package_dir = os.path.dirname(os.path.abspath(__file__))
+
+# Traced calls in progress, for each thread, shared by all tracers so
+# nesting is shown across decorated functions.
+# Each item is (code, start_ns), or (code, None) for calls that were not
+# sampled.
+_local = threading.local()
+
+
+class CallTracer(object):
+    """ Prints calls for functions, with arguments, return values or
+        exceptions, and durations.
+        Records are sent through the printer's sinks, or printed to its
+        file when it has none.
+    """
+    def __init__(
+            self, printer=None, sample=1.0, filter=None, maxlen=60,
+            timing=True):
+        """ Initialize a tracer.
+            Arguments:
+                printer  : DebugPrinter to print with.
+                           Default: A DebugPrinter for sys.stderr.
+                sample   : Fraction of top-level calls to trace (0-1).
+                           Calls made during an untraced call are not
+                           traced either.
+                filter   : A function that accepts a code object, and
+                           returns False if it should not be traced.
+                           It is only called once for each function.
+                maxlen   : Maximum length for argument/return reprs.
+                timing   : Whether to include call durations.
+        """
+        self.printer = printer or tools.DebugPrinter()
+        self.sample = sample
+        self.filter = filter
+        self.maxlen = maxlen
+        self.timing = timing
+        # Whether each code object is traced, code: bool
+        self.decisions = {}
+        # Line info for each traced code object, code: LineInfo
+        self.lineinfos = {}
+        # Used when the printer has no sinks.
+        self.sink = Sink(
+            self.printer.file,
+            None if hasattr(self.printer.file, 'write_record') else
+            TextFormatter(
+                fmt=self.printer.fmt,
+                ljustwidth=self.printer.ljustwidth,
+                basename=self.printer.basename,
+            ),
+        )
+
+    def __repr__(self):
+        return '{}(printer={!r}, sample={!r})'.format(
+            self.__class__.__name__,
+            self.printer,
+            self.sample,
+        )
+
+    def emit(self, code, text):
+        """ Send a line of trace output for a code object. """
+        printer = self.printer
+        if not (printer.enabled and tools.enabled()):
+            return None
+        info = self.lineinfos.get(code, None)
+        if info is None:
+            info = self.lineinfos[code] = tools.LineInfo(
+                code.co_filename,
+                getattr(code, 'co_qualname', code.co_name),
+                code.co_firstlineno,
+            )
+        record = tools.DebugRecord(info, text)
+        if printer.all_sinks:
+            printer.emit(record)
+        else:
+            self.sink.emit(record)
+
+    def enter(self, code, args):
+        """ Handle a call to a traced code object.
+            Arguments:
+                code  : The code object being called.
+                args  : A function that returns (name, value) pairs for
+                        the arguments. It is only called when the call
+                        is printed.
+        """
+        try:
+            stack = _local.stack
+        except AttributeError:
+            stack = _local.stack = []
+        if stack:
+            sampled = stack[-1][1] is not None
+        else:
+            sampled = (self.sample >= 1) or (random.random() < self.sample)
+        if not sampled:
+            stack.append((code, None))
+            return None
+        self.emit(code, '{}-> ({})'.format(
+            '  ' * len(stack),
+            ', '.join(
+                '{}={}'.format(name, tools.short_repr(value, self.maxlen))
+                for name, value in args()
+            ),
+        ))
+        stack.append((code, time.perf_counter_ns()))
+
+    def exit(self, code, value=None, exc=None, raised=False):
+        """ Handle a return (or exception) from a traced code object. """
+        stack = getattr(_local, 'stack', None)
+        if not (stack and (stack[-1][0] is code)):
+            # The call started before tracing did.
+            return None
+        _, start = stack.pop()
+        if start is None:
+            return None
+        if exc is not None:
+            result = 'raised {}: {}'.format(
+                type(exc).__name__,
+                tools.truncate(str(exc), self.maxlen),
+            )
+        elif raised:
+            result = 'raised'
+        else:
+            result = tools.short_repr(value, self.maxlen)
+        if self.timing:
+            result = '{} [{:.3f}ms]'.format(
+                result,
+                (time.perf_counter_ns() - start) / 1000000,
+            )
+        self.emit(code, '{}<- {}'.format('  ' * len(stack), result))
+
+    def traced(self, code):
+        """ Return True if a code object should be traced.
+            The decision is cached per code object.
+        """
+        decision = self.decisions.get(code, None)
+        if decision is None:
+            decision = self.decisions[code] = (
+                (not (code.co_flags & CO_SUSPENDS)) and
+                (code.co_name not in COMPREHENSIONS) and
+                (not code.co_filename.startswith(_package_dir)) and
+                ((self.filter is None) or bool(self.filter(code)))
+            )
+        return decision
+
+    def wrap(self, func):
+        """ Wrap a function, tracing every call to it. """
+        code = getattr(func, '__code__', None)
+        if code is None:
+            # Builtins and other callables get a placeholder code object,
+            # for the line info.
+            code = _placeholder(func)
+        try:
+            signature = inspect.signature(func)
+        except (TypeError, ValueError):
+            signature = None
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            def getargs():
+                if signature is not None:
+                    try:
+                        bound = signature.bind(*args, **kwargs)
+                    except TypeError:
+                        pass
+                    else:
+                        return bound.arguments.items()
+                return _positional(args, kwargs)
+            self.enter(code, getargs)
+            try:
+                value = func(*args, **kwargs)
+            except BaseException as ex:
+                self.exit(code, exc=ex)
+                raise
+            self.exit(code, value=value)
+            return value
+        return wrapper
+
+
+def _frame_args(frame):
+    """ Return (name, value) pairs for a frame's arguments. """
+    code = frame.f_code
+    count = code.co_argcount + code.co_kwonlyargcount
+    if code.co_flags & inspect.CO_VARARGS:
+        count += 1
+    if code.co_flags & inspect.CO_VARKEYWORDS:
+        count += 1
+    localvars = frame.f_locals
+    return [
+        (name, localvars.get(name, None))
+        for name in code.co_varnames[:count]
+    ]
+
+
+def _placeholder(func):
+    """ Return a code object with a callable's name, for line info. """
+    name = getattr(func, '__name__', type(func).__name__)
+
+    def placeholder():
+        pass
+    return placeholder.__code__.replace(
+        co_name=name,
+        co_filename='<{}>'.format(getattr(func, '__module__', None)),
+    )
+
+
+def _positional(args, kwargs):
+    """ Return (name, value) pairs for arguments without a signature. """
+    pairs = [('arg{}'.format(i), arg) for i, arg in enumerate(args)]
+    pairs.extend(kwargs.items())
+    return pairs
+
+
+def debug_calls(
+        func=None, printer=None, sample=1.0, maxlen=60, timing=True):
+    """ Decorator that debug-prints every call to a function, with it's
+        arguments, return value or exception, and duration.
+        Calls are indented by nesting level.
+        It can be used with or without arguments:
+            @debug_calls
+            def f():
+                ...
+
+            @debug_calls(sample=0.1)
+            def g():
+                ...
+        Arguments:
+            See CallTracer.
+    """
+    tracer = CallTracer(
+        printer=printer,
+        sample=sample,
+        maxlen=maxlen,
+        timing=timing,
+    )
+    if func is None:
+        return tracer.wrap
+    return tracer.wrap(func)
+
+
+class ModuleTracer(CallTracer):
+    """ A CallTracer for all functions defined in some files, using
+        `sys.monitoring` when available, or `sys.setprofile`.
+        It's also a context manager, that stops tracing on exit.
+    """
+    def __init__(self, filenames, **kwargs):
+        super(ModuleTracer, self).__init__(**kwargs)
+        self.filenames = set(filenames)
+        self.started = False
+        self.tool_id = None
+        # Profile functions that were set before start(), for
+        # sys.setprofile.
+        self.previous = None
+
+    def __enter__(self):
+        if not self.started:
+            self.start()
+        return self
+
+    def __exit__(self, exctype, value, traceback):
+        self.stop()
+        # Allow exceptions to propogate by not returning True.
+        return None
+
+    def traced(self, code):
+        decision = self.decisions.get(code, None)
+        if decision is None:
+            if code.co_filename not in self.filenames:
+                decision = self.decisions[code] = False
+            else:
+                decision = super(ModuleTracer, self).traced(code)
+        return decision
+
+    def _profile(self, frame, event, arg):
+        """ sys.setprofile() function. """
+        if event == 'call':
+            code = frame.f_code
+            if self.traced(code):
+                self.enter(code, lambda: _frame_args(frame))
+        elif event == 'return':
+            code = frame.f_code
+            if self.traced(code):
+                if _returning(frame):
+                    self.exit(code, value=arg)
+                else:
+                    self.exit(code, raised=True)
+
+    def _monitor_start(self, code, offset):
+        """ sys.monitoring PY_START callback. """
+        if not self.traced(code):
+            return sys.monitoring.DISABLE
+        frame = sys._getframe(1)
+        self.enter(code, lambda: _frame_args(frame))
+
+    def _monitor_return(self, code, offset, value):
+        """ sys.monitoring PY_RETURN callback. """
+        if not self.traced(code):
+            return sys.monitoring.DISABLE
+        self.exit(code, value=value)
+
+    def _monitor_unwind(self, code, offset, exc):
+        """ sys.monitoring PY_UNWIND callback. This event can't be
+            disabled per code object.
+        """
+        if self.traced(code):
+            self.exit(code, exc=exc)
+
+    def start(self):
+        """ Start tracing. """
+        if self.started:
+            return None
+        monitoring = getattr(sys, 'monitoring', None)
+        if monitoring is None:
+            self.previous = (sys.getprofile(), _threading_profile())
+            sys.setprofile(self._profile)
+            threading.setprofile(self._profile)
+        else:
+            self.tool_id = _use_tool_id(monitoring)
+            events = monitoring.events
+            try:
+                for event, callback in (
+                        (events.PY_START, self._monitor_start),
+                        (events.PY_RETURN, self._monitor_return),
+                        (events.PY_UNWIND, self._monitor_unwind)):
+                    monitoring.register_callback(
+                        self.tool_id,
+                        event,
+                        callback,
+                    )
+                monitoring.set_events(
+                    self.tool_id,
+                    events.PY_START | events.PY_RETURN | events.PY_UNWIND,
+                )
+                # Code that an earlier tracer returned DISABLE for stays
+                # disabled for every tool until events are restarted.
+                monitoring.restart_events()
+            except BaseException:
+                self._free_tool_id()
+                raise
+        self.started = True
+
+    def stop(self):
+        """ Stop tracing. """
+        if not self.started:
+            return None
+        if self.tool_id is None:
+            previous, threadprevious = self.previous
+            self.previous = None
+            sys.setprofile(previous)
+            threading.setprofile(threadprevious)
+        else:
+            self._free_tool_id()
+        self.started = False
+
+    def _free_tool_id(self):
+        """ Turn off events and callbacks for the sys.monitoring tool id,
+            and free it.
+        """
+        monitoring = sys.monitoring
+        events = monitoring.events
+        monitoring.set_events(self.tool_id, events.NO_EVENTS)
+        for event in (events.PY_START, events.PY_RETURN, events.PY_UNWIND):
+            monitoring.register_callback(self.tool_id, event, None)
+        monitoring.free_tool_id(self.tool_id)
+        self.tool_id = None
+
+
+def _threading_profile():
+    """ Return the profile function set with threading.setprofile(). """
+    getprofile = getattr(threading, 'getprofile', None)
+    if getprofile is None:
+        # Python 3.9 and older.
+        return getattr(threading, '_profile_hook', None)
+    return getprofile()
+
+
+def _use_tool_id(monitoring):
+    """ Claim a free sys.monitoring tool id, and return it.
+        The profiler id is tried first, then the ids that aren't reserved
+        for debuggers, coverage, or optimizers.
+        Raises RuntimeError, naming the current owners, when they are all
+        taken.
+    """
+    reserved = {
+        monitoring.DEBUGGER_ID,
+        monitoring.COVERAGE_ID,
+        monitoring.OPTIMIZER_ID,
+    }
+    toolids = [monitoring.PROFILER_ID] + [
+        toolid for toolid in range(6)
+        if toolid not in reserved and toolid != monitoring.PROFILER_ID
+    ]
+    for toolid in toolids:
+        if monitoring.get_tool(toolid) is not None:
+            continue
+        try:
+            monitoring.use_tool_id(toolid, 'printdebug')
+        except ValueError:
+            # Claimed by another thread since get_tool().
+            continue
+        return toolid
+    raise RuntimeError(
+        'No free sys.monitoring tool id for printdebug, in use by: {}'.format(
+            ', '.join(
+                '{} ({})'.format(toolid, monitoring.get_tool(toolid))
+                for toolid in toolids
+            )
+        )
+    )
+
+
+def _returning(frame):
+    """ Return True if a frame is returning normally, and not unwinding
+        because of an exception.
+    """
+    lasti = frame.f_lasti
+    if lasti < 0:
+        return True
+    return frame.f_code.co_code[lasti] in _return_ops
+
+
+def trace_module(
+        module, printer=None, sample=1.0, filter=None, maxlen=60,
+        timing=True):
+    """ Start tracing calls for every function defined in a module (or
+        several modules), and return the ModuleTracer.
+        Call `tracer.stop()` to stop tracing, or use it as a context
+        manager.
+        Arguments:
+            module  : A module, module name, or a list of them.
+            others  : See CallTracer.
+    """
+    if isinstance(module, (list, tuple, set)):
+        modules = module
+    else:
+        modules = [module]
+    filenames = []
+    for mod in modules:
+        if isinstance(mod, str):
+            mod = sys.modules[mod]
+        filename = getattr(mod, '__file__', None)
+        if not filename:
+            raise ValueError('Module has no file: {!r}'.format(mod))
+        filenames.append(filename)
+    tracer = ModuleTracer(
+        filenames,
+        printer=printer,
+        sample=sample,
+        filter=filter,
+        maxlen=maxlen,
+        timing=timing,
+    )
+    tracer.start()
+    return tracer
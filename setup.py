@@ -49,5 +49,6 @@ setup(
     ],
     extras_require={
         'colr': 'colr>=0.5.1',
+        'toml': 'tomli>=1.1.0; python_version < "3.11"',
     },
 )
@@ -7,22 +7,96 @@
     -Christopher Welborn 01-11-2017
 """
 
+import asyncio
+import collections
+import glob
+import gzip
+import io
+import json
+import linecache
+import logging
+import os
+import shutil
+import signal
+import subprocess
 import sys
+import tempfile
+import threading
+import time
+import traceback
+import tracemalloc
 import unittest
 
+from printdebug import (
+    binlog,
+    changes,
+    config,
+    diff,
+    filesink,
+    signals,
+    sitestats,
+    tools,
+    tracebacks,
+)
 from printdebug import (
     __version__,
+    context,
+    BinaryLogReader,
+    BinaryLogWriter,
+    CaptureBuffer,
+    clear_config,
     debug,
+    debug_calls,
+    debug_changes,
+    debug_diff,
+    debug_enable,
     debug_exc,
+    debug_expr,
+    debug_locals,
+    debug_mem,
+    debug_mem_span,
+    debug_object,
+    debug_span,
+    debug_timer,
     default_format,
+    DebugNotEnabled,
     DebugPrinter,
     DebugColrPrinter,
+    DebugRecord,
     get_frame,
     get_lineinfo,
+    get_printer,
+    install_hooks,
     json_str,
+    JSONLinesWriter,
+    LatencyHistogram,
     LineInfo,
+    load_config,
+    LoggerSink,
+    MmapRingBuffer,
     object_str,
+    PrintDebugFormatter,
+    PrintDebugHandler,
+    read_ring_buffer,
+    RotatingFileSink,
+    set_verbosity,
+    Sink,
+    stats,
+    stats_enable,
+    stats_reset,
     StdErrCatcher,
+    StdOutCatcher,
+    TextFormatter,
+    timeline_start,
+    timeline_stop,
+    trace_module,
+    TracebackStyle,
+    TraceWriter,
+    uninstall_hooks,
+    unwatch_config,
+    verbosity,
+    verbosity_filter,
+    watch_config,
 )
 
 print('Testing PrintDebug v. {}'.format(__version__), file=sys.stderr)
@@ -65,6 +139,1000 @@ class HelperTests(unittest.TestCase):
         )
 
 
+class FormatFieldTests(unittest.TestCase):
+    """ Tests for the dynamic fmt fields. """
+    def test_fmt_fields(self):
+        """ Only the dynamic fields used by a template are detected. """
+        self.assertEqual(tools._fmt_fields(default_format), frozenset())
+        self.assertEqual(
+            tools._fmt_fields('{time} {thread:>10} {lineno} {pid!r}: '),
+            frozenset(('time', 'thread', 'pid')),
+        )
+
+    def test_dynamic_fields(self):
+        """ Dynamic fields are rendered by DebugPrinter. """
+        f = io.StringIO()
+        dp = DebugPrinter(
+            fmt='{pid}|{thread}|{task}|{delta_ms}|{time}: ',
+            file=f,
+        )
+        dp.debug('Test.')
+        pid, thread, task, delta, timestr = f.getvalue().split(':')[0].split(
+            '|'
+        )
+        self.assertEqual(int(pid), os.getpid())
+        self.assertEqual(thread, threading.current_thread().name)
+        self.assertEqual(task, '')
+        self.assertEqual(float(delta), 0.0)
+        self.assertRegex(timestr, r'^\d\d$')
+        self.assertRegex(f.getvalue(), r'\|\d\d:\d\d:\d\d\.\d{3}: +Test\.')
+
+    def test_task_field(self):
+        """ {task} is the current asyncio task name. """
+        f = io.StringIO()
+        dp = DebugPrinter(fmt='{task}: ', ljustwidth=0, file=f)
+
+        async def run():
+            dp.debug('Test.')
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(loop.create_task(run(), name='mytask'))
+        finally:
+            loop.close()
+        self.assertEqual(f.getvalue(), 'mytask: Test.\n')
+
+    def test_format_time(self):
+        """ format_time caches strftime per second. """
+        self.assertEqual(
+            tools.format_time(1000.25)[-4:],
+            '.250',
+        )
+        cached = tools._time_cache
+        self.assertEqual(cached[0], 1000)
+        self.assertEqual(tools.format_time(1000.5)[-4:], '.500')
+        self.assertIs(
+            tools._time_cache,
+            cached,
+            msg='strftime() was called again for the same second.',
+        )
+
+
+class ContextTests(unittest.TestCase):
+    """ Tests for printdebug.context(). """
+    def test_context_fields(self):
+        """ Context fields are available in fmt, and nest. """
+        f = io.StringIO()
+        fmt = '[{request_id}] {context}: '
+        with context(request_id='abc', tenant='acme'):
+            debug('One.', fmt=fmt, ljustwidth=0, file=f)
+            with context(request_id='def'):
+                DebugPrinter(fmt=fmt, ljustwidth=0, file=f).debug('Two.')
+        debug('Three.', fmt=fmt, ljustwidth=0, file=f)
+        self.assertEqual(
+            f.getvalue().splitlines(),
+            [
+                '[abc] request_id=abc tenant=acme: One.',
+                '[def] request_id=def tenant=acme: Two.',
+                '[] : Three.',
+            ],
+        )
+
+    def test_context_cached(self):
+        """ The rendered context is cached until the context changes. """
+        with context(request_id='abc') as ctx:
+            self.assertIs(ctx.text, ctx.text)
+            self.assertIs(ctx.json, ctx.json)
+
+    def test_context_json(self):
+        """ Context fields are included in JSON Lines output. """
+        f = io.StringIO()
+        with context(request_id='abc'):
+            debug('Test.', file=JSONLinesWriter(f))
+        self.assertEqual(
+            json.loads(f.getvalue())['context'],
+            {'request_id': 'abc'},
+        )
+
+    def test_context_tasks(self):
+        """ Context fields follow asyncio tasks. """
+        f = io.StringIO()
+        dp = DebugPrinter(fmt='{request_id}: ', ljustwidth=0, file=f)
+
+        async def handle(request_id):
+            with context(request_id=request_id):
+                await asyncio.sleep(0)
+                dp.debug('Test.')
+
+        async def run():
+            await asyncio.gather(handle('a'), handle('b'))
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(run())
+        finally:
+            loop.close()
+        self.assertEqual(
+            sorted(f.getvalue().splitlines()),
+            ['a: Test.', 'b: Test.'],
+        )
+
+
+class StatsTests(unittest.TestCase):
+    """ Tests for per call site stats. """
+    def setUp(self):
+        stats_reset()
+        stats_enable()
+
+    def tearDown(self):
+        stats_enable(False)
+        stats_reset()
+        debug_enable()
+
+    def test_stats(self):
+        """ stats() counts calls, bytes, and suppressed calls per site. """
+        f = io.StringIO()
+        dp = DebugPrinter(fmt='>', ljustwidth=0, file=f)
+        for _ in range(3):
+            dp.debug('1234')
+        debug_enable(False)
+        for _ in range(2):
+            debug('suppressed', file=f)
+        debug_enable()
+        sites = stats(sort='calls')
+        self.assertEqual(len(sites), 2)
+        hot, suppressed = sites
+        self.assertEqual(
+            (hot.name, hot.calls, hot.bytes, hot.suppressed),
+            ('test_stats', 3, 18, 0),
+        )
+        self.assertEqual(
+            (suppressed.calls, suppressed.bytes, suppressed.suppressed),
+            (2, 0, 2),
+        )
+        self.assertGreater(hot.time_ns, 0)
+        self.assertEqual(suppressed.lineno, hot.lineno + 3)
+        # Bytes are counted, not characters.
+        stats_reset()
+        dp.debug('\u00e9')
+        self.assertEqual(stats()[0].bytes, len('>\u00e9\n'.encode()))
+
+    def test_stats_level(self):
+        """ Calls with a level that a config suppressed are counted for
+            the caller.
+        """
+        f = io.StringIO()
+
+        def helper():
+            debug('suppressed', file=f, level=1)
+        self.addCleanup(clear_config)
+        config.apply_config({'modules': {__name__: False}})
+        helper()
+        lineno = sys._getframe().f_lineno - 1
+        self.assertEqual(
+            [(site.name, site.lineno, site.suppressed) for site in stats()],
+            [('test_stats_level', lineno, 1)],
+        )
+
+    def test_stats_threads(self):
+        """ stats() merges counts from all threads. """
+        f = io.StringIO()
+
+        def work():
+            for _ in range(10):
+                debug('x', file=f)
+        tables = len(sitestats._recorded.tables)
+        threads = [threading.Thread(target=work) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([site.calls for site in stats()], [30])
+        # Rows for threads that ended are merged, and not kept.
+        self.assertEqual(len(sitestats._recorded.tables), tables)
+
+
+class TimerTests(unittest.TestCase):
+    """ Tests for debug_timer and LatencyHistogram. """
+    def test_histogram(self):
+        """ LatencyHistogram percentiles are within a bucket's error. """
+        hist = LatencyHistogram('test')
+        for ns in range(1, 100001):
+            hist.add(ns * 1000)
+        self.assertEqual(hist.count, 100000)
+        self.assertEqual(hist.max, 100000000)
+        for pct in (50, 95, 99):
+            expected = pct * 1000000
+            self.assertAlmostEqual(
+                hist.percentile(pct) / expected,
+                1,
+                delta=0.07,
+                msg='Percentile is off: p{}'.format(pct),
+            )
+        hist.reset()
+        self.assertEqual((hist.count, hist.percentile(50)), (0, 0))
+
+    def test_histogram_take(self):
+        """ LatencyHistogram.take() hands each window to one caller. """
+        hist = LatencyHistogram('test')
+        hist.add(1000)
+        self.assertIsNone(hist.take(min_age=3600))
+        snapshot = hist.take()
+        self.assertEqual((snapshot.count, snapshot.max), (1, 1000))
+        self.assertEqual(hist.count, 0)
+
+        # Every duration is reported exactly once, from any thread.
+        hist = LatencyHistogram('threads')
+        counts = []
+
+        def work():
+            for _ in range(500):
+                hist.add(1000)
+                snapshot = hist.take(min_age=0)
+                if snapshot is not None:
+                    counts.append(snapshot.count)
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sum(counts) + hist.count, 4000)
+
+    def test_timer(self):
+        """ debug_timer prints elapsed time with the caller's line info. """
+        f = io.StringIO()
+        dp = DebugPrinter(fmt='{lineno}:{name}: ', ljustwidth=0, file=f)
+        with debug_timer('block', printer=dp):
+            lineno = get_frame().f_lineno
+
+        @debug_timer(printer=dp)
+        def func():
+            return 'value'
+        self.assertEqual(func(), 'value')
+        calllineno = get_frame().f_lineno - 1
+        lines = f.getvalue().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertRegex(
+            lines[0],
+            r'^{}:test_timer: block: \d+\.\d{{3}}ms$'.format(lineno - 1),
+        )
+        self.assertRegex(
+            lines[1],
+            r'^{}:test_timer: .+func: \d+\.\d{{3}}ms$'.format(calllineno),
+        )
+
+    def test_timer_aggregate(self):
+        """ debug_timer prints periodic summaries in aggregate mode. """
+        f = io.StringIO()
+        dp = DebugPrinter(fmt='{name}: ', ljustwidth=0, file=f)
+        timer = debug_timer(
+            'agg',
+            aggregate=True,
+            report_every=3600,
+            printer=dp,
+        )
+        for i in range(11):
+            if i == 10:
+                self.assertEqual(f.getvalue(), '')
+                # Force the last exit to report.
+                timer.report_every = 0
+            # The same site every time.
+            with timer:
+                pass
+        self.assertRegex(
+            f.getvalue(),
+            r'^test_timer_aggregate: agg: n=11 p50=[\d.]+ms .+max=[\d.]+ms\n$',
+        )
+
+
+class MemoryTests(unittest.TestCase):
+    """ Tests for debug_mem and debug_mem_span. """
+    def setUp(self):
+        self.file = io.StringIO()
+        self.printer = DebugPrinter(
+            fmt='{name}: ',
+            ljustwidth=0,
+            file=self.file,
+        )
+
+    def tearDown(self):
+        tracemalloc.stop()
+
+    def test_debug_mem(self):
+        """ debug_mem prints changes since the last call at a site. """
+        kept = []
+        for _ in range(2):
+            debug_mem(limit=1, printer=self.printer)
+            kept.append(bytearray(1024 * 1024))
+        lines = self.file.getvalue().splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertRegex(lines[0], r'^test_debug_mem: memory: current=')
+        self.assertIn('tracemalloc started', lines[1])
+        self.assertRegex(
+            lines[3],
+            r'test_printdebug.py:\d+: \+1\.0 MiB \(\+\d+\), total 1\.0 MiB$',
+        )
+
+    def test_debug_mem_span(self):
+        """ debug_mem_span prints net allocations inside a block. """
+        with debug_mem_span('block', limit=0, printer=self.printer):
+            kept = bytearray(2 * 1024 * 1024)
+        self.assertEqual(len(kept), 2 * 1024 * 1024)
+        self.assertRegex(
+            self.file.getvalue(),
+            r'^test_debug_mem_span: block: net \+2\.0 MiB, peak 2\.0 MiB\n$',
+        )
+
+    def test_disabled(self):
+        """ debug_mem prints nothing while disabled, or raises. """
+        self.printer.disable()
+        debug_mem(printer=self.printer)
+        with debug_mem_span(limit=0, printer=self.printer):
+            pass
+        self.assertEqual(self.file.getvalue(), '')
+        self.printer.should_raise = True
+        with self.assertRaises(DebugNotEnabled):
+            debug_mem(printer=self.printer)
+        with self.assertRaises(DebugNotEnabled):
+            with debug_mem_span(limit=0, printer=self.printer):
+                pass
+
+
+class TimelineTests(unittest.TestCase):
+    """ Tests for debug_span and TraceWriter. """
+    def setUp(self):
+        fd, self.filename = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+
+    def tearDown(self):
+        timeline_stop()
+        os.remove(self.filename)
+
+    def test_debug_span(self):
+        """ debug_span writes nested spans from several threads. """
+        # Nothing is recorded, and nothing breaks, without a timeline.
+        with debug_span('ignored'):
+            pass
+        # A small buffer, so events are streamed while recording.
+        writer = timeline_start(self.filename, buffer_size=2)
+        dp = DebugPrinter(sinks=[Sink(writer)])
+        # Both threads run at once, so their idents aren't reused.
+        barrier = threading.Barrier(2)
+
+        def work(n):
+            with debug_span('outer', n=n):
+                with debug_span('inner'):
+                    dp.debug('Working.')
+                    barrier.wait(timeout=10)
+        threads = [
+            threading.Thread(target=work, args=(i,)) for i in range(2)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        with self.assertRaises(ValueError):
+            with debug_span('error'):
+                raise ValueError('test')
+        timeline_stop()
+        with open(self.filename) as f:
+            events = json.load(f)
+        spans = {}
+        for event in events:
+            if event['ph'] == 'X':
+                spans.setdefault(event['tid'], {})[event['name']] = event
+        self.assertEqual(len(spans), 3)
+        for tid, named in spans.items():
+            if 'error' in named:
+                self.assertEqual(
+                    named['error']['args']['exception'],
+                    'ValueError',
+                )
+                continue
+            outer, inner = named['outer'], named['inner']
+            self.assertIn(outer['args']['n'], (0, 1))
+            self.assertRegex(
+                outer['args']['site'],
+                r'^test_printdebug.py:\d+$',
+            )
+            self.assertLessEqual(outer['ts'], inner['ts'])
+            self.assertGreaterEqual(
+                outer['ts'] + outer['dur'],
+                inner['ts'] + inner['dur'],
+            )
+        instants = [e for e in events if e['ph'] == 'i']
+        self.assertEqual([e['name'] for e in instants], ['Working.'] * 2)
+        self.assertEqual(
+            sorted(e['tid'] for e in events if e['ph'] == 'M'),
+            sorted(spans),
+        )
+
+    def test_nested_spans(self):
+        """ Nested spans are contained in their parents. """
+        timeline_start(self.filename)
+        with debug_span('a'):
+            with debug_span('b'):
+                with debug_span('c'):
+                    time.sleep(0.001)
+            with debug_span('d'):
+                pass
+        timeline_stop()
+        with open(self.filename) as f:
+            events = [e for e in json.load(f) if e['ph'] == 'X']
+        # Spans are written when they end, so children come first.
+        self.assertEqual([e['name'] for e in events], ['c', 'b', 'd', 'a'])
+        spans = {e['name']: e for e in events}
+        for parent, child in (('a', 'b'), ('b', 'c'), ('a', 'd')):
+            parent, child = spans[parent], spans[child]
+            self.assertLessEqual(parent['ts'], child['ts'])
+            self.assertGreaterEqual(
+                parent['ts'] + parent['dur'],
+                child['ts'] + child['dur'],
+            )
+        # Siblings don't overlap.
+        self.assertLessEqual(
+            spans['b']['ts'] + spans['b']['dur'],
+            spans['d']['ts'],
+        )
+        self.assertGreater(spans['c']['dur'], 0)
+
+    def test_pid_tid(self):
+        """ Events have the process id, and the thread ident and name. """
+        timeline_start(self.filename)
+        idents = {}
+
+        def work():
+            idents[threading.current_thread().name] = threading.get_ident()
+            with debug_span('work'):
+                pass
+        thread = threading.Thread(target=work, name='pdtest-worker')
+        thread.start()
+        thread.join()
+        with debug_span('main'):
+            pass
+        idents[threading.current_thread().name] = threading.get_ident()
+        timeline_stop()
+        with open(self.filename) as f:
+            events = json.load(f)
+        self.assertEqual({e['pid'] for e in events}, {os.getpid()})
+        spans = {e['name']: e for e in events if e['ph'] == 'X'}
+        self.assertEqual(spans['work']['tid'], idents['pdtest-worker'])
+        self.assertEqual(
+            spans['main']['tid'],
+            idents[threading.current_thread().name],
+        )
+        names = {
+            e['tid']: e['args']['name']
+            for e in events
+            if (e['ph'] == 'M') and (e['name'] == 'thread_name')
+        }
+        self.assertEqual(names, {tid: name for name, tid in idents.items()})
+
+    def test_json_output(self):
+        """ The output is valid JSON, however it was buffered. """
+        for count in (0, 1, 5):
+            f = io.StringIO()
+            with TraceWriter(f, buffer_size=2) as writer:
+                for i in range(count):
+                    writer.write('line "{}"\\\n'.format(i))
+                    with writer.span('span', value=object(), n=i):
+                        pass
+            events = json.loads(f.getvalue())
+            instants = [e for e in events if e['ph'] == 'i']
+            self.assertEqual(
+                [e['name'] for e in instants],
+                ['line "{}"\\'.format(i) for i in range(count)],
+            )
+            self.assertEqual(
+                [e['args']['n'] for e in events if e['ph'] == 'X'],
+                list(range(count)),
+            )
+
+
+class TracingTests(unittest.TestCase):
+    """ Tests for debug_calls and trace_module. """
+    def setUp(self):
+        self.file = io.StringIO()
+        self.printer = DebugPrinter(
+            fmt='{name}: ',
+            ljustwidth=0,
+            file=self.file,
+        )
+
+    def test_debug_calls(self):
+        """ debug_calls prints nested calls, returns, and exceptions. """
+        @debug_calls(printer=self.printer, timing=False)
+        def inner(x):
+            if x < 0:
+                raise ValueError('negative')
+            return 'x' * x
+
+        @debug_calls(printer=self.printer, timing=False, maxlen=10)
+        def outer(x, y=None):
+            return inner(x)
+
+        self.assertEqual(outer(20), 'x' * 20)
+        with self.assertRaises(ValueError):
+            inner(-1)
+        # Names are qualified, like TracingTests.test_debug_calls.<locals>.
+        lines = [
+            line.partition('<locals>.')[-1]
+            for line in self.file.getvalue().splitlines()
+        ]
+        self.assertEqual(
+            lines,
+            [
+                'outer: -> (x=20)',
+                'inner:   -> (x=20)',
+                "inner:   <- 'xxxxxxxxxxxxxxxxxxxx'",
+                "outer: <- 'xxxxxx...",
+                'inner: -> (x=-1)',
+                'inner: <- raised ValueError: negative',
+            ]
+        )
+
+    def test_debug_calls_sample(self):
+        """ debug_calls skips unsampled calls, and their nested calls. """
+        @debug_calls(printer=self.printer)
+        def inner():
+            return 1
+
+        @debug_calls(printer=self.printer, sample=0)
+        def outer():
+            return inner()
+        self.assertEqual(outer(), 1)
+        self.assertEqual(self.file.getvalue(), '')
+
+    def test_trace_module(self):
+        """ trace_module traces every function in a module. """
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        with open(os.path.join(tmpdir, 'pd_traced.py'), 'w') as f:
+            f.write('\n'.join((
+                'def add(a, b=2):',
+                '    return a + b',
+                'def boom():',
+                '    raise KeyError(1)',
+                'def main():',
+                '    try:',
+                '        boom()',
+                '    except KeyError:',
+                '        pass',
+                '    return add(1)',
+                '',
+            )))
+        sys.path.insert(0, tmpdir)
+        self.addCleanup(sys.path.remove, tmpdir)
+        import pd_traced
+        self.addCleanup(sys.modules.pop, 'pd_traced')
+        with trace_module(pd_traced, printer=self.printer, timing=False):
+            self.assertEqual(pd_traced.main(), 3)
+        # Not traced after stopping.
+        pd_traced.add(1)
+        lines = self.file.getvalue().splitlines()
+        self.assertEqual(
+            lines[:2] + lines[3:],
+            [
+                'main: -> ()',
+                'boom:   -> ()',
+                'add:   -> (a=1, b=2)',
+                'add:   <- 3',
+                'main: <- 3',
+            ]
+        )
+        # sys.setprofile can't see exception types.
+        self.assertRegex(lines[2], r'^boom:   <- raised( KeyError: 1)?$')
+
+    def test_trace_modules_in_turn(self):
+        """ trace_module works after another module was traced, and keeps
+            an existing profile function.
+        """
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        for name in ('pd_traced_a', 'pd_traced_b'):
+            with open(os.path.join(tmpdir, name + '.py'), 'w') as f:
+                f.write('def func_{}():\n    return 1\n'.format(name[-1]))
+        sys.path.insert(0, tmpdir)
+        self.addCleanup(sys.path.remove, tmpdir)
+        import pd_traced_a
+        import pd_traced_b
+        self.addCleanup(sys.modules.pop, 'pd_traced_a')
+        self.addCleanup(sys.modules.pop, 'pd_traced_b')
+
+        def profiler(frame, event, arg):
+            pass
+        self.addCleanup(sys.setprofile, sys.getprofile())
+        sys.setprofile(profiler)
+        with trace_module(pd_traced_a, printer=self.printer, timing=False):
+            pd_traced_a.func_a()
+            # Not traced, and disabled by the first tracer.
+            pd_traced_b.func_b()
+        self.assertIs(sys.getprofile(), profiler)
+        with trace_module(pd_traced_b, printer=self.printer, timing=False):
+            pd_traced_b.func_b()
+        self.assertIs(sys.getprofile(), profiler)
+        sys.setprofile(None)
+        self.assertEqual(
+            self.file.getvalue().splitlines(),
+            [
+                'func_a: -> ()',
+                'func_a: <- 1',
+                'func_b: -> ()',
+                'func_b: <- 1',
+            ]
+        )
+
+    @unittest.skipUnless(
+        hasattr(sys, 'monitoring'),
+        'sys.monitoring needs Python 3.12+.',
+    )
+    def test_trace_module_tool_ids(self):
+        """ trace_module uses another tool id when the profiler's is taken
+        """
+        monitoring = sys.monitoring
+        taken = []
+        self.addCleanup(lambda: [monitoring.free_tool_id(t) for t in taken])
+        for toolid in (monitoring.PROFILER_ID, 3, 4):
+            if monitoring.get_tool(toolid) is None:
+                monitoring.use_tool_id(toolid, 'pdtest')
+                taken.append(toolid)
+            if toolid == monitoring.PROFILER_ID:
+                with trace_module(changes, printer=self.printer) as tracer:
+                    self.assertNotEqual(tracer.tool_id, toolid)
+                    toolid_used = tracer.tool_id
+                self.assertIsNone(monitoring.get_tool(toolid_used))
+        with self.assertRaisesRegex(RuntimeError, 'pdtest'):
+            trace_module(changes, printer=self.printer)
+
+
+class CatcherTests(unittest.TestCase):
+    """ Tests for StdOutCatcher, StdErrCatcher, and CaptureBuffer. """
+
+    def test_catcher_lines(self):
+        """ catchers assemble partial writes into lines """
+        with StdOutCatcher() as out:
+            print('a', end='')
+            print('b', end='')
+            print('c')
+            print('')
+            print('d\ne', end='')
+        self.assertEqual(out.lines, ['abc', '', 'd', 'e'])
+        self.assertEqual(out.output, 'abc\n\nd\ne')
+        # The last line is finished when the block exits.
+        self.assertEqual(out.read_new(), ['abc', '', 'd', 'e'])
+        self.assertEqual(out.read_new(), [])
+
+    def test_catcher_safe(self):
+        """ safe catchers escape and trim lines when they are read """
+        with StdErrCatcher(safe=True, maxlength=5) as err:
+            print('\tab', file=sys.stderr)
+            print('123456789', file=sys.stderr)
+        self.assertEqual(err.lines, ['\\tab', '12345 (..truncated)'])
+
+    def test_catcher_fd(self):
+        """ fd mode catches native writes and child processes, in order """
+        before = os.fstat(1)
+        with StdOutCatcher(fd=True) as out:
+            os.write(1, b'native\n')
+            print('python')
+            sys.stdout.flush()
+            subprocess.run(
+                [sys.executable, '-c', 'print("child" * 20000)'],
+                check=True,
+            )
+        self.assertEqual(out.lines[:2], ['native', 'python'])
+        self.assertEqual(out.lines[2], 'child' * 20000)
+        with self.assertRaises(ZeroDivisionError):
+            with StdErrCatcher(fd=True):
+                os.write(2, b'boom\n')
+                1 / 0
+        after = os.fstat(1)
+        self.assertEqual(
+            (before.st_dev, before.st_ino),
+            (after.st_dev, after.st_ino),
+            msg='File descriptor was not restored.',
+        )
+        with self.assertRaises(io.UnsupportedOperation):
+            StdOutCatcher().fileno()
+
+    def test_catcher_tee(self):
+        """ tee mode writes to the original stream and the catcher """
+        with StdOutCatcher() as outer:
+            with StdOutCatcher(tee=True) as out:
+                print('both')
+        self.assertEqual(out.lines, ['both'])
+        self.assertEqual(outer.lines, ['both'])
+
+        with StdOutCatcher(fd=True) as outer:
+            with StdOutCatcher(fd=True, tee=True) as out:
+                os.write(1, b'native\n')
+        self.assertEqual(out.lines, ['native'])
+        self.assertEqual(outer.lines, ['native'])
+
+    def test_catcher_stream(self):
+        """ catchers pass complete lines to callbacks and iterators """
+        seen = []
+        streamed = []
+        with StdOutCatcher(callback=seen.append, safe=True) as out:
+            reader = threading.Thread(
+                target=lambda: streamed.extend(out.iter_lines())
+            )
+            reader.start()
+            print('a', end='')
+            print('\tb')
+            print('c', end='')
+        reader.join(5)
+        self.assertFalse(reader.is_alive(), msg='iter_lines() never ended.')
+        self.assertEqual(seen, ['a\\tb', 'c'])
+        self.assertEqual(streamed, ['a\\tb', 'c'])
+
+        buf = CaptureBuffer()
+        buf.write('x\n')
+        self.assertEqual(list(buf.iter_lines(timeout=0.01)), ['x'])
+
+    def test_capture_buffer_limits(self):
+        """ CaptureBuffer keeps the newest lines, or the head and tail """
+        buf = CaptureBuffer(max_lines=3)
+        for i in range(10):
+            buf.write('{}\n'.format(i))
+        self.assertEqual(buf.get_lines(), ['7', '8', '9'])
+        self.assertEqual(buf.dropped, 7)
+        # Dropped lines are skipped by read_new().
+        self.assertEqual(buf.read_new(), ['7', '8', '9'])
+        buf.write('10\n')
+        self.assertEqual(buf.read_new(), ['10'])
+
+        buf = CaptureBuffer(max_bytes=8, max_lines=None)
+        buf.write('123\n456\n789\n')
+        self.assertEqual(buf.get_lines(), ['456', '789'])
+        # A line that can't fit is truncated to its end, not dropped.
+        buf.write('abcdefghijkl\n')
+        self.assertEqual(buf.get_lines(), ['fghijkl'])
+        self.assertEqual(buf.dropped, 3)
+        self.assertEqual(buf.truncated, 1)
+
+        buf = CaptureBuffer(max_bytes=8, retention='head+tail')
+        buf.write('1\nabcdefghijkl\n')
+        self.assertEqual(buf.get_lines(), ['1', 'hijkl'])
+        self.assertEqual(buf.truncated, 1)
+
+        buf = CaptureBuffer(max_lines=4, retention='head+tail')
+        for i in range(10):
+            buf.write('{}\n'.format(i))
+        self.assertEqual(
+            buf.get_lines(),
+            ['0', '1', '...(6 lines dropped)', '8', '9'],
+        )
+        self.assertEqual(buf.read_new(), ['0', '1', '8', '9'])
+
+        # Head lines that were already read aren't returned again.
+        buf = CaptureBuffer(max_lines=10, retention='head+tail')
+        buf.write(''.join('l{}\n'.format(i) for i in range(3)))
+        self.assertEqual(buf.read_new(), ['l0', 'l1', 'l2'])
+        buf.write(''.join('l{}\n'.format(i) for i in range(3, 30)))
+        self.assertEqual(
+            buf.read_new(),
+            ['l3', 'l4'] + ['l{}'.format(i) for i in range(25, 30)],
+        )
+        self.assertEqual(buf.read_new(), [])
+        self.assertEqual(
+            list(buf.iter_lines(timeout=0)),
+            ['l{}'.format(i) for i in (0, 1, 2, 3, 4, 25, 26, 27, 28, 29)],
+        )
+        with self.assertRaises(ValueError):
+            CaptureBuffer(retention='middle')
+
+    def test_capture_buffer_threads(self):
+        """ CaptureBuffer doesn't lose or split lines from threads """
+        buf = CaptureBuffer()
+
+        def writer(n):
+            for _ in range(500):
+                buf.write('thread-')
+                buf.write('{}\n'.format(n))
+
+        threads = [
+            threading.Thread(target=writer, args=(i,)) for i in range(4)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        lines = buf.get_lines()
+        self.assertEqual(len(lines), 2000)
+        # Writes from different threads may interleave, but no text is
+        # lost.
+        self.assertEqual(
+            sorted(''.join(lines).replace('thread-', '')),
+            sorted('0123' * 500),
+        )
+
+
+class HookTests(unittest.TestCase):
+    """ Tests for deduplicated debug_exc output and the exception hooks. """
+
+    def setUp(self):
+        tracebacks.reset()
+        self.addCleanup(tracebacks.reset)
+        self.addCleanup(uninstall_hooks)
+
+    def raise_value(self, msg):
+        raise ValueError(msg)
+
+    def test_format_exc(self):
+        """ cached tracebacks match traceback.format_exception """
+        for msg in ('first', 'second'):
+            try:
+                self.raise_value(msg)
+            except ValueError:
+                exc_info = sys.exc_info()
+            self.assertEqual(
+                tracebacks.format_exc(*exc_info),
+                ''.join(traceback.format_exception(*exc_info)),
+            )
+        self.assertEqual(len(tracebacks._formatted), 1)
+
+    @unittest.skipIf(
+        sys.version_info < (3, 11),
+        'Exception groups need Python 3.11+.',
+    )
+    def test_format_exc_group(self):
+        """ exception groups are formatted like traceback does """
+        for msg in ('first', 'second'):
+            try:
+                raise ExceptionGroup(  # noqa: F821
+                    'group',
+                    [ValueError(msg), KeyError('key')],
+                )
+            except Exception:
+                exc_info = sys.exc_info()
+            expected = ''.join(traceback.format_exception(*exc_info))
+            self.assertEqual(tracebacks.format_exc(*exc_info), expected)
+            f = io.StringIO()
+            DebugPrinter(file=f).debug_exc(exc_info=exc_info, dedupe=True)
+            self.assertEqual(f.getvalue().count('ExceptionGroup: group'), 1)
+            self.assertIn(msg, f.getvalue())
+            tracebacks.reset()
+        self.assertEqual(len(tracebacks._formatted), 0)
+
+    def test_debug_exc_dedupe(self):
+        """ debug_exc(dedupe=True) prints repeats once, and then counts """
+        f = io.StringIO()
+        printer = DebugPrinter(file=f)
+        old_interval = tracebacks.repeat_interval
+        self.addCleanup(setattr, tracebacks, 'repeat_interval', old_interval)
+        tracebacks.repeat_interval = 3600
+
+        def fail(msg, **kwargs):
+            try:
+                self.raise_value(msg)
+            except ValueError:
+                printer.debug_exc(dedupe=True, **kwargs)
+
+        for i in range(3):
+            fail('bad {}'.format(i))
+        self.assertEqual(f.getvalue().count('Traceback'), 1)
+        self.assertIn('ValueError: bad 0', f.getvalue())
+
+        tracebacks.repeat_interval = 0
+        fail('bad 3', suppress_strs=['bad'])
+        fail('bad 4')
+        self.assertEqual(f.getvalue().count('Traceback'), 1)
+        self.assertNotIn('bad 3', f.getvalue())
+        self.assertIn(
+            'ValueError: bad 4 (repeated 3 more times)',
+            f.getvalue(),
+        )
+
+    def recurse(self, n):
+        if n == 0:
+            try:
+                json.loads('{bad')
+            except ValueError as ex:
+                raise KeyError('key') from ex
+        self.recurse(n - 1)
+
+    def test_traceback_style(self):
+        """ TracebackStyle collapses, hides, and limits frames """
+        try:
+            self.recurse(50)
+        except KeyError:
+            exc_info = sys.exc_info()
+        jsondir = os.path.dirname(json.__file__)
+        text = TracebackStyle(hide_paths=[jsondir]).format(*exc_info)
+        self.assertIn('[Previous line repeated 49 more times]', text)
+        self.assertRegex(text, r'\[\d+ library frames? hidden\]')
+        self.assertIn('The above exception was the direct cause', text)
+        self.assertTrue(text.endswith("KeyError: 'key'\n"))
+
+        text = TracebackStyle(head=1, tail=1, chain=False).format(*exc_info)
+        self.assertEqual(text.count('  File '), 2)
+        self.assertIn('... 2 frames omitted ...', text)
+        self.assertNotIn('JSONDecodeError', text)
+
+        text = TracebackStyle(collapse=False, chain=False).format(*exc_info)
+        self.assertEqual(text.count('in recurse'), 51)
+
+        text = TracebackStyle(oneline=True).format(*exc_info)
+        self.assertNotIn('\n', text)
+        self.assertRegex(
+            text,
+            r"^KeyError: 'key' \[test_printdebug.py:\d+ test_traceback_style"
+            r" > .+\.\.\.\(49 repeated\).+\] <- caused by .+JSONDecodeError",
+        )
+
+    def test_traceback_style_lazy(self):
+        """ TracebackStyle only reads source for frames that are shown """
+        try:
+            self.recurse(50)
+        except KeyError:
+            exc_info = sys.exc_info()
+        getline = linecache.getline
+        lines = []
+
+        def counting_getline(*args, **kwargs):
+            lines.append(args)
+            return getline(*args, **kwargs)
+
+        linecache.getline = counting_getline
+        self.addCleanup(setattr, linecache, 'getline', getline)
+        style = TracebackStyle(head=2, collapse=False, chain=False)
+        style.format(*exc_info)
+        self.assertEqual(len(lines), 2)
+        # Rendered tracebacks are cached.
+        style.format(*exc_info)
+        self.assertEqual(len(lines), 2)
+
+    def test_install_hooks(self):
+        """ install_hooks routes uncaught exceptions through debug_exc """
+        f = io.StringIO()
+        old_hook = sys.excepthook
+        # Suppressed exceptions are passed on to the previous hook.
+        previous = []
+        sys.excepthook = lambda *exc_info: previous.append(exc_info[0])
+        self.addCleanup(setattr, sys, 'excepthook', old_hook)
+        install_hooks(
+            printer=DebugPrinter(fmt='{name}: ', file=f),
+            suppress=[KeyError],
+        )
+        self.assertEqual(sys.excepthook.__module__, 'printdebug.hooks')
+        try:
+            self.raise_value('main')
+        except ValueError:
+            sys.excepthook(*sys.exc_info())
+        try:
+            {}['missing']
+        except KeyError:
+            sys.excepthook(*sys.exc_info())
+        self.assertEqual(previous, [KeyError])
+
+        t = threading.Thread(
+            target=self.raise_value,
+            args=('thread', ),
+            name='worker',
+        )
+        t.start()
+        t.join()
+
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        install_hooks(printer=DebugPrinter(file=f), loop=loop)
+        loop.call_soon(self.raise_value, 'loop')
+        loop.call_soon(loop.stop)
+        loop.run_forever()
+
+        output = f.getvalue()
+        self.assertIn('ValueError: main', output)
+        # The line info is for the frame that raised.
+        self.assertTrue(output.startswith('raise_value: '), msg=output)
+        self.assertNotIn('_debug_exc', output)
+        self.assertNotIn('KeyError', output)
+        self.assertIn('Exception in thread worker:', output)
+        self.assertIn('ValueError: thread', output)
+        self.assertIn('ValueError: loop', output)
+        uninstall_hooks()
+        self.assertEqual(sys.excepthook.__module__, __name__)
+
+
 class LineInfoTests(unittest.TestCase):
 
     def test_LineInfo_from_frame(self):
@@ -141,6 +1209,207 @@ class DebugTests(unittest.TestCase):
             msg='Failed to output correct text for nested function.',
         )
 
+    def test_debug_expr(self):
+        """ debug_expr prints argument source text with values. """
+        f = io.StringIO()
+        x = 5
+        items = [1, 2]
+        for _ in range(2):
+            # The second call uses the cached source.
+            debug_expr(
+                x,
+                len(items),
+                'literal',
+                fmt='{name}: ',
+                ljustwidth=0,
+                file=f,
+            )
+        self.assertEqual(
+            f.getvalue().splitlines(),
+            ["test_debug_expr: x = 5, len(items) = 2, 'literal'"] * 2,
+        )
+        f = io.StringIO()
+        dp = DebugPrinter(fmt='{name}: ', ljustwidth=0, file=f)
+        dp.debug_expr(
+            x +
+            1
+        )
+        self.assertEqual(f.getvalue(), 'test_debug_expr: x + 1 = 6\n')
+
+    def test_debug_expr_nosource(self):
+        """ debug_expr prints values when the source is missing. """
+        f = io.StringIO()
+        code = compile(
+            'debug_expr(x, fmt=\'{name}: \', ljustwidth=0, file=f)',
+            '<nosource>',
+            'exec',
+        )
+        exec(code, {'debug_expr': debug_expr, 'x': 5, 'f': f})
+        self.assertEqual(f.getvalue(), '<module>: 5\n')
+
+    def test_debug_locals(self):
+        """ debug_locals prints changed locals, with a bounded repr. """
+        f = io.StringIO()
+        dp = DebugPrinter(fmt='{name}: ', ljustwidth=0, file=f)
+        items = []
+        big = 'x' * 1000
+        for i in range(3):
+            if i < 2:
+                items.append(i)
+            dp.debug_locals(['items', 'big', 'i', 'missing'], maxlen=15)
+        # Module-level debug_locals() uses the same path.
+        debug_locals(['big'], changed_only=False, maxlen=10, file=f)
+        lines = f.getvalue().splitlines()
+        self.assertEqual(
+            [line.strip() for line in lines[:-2]],
+            [
+                'test_debug_locals: changed locals:',
+                'items = [0]',
+                "big = 'xxxxxxxxxxx...",
+                'i = 0',
+                'test_debug_locals: changed locals:',
+                'items = [0, 1]',
+                'i = 1',
+                'test_debug_locals: changed locals:',
+                'i = 2',
+            ]
+        )
+        self.assertRegex(
+            lines[-2],
+            r'^test_printdebug.py: +\d+ +test_debug_locals\(\): locals:$',
+        )
+        self.assertEqual(lines[-1].strip(), "big = 'xxxxxx...")
+        self.assertEqual(len(big), 1000)
+
+    def test_helpers_disabled(self):
+        """ Helpers print nothing while disabled, or raise if asked to. """
+        f = io.StringIO()
+        dp = DebugPrinter(file=f)
+        dp.disable()
+        value = 1
+        dp.debug_locals()
+        dp.debug_expr(value)
+        debug_diff({}, {'a': 1}, printer=dp)
+        debug_changes(value, printer=dp)
+        self.assertEqual(f.getvalue(), '')
+        dp.should_raise = True
+        for func, args, kwargs in (
+                (dp.debug_locals, (), {}),
+                (dp.debug_expr, (value, ), {}),
+                (debug_diff, ({}, {'a': 1}), {'printer': dp}),
+                (debug_changes, (value, ), {'printer': dp})):
+            with self.assertRaises(DebugNotEnabled, msg=func.__name__):
+                func(*args, **kwargs)
+
+    def test_debug_diff(self):
+        """ debug_diff prints only added, removed, and changed paths. """
+        f = io.StringIO()
+        dp = DebugPrinter(fmt='{name}: ', ljustwidth=0, file=f)
+        shared = {'big': list(range(1000))}
+        old = {
+            'shared': shared,
+            'port': 80,
+            'tags': {'a', 'b'},
+            'items': [1, 2, 3],
+            'removed': None,
+        }
+        new = {
+            'shared': shared,
+            'port': 8080,
+            'tags': {'b', 'c'},
+            'items': [1, 'x', 2, 3],
+            'added': 'yes',
+        }
+        debug_diff(old, new, printer=dp)
+        debug_diff(old, dict(old), printer=dp)
+        self.assertEqual(
+            [line.strip() for line in f.getvalue().splitlines()],
+            [
+                'test_debug_diff: diff: 6 changes',
+                "~ ['port'] = 80 -> 8080",
+                "- ['tags']['a'] = 'a'",
+                "+ ['tags']['c'] = 'c'",
+                "+ ['items'][1] = 'x'",
+                "- ['removed'] = None",
+                "+ ['added'] = 'yes'",
+                'test_debug_diff: diff: no changes',
+            ]
+        )
+
+    def test_diff_order(self):
+        """ diff_lines uses the mappings' order for added keys. """
+        keys = ['zeta', 'alpha', 'mu', 'beta', 'omega', 'gamma']
+        old = {'kept': 1, 'gone': 2}
+        new = dict({'kept': 1}, **{key: i for i, key in enumerate(keys)})
+        lines = diff.diff_lines(old, new)
+        self.assertEqual(
+            [line.strip() for line in lines[1:]],
+            ["- ['gone'] = 2"] + [
+                "+ [{!r}] = {}".format(key, i) for i, key in enumerate(keys)
+            ],
+        )
+
+    def test_diff_defaultdict(self):
+        """ diff_lines doesn't add missing keys to a defaultdict. """
+        old = {'kept': 1, 'gone': 2}
+        new = collections.defaultdict(int, kept=1)
+        lines = diff.diff_lines(old, new)
+        self.assertEqual(
+            [line.strip() for line in lines[1:]],
+            ["- ['gone'] = 2"],
+        )
+        self.assertEqual(new, {'kept': 1})
+
+    def test_debug_changes(self):
+        """ debug_changes only prints when a value changes. """
+        f = io.StringIO()
+        dp = DebugPrinter(fmt='{name}: ', ljustwidth=0, file=f)
+        state = {'status': 'starting', 'items': [1]}
+        for i in range(4):
+            if i == 2:
+                state['status'] = 'ready'
+            debug_changes(state, diff=True, printer=dp)
+        for i in range(4):
+            debug_changes(i // 2, key='conn', printer=dp)
+        self.assertEqual(
+            [line.strip() for line in f.getvalue().splitlines()],
+            [
+                "test_debug_changes: state = {'items': [1], "
+                "'status': 'starting'}",
+                'test_debug_changes: state changed:',
+                "~ ['status'] = 'starting' -> 'ready'",
+                "test_debug_changes: i // 2['conn'] = 0",
+                "test_debug_changes: i // 2['conn'] changed: 1",
+            ]
+        )
+        # Values with the same hash still print when they change.
+        f.seek(0)
+        f.truncate()
+        for value in (-1, -2, 0, 2 ** 61 - 1, {'a': -1}, {'a': -2}):
+            debug_changes(value, key='hash', printer=dp)
+        self.assertEqual(
+            [line.strip() for line in f.getvalue().splitlines()],
+            [
+                "test_debug_changes: value['hash'] = -1",
+                "test_debug_changes: value['hash'] changed: -2",
+                "test_debug_changes: value['hash'] changed: 0",
+                "test_debug_changes: value['hash'] changed: {}".format(
+                    2 ** 61 - 1
+                ),
+                "test_debug_changes: value['hash'] changed: {'a': -1}",
+                "test_debug_changes: value['hash'] changed: {'a': -2}",
+            ]
+        )
+        # The fingerprint table is bounded.
+        old_max = changes.max_entries
+        changes.max_entries = 3
+        try:
+            for i in range(10):
+                debug_changes(i, key=i, printer=dp)
+            self.assertLessEqual(len(changes._seen), 3)
+        finally:
+            changes.max_entries = old_max
+
 
 class DebugPrinterTests(unittest.TestCase):
     """ Tests for the DebugPrinter class. """
@@ -275,6 +1544,88 @@ class DebugColrPrinterTests(DebugPrinterTests):
         self.class_name = self.dp_class.__name__
 
 
+class PrinterHierarchyTests(unittest.TestCase):
+    """ Tests for named printers from get_printer(). """
+    def tearDown(self):
+        for name in list(tools._printers):
+            if name.startswith('pdtest'):
+                tools._printers.pop(name)
+
+    def test_cached(self):
+        """ get_printer() returns one cached instance per name. """
+        pool = get_printer('pdtest.db.pool')
+        self.assertIs(get_printer('pdtest.db.pool'), pool)
+        self.assertIs(pool.parent, get_printer('pdtest.db'))
+        self.assertIs(get_printer('pdtest').parent, get_printer())
+        self.assertEqual(pool.name, 'pdtest.db.pool')
+
+    def test_enabled_inherited(self):
+        """ Enabled state is inherited, unless a child sets its own. """
+        db = get_printer('pdtest.db')
+        pool = get_printer('pdtest.db.pool')
+        web = get_printer('pdtest.web')
+        db.disable()
+        self.assertFalse(pool._enabled)
+        self.assertTrue(web._enabled)
+        with StdErrCatcher() as err:
+            pool.debug('Test.', file=sys.stderr)
+        self.assertEqual(err.output, '')
+        pool.enable()
+        self.assertTrue(pool.enabled)
+        db.enable()
+        db.disable()
+        self.assertTrue(pool.enabled, msg='Own setting was overridden.')
+        pool.inherit_enabled()
+        self.assertFalse(pool.enabled, msg='inherit_enabled() failed.')
+        get_printer('pdtest').disable()
+        db.inherit_enabled()
+        self.assertFalse(pool.enabled)
+        get_printer('pdtest').inherit_enabled()
+        self.assertTrue(pool.enabled)
+
+    def test_sinks_and_fmt_inherited(self):
+        """ Sinks and the format are inherited from parents. """
+        db = get_printer('pdtest.db')
+        pool = get_printer('pdtest.db.pool')
+        dbfile, poolfile = io.StringIO(), io.StringIO()
+        db.add_sink(Sink(dbfile, TextFormatter(fmt='db: ', ljustwidth=0)))
+        pool.debug('first')
+        self.assertEqual(dbfile.getvalue(), 'db: first\n')
+        pool.add_sink(
+            Sink(poolfile, TextFormatter(fmt='pool: ', ljustwidth=0))
+        )
+        pool.debug('second')
+        self.assertEqual(poolfile.getvalue(), 'pool: second\n')
+        self.assertIn('second', dbfile.getvalue())
+        self.assertEqual(len(pool.sinks), 1)
+        with self.assertRaises(AttributeError):
+            # A tuple, changes must go through add_sink() or the setter.
+            db.sinks.append(Sink(io.StringIO()))
+        db.enable(None)
+        self.assertFalse(db.enabled, msg='enable(None) should disable.')
+        db.inherit_enabled()
+        self.assertEqual(len(pool.all_sinks), 2)
+        pool.sinks = []
+        db.sinks = []
+        db.fmt = '{name}: '
+        self.assertEqual(pool.fmt, '{name}: ')
+        pool.ljustwidth = 0
+        with StdErrCatcher() as err:
+            pool.debug('third', file=sys.stderr)
+        self.assertEqual(
+            err.output.rstrip(),
+            'test_sinks_and_fmt_inherited: third',
+        )
+        db.fmt = None
+        self.assertEqual(pool.fmt, default_format)
+
+    def test_cyclic(self):
+        """ A printer can't be its own ancestor. """
+        db = get_printer('pdtest.db')
+        with self.assertRaises(ValueError):
+            db.parent = get_printer('pdtest.db.pool')
+
+
 class PrintTests(unittest.TestCase):
     def test_json_str(self):
         """ json_str should work with valid json. """
@@ -391,5 +1742,798 @@ genius:
         )
 
 
+class RingBufferTests(unittest.TestCase):
+    """ Tests for the MmapRingBuffer sink. """
+    def setUp(self):
+        fd, self.filename = tempfile.mkstemp(suffix='.pdring')
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def test_wrap_around(self):
+        """ MmapRingBuffer keeps the newest records, in order. """
+        with MmapRingBuffer(self.filename, size=256) as ringbuf:
+            dp = DebugPrinter(fmt='{lineno}: ', file=ringbuf)
+            for i in range(100):
+                dp.debug('message {}'.format(i))
+            records = ringbuf.records()
+        seqs = [seq for seq, _ in records]
+        self.assertEqual(
+            seqs,
+            list(range(100 - len(seqs), 100)),
+            msg='Records are not the newest, or not in order.',
+        )
+        self.assertTrue(
+            records[-1][1].endswith(b'message 99\n'),
+            msg='Last record is wrong: {!r}'.format(records[-1][1]),
+        )
+        self.assertEqual(
+            records,
+            list(read_ring_buffer(self.filename)),
+            msg='read_ring_buffer did not match the live records.',
+        )
+
+    def test_reopen(self):
+        """ MmapRingBuffer keeps existing records when reopened. """
+        with MmapRingBuffer(self.filename, size=1024) as ringbuf:
+            ringbuf.write('first\n')
+        with MmapRingBuffer(self.filename, size=1024) as ringbuf:
+            ringbuf.write('second\n')
+        self.assertEqual(
+            [data for _, data in read_ring_buffer(self.filename)],
+            [b'first\n', b'second\n'],
+            msg='Records were lost when reopening the ring buffer.',
+        )
+
+    def test_dump_command(self):
+        """ python -m printdebug dump prints records after a SIGKILL. """
+        code = '; '.join((
+            'import os, signal',
+            'from printdebug import DebugPrinter, MmapRingBuffer',
+            'dp = DebugPrinter(file=MmapRingBuffer({!r}, size=4096))',
+            'dp.debug(\'before the crash\')',
+            'os.kill(os.getpid(), signal.SIGKILL)',
+        )).format(self.filename)
+        subprocess.call([sys.executable, '-c', code])
+        output = subprocess.check_output(
+            [sys.executable, '-m', 'printdebug', 'dump', self.filename],
+        )
+        self.assertIn(
+            b'before the crash',
+            output,
+            msg='Record did not survive SIGKILL.',
+        )
+
+
+class SignalTests(unittest.TestCase):
+    """ Tests for the signal handlers and verbosity filters. """
+
+    def test_verbosity_filter(self):
+        """ verbosity_filter passes records by the current verbosity """
+        self.addCleanup(set_verbosity, verbosity())
+        f = io.StringIO()
+        dp = DebugPrinter(sinks=[Sink(f, filter=verbosity_filter(1))])
+        set_verbosity(0)
+        dp.debug('quiet')
+        set_verbosity(-5)
+        self.assertEqual(verbosity(), 0)
+        set_verbosity(1)
+        dp.debug('verbose')
+        self.assertNotIn('quiet', f.getvalue())
+        self.assertIn('verbose', f.getvalue())
+
+    def test_dump_disabled(self):
+        """ dumps are written while debug printing is disabled """
+        self.addCleanup(debug_enable, tools.enabled())
+        self.addCleanup(signals._settings.update, dict(signals._settings))
+        debug_enable(False)
+        f = io.StringIO()
+        signals._settings.update(printer=None, file=f, ring_buffer=None)
+        signals.run_action('dump')
+        self.assertIn('ring buffer: none', f.getvalue())
+        self.assertIn('Thread MainThread', f.getvalue())
+
+        sinkfile = io.StringIO()
+        dp = DebugPrinter(sinks=[Sink(sinkfile)])
+        dp.disable()
+        signals._settings.update(printer=dp, file=None)
+        signals.run_action('stacks')
+        self.assertIn('Thread MainThread', sinkfile.getvalue())
+
+    @unittest.skipUnless(
+        hasattr(signal, 'SIGUSR1'),
+        'SIGUSR1/SIGUSR2 are not available.',
+    )
+    def test_signal_handlers(self):
+        """ SIGUSR1 toggles debug printing, SIGUSR2 dumps stacks """
+        filename = os.path.join(tempfile.mkdtemp(), 'signals.pdring')
+        self.addCleanup(shutil.rmtree, os.path.dirname(filename))
+        code = '\n'.join((
+            'import sys',
+            'from printdebug import (',
+            '    debug, debug_enable, install_signal_handlers,',
+            '    uninstall_signal_handlers, DebugPrinter, MmapRingBuffer,',
+            ')',
+            'ringbuf = MmapRingBuffer({!r}, size=4096)',
+            'DebugPrinter(file=ringbuf).debug(\'in the ring buffer\')',
+            'debug_enable(False)',
+            'install_signal_handlers(ring_buffer=ringbuf)',
+            'debug(\'while disabled\')',
+            'print(\'ready\', flush=True)',
+            'sys.stdin.readline()',
+            'uninstall_signal_handlers()',
+            'debug(\'after the signals\')',
+        )).format(filename)
+        proc = subprocess.Popen(
+            [sys.executable, '-c', code],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+        )
+        self.assertEqual(proc.stdout.readline(), 'ready\n')
+        os.kill(proc.pid, signal.SIGUSR1)
+        os.kill(proc.pid, signal.SIGUSR2)
+        _, err = proc.communicate('\n', timeout=30)
+        self.assertEqual(proc.returncode, 0, msg=err)
+        self.assertNotIn('while disabled', err)
+        self.assertIn('debug printing enabled by SIGUSR1', err)
+        self.assertIn('ring buffer: 1 record', err)
+        self.assertIn('in the ring buffer', err)
+        self.assertIn('Thread MainThread', err)
+        self.assertIn('Thread printdebug-signals', err)
+        self.assertIn('after the signals', err)
+
+
+class ConfigTests(unittest.TestCase):
+    """ Tests for config files. """
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir)
+        self.addCleanup(debug_enable, True)
+        self.addCleanup(set_verbosity, verbosity())
+        self.addCleanup(clear_config)
+        self.addCleanup(unwatch_config)
+
+    def write(self, name, text):
+        filename = os.path.join(self.tempdir, name)
+        with open(filename, 'w') as f:
+            f.write(text)
+        return filename
+
+    def test_formats(self):
+        """ TOML, JSON, and INI configs are read the same way """
+        expected = {
+            'enabled': True,
+            'verbosity': 2,
+            'default': False,
+            'modules': {'app': True, 'app.db': False},
+            'sample': {'app.hot': 0.5},
+            'sinks': [{'path': '-', 'format': 'jsonl'}],
+        }
+        filenames = [
+            self.write('config.json', json.dumps(expected)),
+            self.write('config.ini', '\n'.join((
+                '[printdebug]',
+                'enabled = yes',
+                'verbosity = 2',
+                'default = off',
+                '[modules]',
+                'app = true',
+                'app.db = false',
+                '[sample]',
+                'app.hot = 0.5',
+                '[sink:stderr]',
+                'path = -',
+                'format = jsonl',
+            ))),
+        ]
+        if config.tomllib is not None:
+            filenames.append(self.write('config.toml', '\n'.join((
+                'enabled = true',
+                'verbosity = 2',
+                'default = false',
+                '[modules]',
+                'app = true',
+                '"app.db" = false',
+                '[sample]',
+                '"app.hot" = 0.5',
+                '[[sinks]]',
+                'path = "-"',
+                'format = "jsonl"',
+            ))))
+        for filename in filenames:
+            self.assertEqual(
+                config.normalize_config(config.read_config(filename)),
+                expected,
+                msg='Config was not read correctly: {}'.format(filename),
+            )
+        with self.assertRaises(ValueError):
+            config.apply_config({'sample': {'app': 2}})
+        with self.assertRaises(ValueError):
+            config.apply_config({'modlues': {}})
+
+    def test_rules(self):
+        """ config rules enable modules and sample call sites """
+        f = io.StringIO()
+        filename = self.write(
+            'config.json',
+            json.dumps({'modules': {__name__: False}}),
+        )
+        generation = config.generation()
+        load_config(filename)
+        self.assertEqual(config.generation(), generation + 1)
+        debug('disabled', file=f)
+        DebugPrinter(file=f).debug('disabled')
+        self.assertEqual(f.getvalue(), '')
+
+        load_config(self.write(
+            'config.json',
+            json.dumps({'sample': {__name__.rpartition('.')[0]: 0.25}}),
+        ))
+        for i in range(100):
+            debug('sampled', file=f)
+        self.assertEqual(f.getvalue().count('sampled'), 25)
+
+        # Multi-line helpers print whole records, or nothing.
+        f = io.StringIO()
+        for i in range(8):
+            debug_object({'first': 1, 'second': 2}, file=f)
+        for i in range(8):
+            debug_diff({'a': 1}, {'a': 2, 'b': 3}, file=f)
+        lines = f.getvalue().splitlines()
+        self.assertEqual(len(lines), (2 * 4) + (2 * 3))
+        # Only the first line of each record has line info.
+        firstlines = [line for line in lines if not line.startswith(' ')]
+        self.assertEqual(len(firstlines), 4)
+        self.assertEqual(sum(1 for line in firstlines if 'first:' in line), 2)
+        self.assertEqual(sum(1 for line in firstlines if 'diff:' in line), 2)
+
+        clear_config()
+        self.assertIsNone(tools._site_filter)
+        debug('enabled', file=f)
+        self.assertIn('enabled', f.getvalue())
+
+    def test_sinks(self):
+        """ config sinks are added to the printer, and replaced """
+        dp = DebugPrinter(file=io.StringIO())
+        logname = os.path.join(self.tempdir, 'debug.jsonl')
+        load_config(
+            self.write(
+                'config.json',
+                json.dumps({'sinks': [{'path': logname, 'format': 'jsonl'}]}),
+            ),
+            printer=dp,
+        )
+        self.assertEqual(len(dp.sinks), 1)
+        dp.debug('to the sink')
+        load_config(self.write('config.json', '{}'), printer=dp)
+        self.assertEqual(dp.sinks, ())
+        with open(logname) as f:
+            self.assertEqual(json.loads(f.read())['message'], 'to the sink')
+        # Without a printer, sink files aren't opened.
+        otherlog = os.path.join(self.tempdir, 'other.log')
+        with self.assertWarns(UserWarning):
+            config.apply_config({'sinks': [{'path': otherlog}]})
+        self.assertFalse(os.path.exists(otherlog))
+
+    def test_watch_environ(self):
+        """ watch_environ adds config sinks to the root printer """
+        logname = os.path.join(self.tempdir, 'debug.log')
+        filename = self.write(
+            'config.json',
+            json.dumps({'sinks': [{'path': logname}]}),
+        )
+        name = config.environ_var
+        oldvalue = os.environ.pop(name, None)
+        if oldvalue is not None:
+            self.addCleanup(os.environ.__setitem__, name, oldvalue)
+        self.addCleanup(os.environ.pop, name, None)
+        self.assertIsNone(config.watch_environ())
+        os.environ[name] = filename
+        self.assertIsNotNone(config.watch_environ())
+        self.assertEqual(len(tools.get_printer().sinks), 1)
+        clear_config()
+        self.assertEqual(tools.get_printer().sinks, ())
+
+    def test_sinks_reload_threads(self):
+        """ config sinks can be replaced while other threads print """
+        dp = DebugPrinter(file=io.StringIO())
+        configs = [
+            self.write(
+                'config{}.json'.format(i),
+                json.dumps({'sinks': [{
+                    'path': os.path.join(
+                        self.tempdir,
+                        'debug{}.log'.format(i),
+                    ),
+                }]}),
+            )
+            for i in range(2)
+        ]
+        errors = []
+        done = threading.Event()
+
+        def work():
+            try:
+                while not done.is_set():
+                    dp.debug('from a thread')
+            except Exception as ex:
+                errors.append(ex)
+
+        load_config(configs[0], printer=dp)
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        try:
+            for i in range(50):
+                load_config(configs[i % 2], printer=dp)
+        finally:
+            done.set()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(dp.sinks), 1)
+
+    def test_watch(self):
+        """ watch_config reloads a config when it changes """
+        filename = self.write('config.ini', '[printdebug]\nenabled = no\n')
+        watcher = watch_config(filename, interval=0.01)
+        self.assertFalse(tools.enabled())
+        generation = config.generation()
+        self.write('config.ini', '[printdebug]\nenabled = yes\nverbosity = 3')
+        for _ in range(500):
+            if config.generation() != generation:
+                break
+            time.sleep(0.01)
+        self.assertTrue(tools.enabled())
+        self.assertEqual(verbosity(), 3)
+        # Bad configs are reported, and the last good one is kept.
+        self.write('config.ini', 'not a config')
+        with self.assertWarns(UserWarning):
+            watcher.check()
+        self.assertTrue(tools.enabled())
+
+
+class BinaryLogTests(unittest.TestCase):
+    """ Tests for the binary log writer/reader. """
+    def test_round_trip(self):
+        """ BinaryLogReader reads what BinaryLogWriter wrote. """
+        f = io.BytesIO()
+        dp = DebugPrinter(file=BinaryLogWriter(f))
+        for i in range(3):
+            dp.debug('message', i)
+        debug('from debug()', file=dp.file, parent=self)
+        f.seek(0)
+        records = list(BinaryLogReader(f))
+        self.assertEqual(
+            [r.text for r in records],
+            ['message 0', 'message 1', 'message 2', 'from debug()'],
+            msg='Failed to read back the binary log messages.',
+        )
+        self.assertEqual(
+            records[0].info.name,
+            'test_round_trip',
+            msg='Failed to read back the call site.',
+        )
+        self.assertIs(
+            records[0].info,
+            records[2].info,
+            msg='Call sites were not interned.',
+        )
+        self.assertEqual(
+            records[3].name,
+            'BinaryLogTests.test_round_trip',
+            msg='Failed to read back the parent class name.',
+        )
+
+    def test_threads(self):
+        """ BinaryLogWriter allocates sites safely from threads. """
+        f = io.BytesIO()
+        writer = BinaryLogWriter(f)
+
+        def write():
+            for lineno in range(200):
+                writer.write_record(
+                    DebugRecord(LineInfo('file.py', 'func', lineno), 'x')
+                )
+
+        threads = [threading.Thread(target=write) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        f.seek(0)
+        records = list(BinaryLogReader(f))
+        self.assertEqual(len(records), 1600)
+        self.assertEqual(len(writer.sites), 200)
+        self.assertEqual(
+            sorted(set(r.info.lineno for r in records)),
+            list(range(200)),
+        )
+
+    def test_unknown_site(self):
+        """ BinaryLogReader raises ValueError for unknown site ids. """
+        f = io.BytesIO()
+        writer = BinaryLogWriter(f)
+        writer.write_record(DebugRecord(LineInfo('file.py', 'func', 1), 'x'))
+        # Drop the site entry, keeping the record.
+        data = f.getvalue()
+        magicsize = len(binlog.MAGIC)
+        # The record has 'x', and '\n' for `end`.
+        sitesize = len(data) - magicsize - binlog.RECORD.size - 2
+        f = io.BytesIO(binlog.MAGIC + data[magicsize + sitesize:])
+        with self.assertRaisesRegex(ValueError, 'unknown site id'):
+            list(BinaryLogReader(f))
+
+    def test_truncated(self):
+        """ BinaryLogReader stops at truncated site entries and records.
+        """
+        f = io.BytesIO()
+        writer = BinaryLogWriter(f)
+        writer.write_record(DebugRecord(LineInfo('file.py', 'func', 1), 'x'))
+        writer.write_record(DebugRecord(LineInfo('other.py', 'func', 1), 'y'))
+        data = f.getvalue()
+        # The second site entry is cut off in its file name.
+        cut = data.index(b'other.py') + 3
+        reader = BinaryLogReader(io.BytesIO(data[:cut]))
+        self.assertEqual([r.text for r in reader], ['x'])
+        self.assertEqual(len(reader.sites), 1)
+        # The second record is cut off in its message.
+        reader = BinaryLogReader(io.BytesIO(data[:-1]))
+        self.assertEqual([r.text for r in reader], ['x'])
+
+    def test_append(self):
+        """ BinaryLogWriter appends to a log, keeping `align` and `end`.
+        """
+        filename = os.path.join(tempfile.mkdtemp(), 'debug.pdbl')
+        self.addCleanup(shutil.rmtree, os.path.dirname(filename))
+        for text in ('first', 'second'):
+            with open(filename, 'ab') as f:
+                with BinaryLogWriter(f) as writer:
+                    dp = DebugPrinter(file=writer)
+                    dp.debug(text, end=' ')
+                    dp.debug('aligned', align=True)
+        with open(filename, 'rb') as f:
+            records = list(BinaryLogReader(f))
+        self.assertEqual(
+            [(r.text, r.align, r.end) for r in records],
+            [
+                ('first', False, ' '),
+                ('aligned', True, '\n'),
+                ('second', False, ' '),
+                ('aligned', True, '\n'),
+            ],
+        )
+
+    def test_site_table(self):
+        """ BinaryLogWriter only writes each call site once. """
+        f = io.BytesIO()
+        dp = DebugPrinter(file=BinaryLogWriter(f))
+        sizes = []
+        for _ in range(3):
+            dp.debug('x')
+            sizes.append(len(f.getvalue()))
+        self.assertEqual(
+            sizes[2] - sizes[1],
+            sizes[1] - sizes[0],
+            msg='Call site entries were repeated.',
+        )
+        self.assertLess(
+            sizes[1] - sizes[0],
+            len(__file__),
+            msg='Records are larger than the call site.',
+        )
+
+
+class JSONLinesTests(unittest.TestCase):
+    """ Tests for the JSON Lines writer. """
+    def test_json_lines(self):
+        """ JSONLinesWriter writes one valid JSON object per record. """
+        f = io.StringIO()
+        dp = DebugPrinter(file=JSONLinesWriter(f))
+        for i in range(2):
+            dp.debug('message "{}"'.format(i), parent=self)
+        debug('from debug()', file=dp.file)
+        objs = [json.loads(line) for line in f.getvalue().splitlines()]
+        self.assertEqual(
+            [obj['message'] for obj in objs],
+            ['message "0"', 'message "1"', 'from debug()'],
+            msg='Failed to write the messages.',
+        )
+        self.assertEqual(
+            (objs[0]['function'], objs[0]['parent'], objs[0]['pid']),
+            ('test_json_lines', 'JSONLinesTests', os.getpid()),
+            msg='Failed to write the call site fields.',
+        )
+        self.assertIsNone(
+            objs[2]['parent'],
+            msg='Cached call site fields leaked into another site.',
+        )
+        for key in ('filename', 'lineno', 'thread', 'time', 'monotonic'):
+            self.assertIn(key, objs[0], msg='Missing field: {}'.format(key))
+
+
+class RotatingFileSinkTests(unittest.TestCase):
+    """ Tests for the RotatingFileSink. """
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dirname, 'debug.log')
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def test_rotate_compress(self):
+        """ RotatingFileSink rotates by size, and compresses segments. """
+        with RotatingFileSink(
+                self.filename, max_bytes=100, compress='gzip') as sink:
+            dp = DebugPrinter(fmt='{lineno}: ', file=sink)
+            for i in range(20):
+                dp.debug('message {}'.format(i))
+        segments = sorted(glob.glob('{}.*.gz'.format(self.filename)))
+        self.assertTrue(segments, msg='No compressed segments were found.')
+        text = []
+        for segment in segments:
+            with gzip.open(segment, 'rt') as f:
+                text.append(f.read())
+        with open(self.filename) as f:
+            text.append(f.read())
+        lines = ''.join(text).splitlines()
+        self.assertEqual(
+            sorted(line.split()[-1] for line in lines),
+            sorted(str(i) for i in range(20)),
+            msg='Lines were lost or split during rotation.',
+        )
+
+    def test_retention(self):
+        """ RotatingFileSink removes old segments past the retention cap.
+        """
+        others = ['{}.{}'.format(self.filename, ext) for ext in (
+            'bak',
+            'lock',
+            '20240101-000000.gz.bak',
+        )]
+        for other in others:
+            with open(other, 'w') as f:
+                f.write('x' * 1000)
+        with RotatingFileSink(
+                self.filename, max_bytes=50, retention=200) as sink:
+            for i in range(100):
+                sink.write('{:<20}\n'.format(i))
+        for other in others:
+            self.assertTrue(
+                os.path.exists(other),
+                msg='Removed a file that is not a segment: {}'.format(other),
+            )
+            os.remove(other)
+        total = sum(
+            os.path.getsize(path)
+            for path in glob.glob('{}.*'.format(self.filename))
+        )
+        self.assertLessEqual(
+            total,
+            200,
+            msg='Rotated segments exceed the retention cap.',
+        )
+
+    def test_compress_errors(self):
+        """ RotatingFileSink keeps rotating when compression fails. """
+        def fail(filename, compress='gzip'):
+            raise OSError('Disk full.')
+        self.addCleanup(
+            setattr,
+            filesink,
+            'compress_file',
+            filesink.compress_file,
+        )
+        filesink.compress_file = fail
+        with self.assertWarns(UserWarning):
+            with RotatingFileSink(
+                    self.filename, max_bytes=50, compress='gzip') as sink:
+                for i in range(10):
+                    sink.write('{:<20}\n'.format(i))
+                self.assertTrue(sink.worker.is_alive())
+        self.assertTrue(glob.glob('{}.*'.format(self.filename)))
+        self.assertFalse(glob.glob('{}.*.gz'.format(self.filename)))
+
+    def test_closed(self):
+        """ RotatingFileSink refuses writes once it's closed. """
+        sink = RotatingFileSink(self.filename)
+        sink.write('text\n')
+        sink.close()
+        self.assertTrue(sink.closed)
+        with self.assertRaises(ValueError):
+            sink.write('more text\n')
+        sink.close()
+        with open(self.filename) as f:
+            self.assertEqual(f.read(), 'text\n')
+
+
+class SinkTests(unittest.TestCase):
+    """ Tests for DebugPrinter sinks and formatters. """
+    def test_format_once(self):
+        """ A formatter shared between sinks only renders once. """
+        calls = []
+
+        class CountingFormatter(TextFormatter):
+            def format(self, record):
+                calls.append(record)
+                return super(CountingFormatter, self).format(record)
+
+        formatter = CountingFormatter(fmt='{name}: ', ljustwidth=0)
+        files = [io.StringIO() for _ in range(3)]
+        dp = DebugPrinter(sinks=[Sink(f, formatter) for f in files])
+        dp.debug('Test.')
+        self.assertEqual(len(calls), 1, msg='Record was rendered twice.')
+        for f in files:
+            self.assertEqual(
+                f.getvalue().rstrip(),
+                'test_format_once: Test.',
+                msg='Sink output was wrong.',
+            )
+
+    def test_align_end(self):
+        """ Sinks honor `align` and `end`, like printing to a file. """
+        f = io.StringIO()
+        dp = DebugPrinter(sinks=[Sink(f, TextFormatter(fmt='{name}: '))])
+        dp.debug_object({'a': 1})
+        dp.debug('first', end=' ')
+        dp.debug('second')
+        dp.debug('third', align=True)
+        fileout = io.StringIO()
+        dp = DebugPrinter(fmt='{name}: ', file=fileout)
+        dp.debug_object({'a': 1})
+        dp.debug('first', end=' ')
+        dp.debug('second')
+        dp.debug('third', align=True)
+        self.assertEqual(f.getvalue(), fileout.getvalue())
+        lines = f.getvalue().splitlines()
+        self.assertTrue(lines[0].startswith('test_align_end: '))
+        self.assertTrue(lines[1].startswith(' ' * 40))
+        self.assertEqual(
+            lines[-2].split(),
+            ['test_align_end:', 'first', 'second'],
+        )
+        self.assertEqual(lines[-1].strip(), 'third')
+
+    def test_enabled_filter(self):
+        """ Sinks can be disabled or filtered individually. """
+        allfile, filtered, disabled = (io.StringIO() for _ in range(3))
+        dp = DebugPrinter(sinks=[
+            Sink(allfile),
+            Sink(filtered, filter=lambda record: 'keep' in record.text),
+            Sink(disabled, enabled=False),
+        ])
+        dp.debug('keep this')
+        dp.debug('drop this')
+        self.assertEqual(len(allfile.getvalue().splitlines()), 2)
+        self.assertIn('keep this', filtered.getvalue())
+        self.assertNotIn('drop this', filtered.getvalue())
+        self.assertEqual(disabled.getvalue(), '')
+
+    def test_structured_sink(self):
+        """ Sinks without a formatter pass records to write_record. """
+        text = io.StringIO()
+        jsonfile = io.StringIO()
+        dp = DebugPrinter(sinks=[
+            Sink(text),
+            Sink(JSONLinesWriter(jsonfile)),
+        ])
+        dp.debug('Test.')
+        self.assertIn('test_structured_sink', text.getvalue())
+        self.assertEqual(
+            json.loads(jsonfile.getvalue())['function'],
+            'test_structured_sink',
+        )
+
+
+class LoggingBridgeTests(unittest.TestCase):
+    """ Tests for the logging handler, formatter, and sink. """
+    def setUp(self):
+        self.logger = logging.getLogger('printdebug.test.{}'.format(
+            self.id()
+        ))
+        self.logger.setLevel(logging.DEBUG)
+        self.logger.propagate = False
+
+    def tearDown(self):
+        for handler in list(self.logger.handlers):
+            self.logger.removeHandler(handler)
+
+    def test_formatter(self):
+        """ PrintDebugFormatter renders logging records with fmt. """
+        f = io.StringIO()
+        handler = logging.StreamHandler(f)
+        handler.setFormatter(PrintDebugFormatter(fmt='{name}:{lineno} '))
+        self.logger.addHandler(handler)
+        self.logger.debug('Hello %s.', 'logging')
+        self.assertTrue(
+            f.getvalue().startswith('test_formatter:'),
+            msg='Failed to render line info: {!r}'.format(f.getvalue()),
+        )
+        self.assertTrue(
+            f.getvalue().endswith('Hello logging.\n'),
+            msg='Failed to render the message: {!r}'.format(f.getvalue()),
+        )
+
+    def test_formatter_no_newline(self):
+        """ PrintDebugFormatter only strips a newline that was added. """
+        class BareFormatter(TextFormatter):
+            def format(self, record):
+                return record.text
+
+        formatter = PrintDebugFormatter(formatter=BareFormatter())
+        record = self.logger.makeRecord(
+            self.logger.name, logging.INFO, __file__, 1, 'Whole.', (), None,
+        )
+        self.assertEqual(formatter.format(record), 'Whole.')
+
+    def test_handler_sinks(self):
+        """ PrintDebugHandler sends logging records to printdebug sinks.
+        """
+        f = io.StringIO()
+        dp = DebugPrinter(sinks=[Sink(f, TextFormatter(fmt='{name}: '))])
+        self.logger.addHandler(PrintDebugHandler(dp))
+        self.logger.info('From logging.')
+        dp.debug('From printdebug.')
+        lines = f.getvalue().splitlines()
+        self.assertEqual(len(lines), 2)
+        for line in lines:
+            self.assertTrue(line.startswith('test_handler_sinks:'))
+
+    def test_logger_sink(self):
+        """ LoggerSink forwards printdebug records to a logger. """
+        records = []
+        handler = logging.Handler()
+        handler.emit = records.append
+        self.logger.addHandler(handler)
+        dp = DebugPrinter(sinks=[LoggerSink(self.logger)])
+        dp.debug('To logging.')
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0].funcName, 'test_logger_sink')
+        self.assertEqual(records[0].getMessage(), 'To logging.')
+        self.assertEqual(records[0].name, self.logger.name)
+
+    def test_logger_sink_time(self):
+        """ LoggerSink uses the DebugRecord's time for LogRecords. """
+        records = []
+        handler = logging.Handler()
+        handler.emit = records.append
+        self.logger.addHandler(handler)
+        timestamp = time.time() - 10
+        LoggerSink(self.logger).write_record(DebugRecord(
+            LineInfo('file.py', 'func', 1),
+            'Earlier.',
+            timestamp=timestamp,
+        ))
+        now = logging.makeLogRecord({})
+        self.assertEqual(records[0].created, timestamp)
+        self.assertAlmostEqual(
+            now.relativeCreated - records[0].relativeCreated,
+            (now.created - timestamp) * 1000,
+            delta=1,
+        )
+
+    def test_both_directions(self):
+        """ A handler and a LoggerSink for the same printer don't loop. """
+        f = io.StringIO()
+        dp = DebugPrinter(sinks=[
+            Sink(f, TextFormatter(fmt='{name}: ', ljustwidth=0)),
+            LoggerSink(self.logger),
+        ])
+        self.logger.addHandler(PrintDebugHandler(dp))
+        dp.debug('From printdebug.')
+        self.logger.info('From logging.')
+        self.assertEqual(
+            f.getvalue().splitlines(),
+            [
+                'test_both_directions: From printdebug.',
+                'test_both_directions: From logging.',
+            ],
+        )
+
+
 if __name__ == '__main__':
     sys.exit(unittest.main(argv=sys.argv))